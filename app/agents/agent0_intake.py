@@ -1,7 +1,7 @@
 # app/agents/agent0_intake.py
 from typing import List
-from langchain_core.prompts import ChatPromptTemplate
 from app.llm.chat_sf import get_chat
+from app.events import emit
 from app.llm.stream import stream_json
 
 QS_SCHEMA = {
@@ -49,14 +49,22 @@ _RW_USER = """严格按 JSON Schema 输出。
 def gen_clarifying_questions(llm=None, query: str = "", k: int = 3) -> List[str]:
     print("[Agent0.stream] 生成澄清问题：")
     llm = llm or get_chat()
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _QS_SYS), ("user", _QS_USER)])
-    data = stream_json(prompt.format_messages(q=query, n=k), schema=QS_SCHEMA, llm=llm)
+
+    def _on_value(path, q) -> None:
+        # 每个问题完整即推给客户端，不必等整段 JSON
+        if len(path) == 2 and path[0] == "questions" and path[1] < k:
+            emit("question", index=path[1], text=q)
+
+    data = stream_json(prompt.format_messages(q=query, n=k), schema=QS_SCHEMA, llm=llm, on_value=_on_value)
     return data.get("questions", [])[:k]
 
 def rewrite_goal(llm=None, query: str = "", user_answers: List[str] | None = None) -> str:
     print("[Agent0.stream] 改写目标：")
     llm = llm or get_chat()
     ans = "\n".join(user_answers or [])
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _RW_SYS), ("user", _RW_USER)])
     data = stream_json(prompt.format_messages(q=query, a=ans), schema=GOAL_SCHEMA, llm=llm)
     return (data.get("goal") or query).strip()
\ No newline at end of file
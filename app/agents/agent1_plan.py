@@ -1,6 +1,6 @@
 # app/agents/agent1_plan.py
+from typing import Any, Callable, Dict, List
 from app.schema import Workspace, Decision, SubGoal
-from langchain_core.prompts import ChatPromptTemplate
 from app.llm.chat_sf import get_chat
 from app.llm.stream import stream_json
 
@@ -39,13 +39,58 @@ need_more 判定准则（用于输出 need_more 的布尔值）：
 可用上下文：
 Goal: {goal}
 Docs count: {n_docs}
-只输出 JSON。"""
+{searched}只输出 JSON。"""
 
-def decide_and_plan(llm=None, ws: Workspace = None) -> Decision:
+def _searched_block(searched: Dict[str, int] | None) -> str:
+    if not searched:
+        return ""
+    lines = "\n".join(f"- {q}（保留 {n} 篇）" for q, n in searched.items())
+    return ("已检索过的子目标（不要重复；保留 0 篇的可换一种查询方式；已保留的资料足以回答 Goal 时 need_more=false）：\n"
+            f"{lines}\n")
+
+def decide_and_plan(llm=None, ws: Workspace = None,
+                    on_sub_goal: Callable[[SubGoal], None] | None = None,
+                    searched: Dict[str, int] | None = None) -> Decision:
+    """
+    on_sub_goal：流式输出中每解析出一条完整子目标就回调一次，便于下游提前开始检索；返回的 Decision
+    复用这些 SubGoal 对象。need_more 解析出来之前的子目标先暂存，need_more=true 时再回调，false 时不回调
+    （模型把 sub_goals 写在 need_more 前面时，不为最终不用的子目标付检索费用）。
+    searched：多轮研究时前几轮的子目标查询 -> 保留文档数，写进提示词避免重复规划。
+    """
     print("[Agent1.stream] 规划与决策：")
     llm = llm or get_chat()
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _SYS), ("user", _USER)])
-    data = stream_json(prompt.format_messages(goal=ws.goal or ws.question, n_docs=len(ws.docs)),
-                       schema=PLAN_SCHEMA, llm=llm)
-    subs = [SubGoal(query=q) for q in data.get("sub_goals", []) if q.strip()]
+    early: List[SubGoal] = []
+    held: List[str] = []
+    need_more: List[bool | None] = [None]
+
+    def _dispatch(q: str) -> None:
+        sg = SubGoal(query=q)
+        early.append(sg)
+        on_sub_goal(sg)
+
+    def _on_value(path, value: Any) -> None:
+        if path == ("need_more",):
+            need_more[0] = bool(value)
+            for q in held if need_more[0] else []:
+                _dispatch(q)
+            held.clear()
+        elif len(path) == 2 and path[0] == "sub_goals" and value.strip():
+            if need_more[0] is None:
+                held.append(value)
+            elif need_more[0]:
+                _dispatch(value)
+
+    data = stream_json(prompt.format_messages(goal=ws.goal or ws.question, n_docs=len(ws.docs),
+                                               searched=_searched_block(searched)),
+                       schema=PLAN_SCHEMA, llm=llm, on_value=_on_value if on_sub_goal else None)
+    subs = []
+    for q in data.get("sub_goals", []):
+        if not q.strip():
+            continue
+        sg = next((e for e in early if e.query == q), None)
+        if sg is not None:
+            early.remove(sg)
+        subs.append(sg or SubGoal(query=q))
     return Decision(need_more=bool(data.get("need_more", False)), sub_goals=subs)
\ No newline at end of file
@@ -1,8 +1,10 @@
 # app/agents/agent2_filter.py
-import json
-from typing import List
-from langchain.prompts import ChatPromptTemplate
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
 from app.schema import Doc
+from app.config import get_settings
+from app.events import submit
 from app.llm.chat_sf import get_chat
 from app.llm.stream import stream_json
 
@@ -52,28 +54,33 @@ def _mk_catalog(docs: List[Doc]) -> str:
     return "\n".join(lines)
 
 
-def select_docs(
-    llm=None,
-    query: str = "",
-    subquery: str = "",
-    docs: List[Doc] = None,
-    top_k: int = 6
-) -> List[Doc]:
-    """调用 LLM 过滤候选文档"""
-    if not docs:
-        return []
-
-    print("[Agent2.stream] 资料筛选：")
-    llm = llm or get_chat()
+def _keep_schema(n: int) -> dict:
+    """按本次候选数放开 maxItems，避免候选多于 20 篇时输出被 schema 截断"""
+    schema = copy.deepcopy(KEEP_SCHEMA)
+    keep = schema["schema"]["properties"]["keep"]
+    keep["maxItems"] = max(keep["maxItems"], n)
+    keep["items"]["maximum"] = max(0, n - 1)
+    return schema
 
-    catalog = _mk_catalog(docs)
+def _filter_once(llm, query: str, subquery: str, docs: List[Doc], on_index: Callable[[int], None] | None = None,
+                 echo: str | None = None, label: str | None = None) -> Tuple[List[int], bool]:
+    """单次 LLM 筛选：返回 (去重后保持顺序的保留索引, 是否明确选择 0 条)"""
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _SYS), ("user", _USER)])
 
+    def _on_value(path, i) -> None:
+        # schema 已保证是非负整数
+        if len(path) == 2 and path[0] == "keep" and i < len(docs):
+            on_index(i)
+
     # 流式 JSON 解析
     data = stream_json(
-        prompt.format_messages(query=query, subquery=subquery, catalog=catalog),
-        schema=KEEP_SCHEMA,
+        prompt.format_messages(query=query, subquery=subquery, catalog=_mk_catalog(docs)),
+        schema=_keep_schema(len(docs)),
         llm=llm,
+        echo=echo,
+        label=label,
+        on_value=_on_value if on_index else None,
     ) or {}
 
     # 兼容 LLM 返回 [] 的情况，并判断是否“明确选择0条”
@@ -100,9 +107,83 @@ def select_docs(
         if i not in seen:
             seen.add(i)
             uniq.append(i)
+    return uniq, explicit_zero
+
+def _select_sharded(llm, query: str, subquery: str, docs: List[Doc], top_k: int, size: int,
+                    concurrency: int, tournament: bool) -> Tuple[List[int], bool]:
+    """
+    分片筛选：候选按 size 篇一组切成固定大小的清单并发筛选，片内索引加偏移还原为全局索引；
+    合并后超过 top_k 时，tournament=True 再对合并结果做一轮筛选，否则按全局索引（即 rerank 顺序）截断。
+    """
+    shards = [(off, docs[off:off + size]) for off in range(0, len(docs), size)]
+    print(f"[Agent2] 分片筛选：{len(docs)} 篇 -> {len(shards)} 片（每片 ≤{size}，并发 {concurrency}）")
+    # 并发输出逐 token 打印会交错，改为整段打印
+    echo = "buffer" if get_settings().STREAM_ECHO == "stream" else None
+
+    def _one(off: int, part: List[Doc]) -> Tuple[List[int], bool]:
+        idxs, zero = _filter_once(llm, query, subquery, part, echo=echo,
+                                  label=f"[Agent2] 分片 {off}-{off + len(part) - 1}")
+        return [off + i for i in idxs], zero
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(shards))), thread_name_prefix="filter") as pool:
+        results = [f.result() for f in [submit(pool, _one, off, part) for off, part in shards]]
+    if all(zero for _, zero in results):
+        return [], True
+    merged = sorted({i for idxs, _ in results for i in idxs})
+    if len(merged) <= top_k or not tournament:
+        return merged, False
+    # 第二轮：合并结果重新编号成一个清单再筛一次，映射回全局索引
+    idxs, zero = _filter_once(llm, query, subquery, [docs[i] for i in merged], echo=echo,
+                              label="[Agent2] 复选")
+    if zero:
+        return merged, False
+    return [merged[i] for i in idxs], False
+
+def select_docs(
+    llm=None,
+    query: str = "",
+    subquery: str = "",
+    docs: List[Doc] = None,
+    top_k: int = 6,
+    on_keep: Callable[[Doc], None] | None = None,
+    shard_size: int | None = None,
+    echo: str | None = None,
+) -> List[Doc]:
+    """
+    调用 LLM 过滤候选文档。
+    on_keep：流式输出中每出现一个有效保留索引就回调对应文档（去重、最多 top_k 篇），便于下游提前清洗；
+    最终结果仍以完整解析为准，回调过但未被保留的文档由调用方丢弃。
+    候选多于 shard_size（默认 FILTER_SHARD_SIZE，0 = 不分片）时分片并发筛选，on_keep 在合并后才回调。
+    """
+    if not docs:
+        return []
+
+    s = get_settings()
+    print(f"[Agent2.stream] 资料筛选：{subquery}" if subquery != query else "[Agent2.stream] 资料筛选：")
+    llm = llm or get_chat()
+    size = s.FILTER_SHARD_SIZE if shard_size is None else shard_size
+
+    if size > 0 and len(docs) > size:
+        uniq, explicit_zero = _select_sharded(llm, query, subquery, docs, top_k, size,
+                                              s.FILTER_CONCURRENCY, s.FILTER_TOURNAMENT)
+        if on_keep:
+            for i in uniq[:top_k]:
+                on_keep(docs[i])
+    else:
+        sent = set()
+
+        def _on_index(i: int) -> None:
+            if i not in sent and len(sent) < top_k:
+                sent.add(i)
+                on_keep(docs[i])
+
+        uniq, explicit_zero = _filter_once(llm, query, subquery, docs, on_index=_on_index if on_keep else None,
+                                           echo=echo)
 
     # 若明确选择0条 → 返回空；否则沿用原逻辑
     if uniq:
+        if len(uniq) > top_k:
+            print(f"  · 保留 {len(uniq)} 篇，按 top_k 取前 {top_k} 篇")
         kept = [docs[i] for i in uniq][:top_k]
     elif explicit_zero:
         kept = []
@@ -116,4 +197,4 @@ def select_docs(
         for i, d in enumerate(kept):
             print(f"  · {i+1}. {d.title or d.url}  -> {d.url}")
 
-    return kept
\ No newline at end of file
+    return kept
@@ -1,9 +1,15 @@
 # app/agents/agent2b_clean.py
-from typing import List
-from langchain_core.prompts import ChatPromptTemplate
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+from app.config import get_settings
+from app.events import emit, submit
 from app.llm.chat_sf import get_chat
+from app.llm.ratelimit import priority
 from app.llm.stream import stream_text
 from app.schema import Doc
+from app.storage.fs_store import get_blob_store
+from app.tools.parse_html import needs_llm_clean, pre_clean
 
 _SYS = ""
 _USER = """你是文本清洗器。对给定文本做“最小但有效”的清洗，仅输出清洗后的纯文本：
@@ -14,25 +20,124 @@ _USER = """你是文本清洗器。对给定文本做“最小但有效”的清
 待清洗文本：
 {content}"""
 
-def clean_text(llm=None, content: str = "") -> str:
+def clean_text(llm=None, content: str = "", echo: str | None = None, label: str | None = None,
+               cache: bool | None = None) -> str:
     llm = llm or get_chat()
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _SYS), ("user", _USER)])
-    out = stream_text(prompt.format_messages(content=content), llm=llm)
+    out = stream_text(prompt.format_messages(content=content), llm=llm, echo=echo, label=label, cache=cache)
     return out.strip()
 
-def clean_docs(llm=None, docs: List[Doc] | None = None) -> List[Doc]:
+def _clean_one(llm, d: Doc, echo: str | None) -> Doc:
+    s = get_settings()
+    try:
+        if s.WS_BACKEND == "sqlite":
+            # 原文存入 blob 库（同内容只存一份），清洗后仍可追溯
+            d.meta = dict(d.meta or {})
+            d.meta["raw_ref"] = get_blob_store().put(d.content or "")
+        content = d.content or ""
+        if s.RULE_CLEAN:
+            # 先做规则清洗；质量达标直接采用，否则把更短的预清洗文本交给 LLM
+            content = pre_clean(content) or content
+            if not needs_llm_clean(content):
+                d.content = content
+                d.meta = dict(d.meta or {})
+                d.meta["cleaned"] = "rule"
+                return d
+        c = clean_text(llm=llm, content=content, echo=echo,
+                       label=f"[Agent2b.stream] 清洗：{d.title or d.url or d.id}")
+        d.content = c
+        d.meta = dict(d.meta or {})
+        d.meta["cleaned"] = True
+    except Exception as e:
+        d.meta = dict(d.meta or {})
+        d.meta["clean_error"] = str(e)
+    return d
+
+def _clean_background(llm, d: Doc, echo: str | None) -> Doc:
+    # 边筛选边清洗时线程继承的是筛选阶段的上下文，显式按清洗阶段的后台优先级排队，不与交互调用争抢
+    with priority("background"):
+        return _clean_one(llm, d, echo)
+
+def _emit_cleaned(d: Doc) -> None:
+    m = d.meta or {}
+    emit("doc_cleaned", id=d.id, title=d.title, url=d.url, cleaned=m.get("cleaned"), error=m.get("clean_error"))
+
+def iter_clean_docs(
+    llm=None,
+    docs: List[Doc] | None = None,
+    concurrency: int | None = None,
+    echo: str | None = None,
+) -> Iterator[Tuple[int, Doc]]:
+    """并发清洗，按完成顺序产出 (原始下标, doc)，便于下游尽早开始"""
     if not docs:
-        return []
+        return
     llm = llm or get_chat()
-    res: List[Doc] = []
-    for d in docs:
+    s = get_settings()
+    n = max(1, min(concurrency or s.CLEAN_CONCURRENCY, len(docs)))
+    if n == 1:
+        for i, d in enumerate(docs):
+            d = _clean_one(llm, d, echo)
+            _emit_cleaned(d)
+            yield i, d
+        return
+    # 并发时逐 token 打印会交错，默认改为整段打印
+    if echo is None and s.STREAM_ECHO == "stream":
+        echo = "buffer"
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="clean") as pool:
+        futs = {submit(pool, _clean_one, llm, d, echo): i for i, d in enumerate(docs)}
+        for f in as_completed(futs):
+            d = f.result()
+            _emit_cleaned(d)
+            yield futs[f], d
+
+def clean_docs(
+    llm=None,
+    docs: List[Doc] | None = None,
+    concurrency: int | None = None,
+    echo: str | None = None,
+) -> List[Doc]:
+    if not docs:
+        return []
+    res: List[Doc | None] = [None] * len(docs)
+    for i, d in iter_clean_docs(llm=llm, docs=docs, concurrency=concurrency, echo=echo):
+        res[i] = d
+    return res
+
+
+class CleanPool:
+    """
+    边筛选边清洗：submit() 收到一篇就开始清洗（在副本上进行），collect(docs) 按 docs 顺序取回结果；
+    没提前提交的当场补洗，提前提交但最终未保留的结果直接丢弃。
+    """
+
+    def __init__(self, llm=None, concurrency: int | None = None, echo: str | None = None):
+        s = get_settings()
+        self.llm = llm or get_chat()
+        # 与筛选阶段的输出同时进行，逐 token 打印会交错，默认改为整段打印
+        if echo is None and s.STREAM_ECHO == "stream":
+            echo = "buffer"
+        self.echo = echo
+        self.pool = ThreadPoolExecutor(max_workers=max(1, concurrency or s.CLEAN_CONCURRENCY),
+                                       thread_name_prefix="clean")
+        self.futs: Dict[str, Future] = {}
+        # 按子目标并发筛选时，多个筛选线程会同时提交
+        self.lock = threading.Lock()
+
+    def submit(self, d: Doc) -> None:
+        with self.lock:
+            if d.id not in self.futs:
+                self.futs[d.id] = submit(self.pool, _clean_background, self.llm, d.model_copy(), self.echo)
+
+    def collect(self, docs: List[Doc]) -> List[Doc]:
         try:
-            c = clean_text(llm=llm, content=d.content or "")
-            d.content = c
-            d.meta = dict(d.meta or {})
-            d.meta["cleaned"] = True
-        except Exception as e:
-            d.meta = dict(d.meta or {})
-            d.meta["clean_error"] = str(e)
-        res.append(d)
-    return res
\ No newline at end of file
+            for d in docs:
+                self.submit(d)
+            want = {self.futs[d.id]: i for i, d in enumerate(docs)}
+            res: List[Doc | None] = [None] * len(docs)
+            for f in as_completed(want):
+                res[want[f]] = f.result()
+                _emit_cleaned(res[want[f]])
+            return res
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,10 +1,11 @@
 # app/agents/agent3_write.py
 from __future__ import annotations
 from typing import List, Tuple
-from langchain_core.prompts import ChatPromptTemplate
 from app.llm.chat_sf import get_chat
+from app.config import get_settings
 from app.llm.stream import stream_text
 from app.schema import Workspace, Doc
+from app.tools.tokens import count_tokens, truncate_to_tokens
 
 _SYS = ""
 _USER = """你将基于“候选资料片段”回答“用户问题”。要求：
@@ -22,8 +23,51 @@ _USER = """你将基于“候选资料片段”回答“用户问题”。要求
 {contexts}
 """
 
-def _mk_context(docs: List[Doc], max_chars_per_doc: int = 1200, max_docs: int = 8) -> Tuple[str, List[Doc]]:
-    """把文档裁剪成可读片段，并返回用于展示的 doc 列表（保持顺序、去重 URL）"""
+def _relevance(d: Doc, rank: int) -> float:
+    """检索/重排得分 + 名次先验（无得分时只看名次）"""
+    sc = d.score if d.score is not None else (d.meta or {}).get("score")
+    base = float(sc) if isinstance(sc, (int, float)) and sc > 0 else 0.0
+    return base + 1.0 / (rank + 1)
+
+def _allocate(needs: List[int], weights: List[float], budget: int, min_tokens: int) -> List[int]:
+    """
+    按相关度注水分配 token：需求小于份额的文档拿满并退出，剩余预算在其余文档间按权重再分；
+    若有文档分不到 min_tokens，则丢掉相关度最低的一篇重新分配。返回每篇分配量（0 = 不入选）。
+    """
+    active = [i for i in range(len(needs)) if needs[i] > 0]
+    while active:
+        alloc = [0] * len(needs)
+        rest, left = list(active), budget
+        while rest:
+            total_w = sum(weights[i] for i in rest) or 1.0
+            full = [i for i in rest if needs[i] <= left * weights[i] / total_w]
+            if not full:
+                for i in rest:
+                    alloc[i] = int(left * weights[i] / total_w)
+                break
+            for i in full:
+                alloc[i] = needs[i]
+                left -= needs[i]
+            rest = [i for i in rest if i not in full]
+        starved = [i for i in active if alloc[i] < min(min_tokens, needs[i])]
+        if not starved:
+            return alloc
+        active.remove(min(active, key=lambda i: weights[i]))
+    return [0] * len(needs)
+
+def _mk_context(
+    docs: List[Doc],
+    budget_tokens: int | None = None,
+    max_docs: int | None = None,
+    min_doc_tokens: int | None = None,
+) -> Tuple[str, List[Doc]]:
+    """
+    按 token 预算打包上下文：按相关度在文档间分配预算，正文在句子边界截断；
+    返回上下文文本与用于展示的 doc 列表（保持顺序、去重 URL）。
+    """
+    s = get_settings()
+    budget = budget_tokens or s.WRITE_CONTEXT_TOKENS
+    min_doc = s.WRITE_MIN_DOC_TOKENS if min_doc_tokens is None else min_doc_tokens
     seen = set()
     ordered: List[Doc] = []
     for d in docs:
@@ -33,18 +77,29 @@ def _mk_context(docs: List[Doc], max_chars_per_doc: int = 1200, max_docs: int =
             continue
         seen.add(key)
         ordered.append(d)
-        if len(ordered) >= max_docs:
+        if max_docs and len(ordered) >= max_docs:
             break
 
-    lines = []
-    for i, d in enumerate(ordered, 1):
+    heads, bodies = [], []
+    for d in ordered:
         title = d.title or (d.url or "untitled")
         url = d.url or "(no url)"
-        body = (d.content or "").strip()
-        if len(body) > max_chars_per_doc:
-            body = body[:max_chars_per_doc].rstrip() + " ..."
-        lines.append(f"[{i}] {title}\nURL: {url}\n{body}\n")
-    return "\n".join(lines), ordered
+        heads.append(f"{title}\nURL: {url}\n")
+        bodies.append((d.content or "").strip())
+    # 每篇的需求 = 标题行 + 正文 token；编号行开销按 4 token 计
+    head_tok = [count_tokens(h) + 4 for h in heads]
+    needs = [head_tok[i] + count_tokens(b) for i, b in enumerate(bodies)]
+    weights = [_relevance(d, r) for r, d in enumerate(ordered)]
+    alloc = _allocate(needs, weights, budget, min_doc)
+
+    lines, used = [], []
+    for i, d in enumerate(ordered):
+        if alloc[i] <= 0:
+            continue
+        body = truncate_to_tokens(bodies[i], alloc[i] - head_tok[i])
+        used.append(d)
+        lines.append(f"[{len(used)}] {heads[i]}{body}\n")
+    return "\n".join(lines), used
 
 def _mk_refs(docs: List[Doc]) -> str:
     """生成参考来源列表，带 URL。只展示有 URL 的条目。"""
@@ -63,15 +118,16 @@ def _mk_refs(docs: List[Doc]) -> str:
         return ""
     return "\n\n参考来源：\n" + "\n".join(refs) + "\n"
 
-def compose_answer(llm=None, ws: Workspace | None = None) -> str:
+def compose_answer(llm=None, ws: Workspace | None = None, budget_tokens: int | None = None) -> str:
     if ws is None:
         return "错误：Workspace 为空。"
     llm = llm or get_chat()
 
-    # 组装上下文
-    contexts, used_docs = _mk_context(ws.docs or [])
+    # 组装上下文（按 token 预算）
+    contexts, used_docs = _mk_context(ws.docs or [], budget_tokens=budget_tokens)
 
     # 调用 LLM 生成正文
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([("system", _SYS), ("user", _USER)])
     body = stream_text(
         prompt.format_messages(
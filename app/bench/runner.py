@@ -0,0 +1,293 @@
+# app/bench/runner.py
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from app.bench.standins import StandinConfig, StandinServer
+
+# 注意：Settings 在第一次 get_settings() 时读取环境变量，
+# 必须先由 configure_env() 把地址指向替身服务。
+
+DEFAULT_QUERIES = [
+    "大模型幻觉的主要缓解方法有哪些",
+    "2025 年检索增强生成的代表性工作",
+    "What are the most promising approaches for reducing hallucinations in LLMs",
+    "对比 RLHF 与 DPO 的训练成本和效果",
+    "长上下文模型在文档问答上的评测基准",
+    "How do rerankers improve retrieval quality in RAG systems",
+    "向量数据库 HNSW 与 IVF 索引的取舍",
+    "开源中文大模型的事实性评测结果",
+]
+DEFAULT_ANSWERS = "关注 2024-2025 年的公开研究，优先论文与官方技术报告"
+
+def bench_env(base_url: str, data_dir: str, overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """把 SiliconFlow / Tavily 指向替身服务，关闭缓存与控制台逐 token 输出；overrides 最后覆盖。
+    NO_DOTENV=1 让本进程与子进程都不加载 .env，真实地址 / key 不会覆盖替身配置"""
+    env = {
+        "NO_DOTENV": "1",
+        "SILICONFLOW_BASE_URL": f"{base_url}/v1",
+        "SILICONFLOW_API_KEY": "bench",
+        "TAVILY_API_KEY": "bench",
+        "TAVILY_BASE_URL": base_url,
+        "DATA_DIR": data_dir,
+        "STREAM_ECHO": "silent",
+        "LLM_CACHE": "0",
+        "SEARCH_CACHE": "0",
+        "SEMANTIC_CACHE": "0",
+        "TRACE": "1",
+    }
+    env.update(overrides or {})
+    return env
+
+def configure_env(base_url: str, data_dir: str, overrides: Optional[Dict[str, str]] = None) -> None:
+    """在当前进程生效 bench_env()"""
+    env = bench_env(base_url, data_dir, overrides)
+    from app.config import get_settings
+    if get_settings.cache_info().currsize:
+        raise RuntimeError("configure_env() must run before get_settings() is first called")
+    os.environ.update(env)
+
+def _pct(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    a = np.asarray(values, dtype=float)
+    return {
+        "n": int(a.size),
+        "mean": round(float(a.mean()), 1),
+        "p50": round(float(np.percentile(a, 50)), 1),
+        "p95": round(float(np.percentile(a, 95)), 1),
+        "p99": round(float(np.percentile(a, 99)), 1),
+        "max": round(float(a.max()), 1),
+    }
+
+def run_session(query: str, answers: str = DEFAULT_ANSWERS) -> Dict[str, Any]:
+    """完整跑一轮 start_intake + continue_after_answers，返回各阶段耗时（毫秒）"""
+    from app.pipelines.main_loop import continue_after_answers, start_intake
+    out: Dict[str, Any] = {"query": query, "ok": False}
+    t0 = time.perf_counter()
+    try:
+        ws, _qs = start_intake(query)
+        t1 = time.perf_counter()
+        t1_wall = time.time()
+        ws, _answer = continue_after_answers(ws, answers)
+        t2 = time.perf_counter()
+    except Exception as e:
+        out["error"] = f"{e.__class__.__name__}: {e}"[:300]
+        out["e2e_ms"] = (time.perf_counter() - t0) * 1000
+        return out
+    stages: Dict[str, float] = {}
+    first_answer = None
+    for sp in ws.trace:
+        if sp.get("kind") == "stage":
+            stages[sp["name"]] = stages.get(sp["name"], 0.0) + sp.get("ms", 0.0)
+        elif sp.get("kind") == "llm" and sp.get("name") == "write" and sp.get("ttft_ms") is not None:
+            first_answer = (sp["start"] + sp["ttft_ms"] / 1000 - t1_wall) * 1000
+    out.update(
+        ok=True,
+        e2e_ms=(t2 - t0) * 1000,
+        intake_ms=(t1 - t0) * 1000,
+        answer_ms=(t2 - t1) * 1000,
+        first_answer_token_ms=first_answer,
+        stages=stages,
+        docs=len(ws.docs),
+    )
+    return out
+
+def run_level(queries: Sequence[str], concurrency: int, sessions: int) -> Dict[str, Any]:
+    """以给定并发跑 sessions 个会话（轮流取 queries），汇总分位数"""
+    jobs = [queries[i % len(queries)] for i in range(sessions)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        results = list(pool.map(run_session, jobs))
+    wall = time.perf_counter() - t0
+    ok = [r for r in results if r["ok"]]
+    stage_names = sorted({k for r in ok for k in r["stages"]})
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "ok": len(ok),
+        "errors": [r["error"] for r in results if not r["ok"]][:10],
+        "wall_s": round(wall, 2),
+        "throughput_per_min": round(len(ok) / wall * 60, 2) if wall > 0 else 0.0,
+        "e2e_ms": _pct([r["e2e_ms"] for r in ok]),
+        "answer_ms": _pct([r["answer_ms"] for r in ok]),
+        "first_answer_token_ms": _pct([r["first_answer_token_ms"] for r in ok
+                                       if r.get("first_answer_token_ms") is not None]),
+        "stages_ms": {n: _pct([r["stages"][n] for r in ok if n in r["stages"]]) for n in stage_names},
+        # ru_maxrss 在 Linux 上单位是 KB；进程级峰值，只增不减
+        "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=_root(),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def run_bench(
+    queries: Sequence[str] | None = None,
+    levels: Sequence[int] = (1, 4),
+    sessions: int | None = None,
+    cfg: StandinConfig | None = None,
+    overrides: Optional[Dict[str, str]] = None,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    """起替身服务 → 指向它 → 逐个并发级别压测；返回可直接存盘对比的结果"""
+    cfg = cfg or StandinConfig()
+    queries = list(queries or DEFAULT_QUERIES)
+    server = StandinServer(cfg).start()
+    data_dir = tempfile.mkdtemp(prefix="searchagent-bench-")
+    configure_env(server.base_url, data_dir, overrides)
+    sink = sys.stdout if verbose else io.StringIO()
+    report: Dict[str, Any] = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_rev(),
+        "standin": asdict(cfg),
+        "overrides": dict(overrides or {}),
+        "queries": len(queries),
+        "levels": [],
+    }
+    try:
+        with contextlib.redirect_stdout(sink):
+            # 预热：导入、建连接池、加载索引，不计入结果
+            run_session(queries[0])
+        for c in levels:
+            n = sessions or max(len(queries), 2 * c)
+            print(f"[Bench] concurrency={c} sessions={n} ...", flush=True)
+            with contextlib.redirect_stdout(sink):
+                lvl = run_level(queries, c, n)
+            if not verbose:
+                sink.seek(0)
+                sink.truncate()
+            report["levels"].append(lvl)
+            print(format_level(lvl), flush=True)
+    finally:
+        report["standin_requests"] = server.stats
+        from app.llm.ratelimit import rate_stats
+        report["rate"] = rate_stats()
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+def _root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _wall_ms(cmd: List[str], env: Dict[str, str]) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(cmd, cwd=_root(), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   stdin=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - t0) * 1000
+
+def measure_startup(
+    runs: int = 5,
+    cfg: StandinConfig | None = None,
+    query: str | None = None,
+    overrides: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    冷 / 热启动对比（都在子进程里跑，替身服务提供 LLM 与检索）：
+    - import_ms：新进程导入 app.pipelines.main_loop 的耗时
+    - cold_cli_ms：scripts/ask.py --local 一次完整问答的进程墙钟时间
+    - warm_cli_ms：守护进程预热后，scripts/ask.py 经 socket 完成同样问答的墙钟时间
+    - daemon_ready_ms：守护进程从启动到可以接收任务
+    """
+    cfg = cfg or StandinConfig()
+    query = query or DEFAULT_QUERIES[0]
+    server = StandinServer(cfg).start()
+    data_dir = tempfile.mkdtemp(prefix="searchagent-startup-")
+    sock = os.path.join(data_dir, "daemon.sock")
+    env = dict(os.environ, **bench_env(server.base_url, data_dir, overrides), DAEMON_SOCKET=sock)
+    py = sys.executable
+    ask = [py, os.path.join("scripts", "ask.py"), query, "--answers", DEFAULT_ANSWERS]
+    out: Dict[str, Any] = {"runs": runs, "git": _git_rev()}
+    daemon = None
+    try:
+        imports = [_wall_ms([py, "-c", "import app.pipelines.main_loop"], env) for _ in range(runs)]
+        bare = [_wall_ms([py, "-c", "pass"], env) for _ in range(runs)]
+        out["interpreter_ms"] = _pct(bare)
+        out["import_ms"] = _pct([a - b for a, b in zip(imports, bare)])
+        out["cold_cli_ms"] = _pct([_wall_ms(ask + ["--local"], env) for _ in range(runs)])
+
+        t0 = time.perf_counter()
+        daemon = subprocess.Popen([py, os.path.join("scripts", "daemon.py")], cwd=_root(), env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while not os.path.exists(sock):
+            if daemon.poll() is not None or time.perf_counter() - t0 > 60:
+                raise RuntimeError("daemon failed to start")
+            time.sleep(0.01)
+        out["daemon_ready_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        out["warm_cli_ms"] = _pct([_wall_ms(ask, env) for _ in range(runs)])
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return out
+
+def format_startup(rep: Dict[str, Any]) -> str:
+    lines = [f"[Startup] runs={rep['runs']}"]
+    for k in ("interpreter_ms", "import_ms", "cold_cli_ms", "warm_cli_ms"):
+        p = rep.get(k) or {}
+        if p:
+            lines.append(f"    {k:<16} p50 {p['p50']:>8.0f}  max {p['max']:>8.0f}  ms")
+    if rep.get("daemon_ready_ms") is not None:
+        lines.append(f"    {'daemon_ready_ms':<16} {rep['daemon_ready_ms']:>12.0f}  ms")
+    return "\n".join(lines)
+
+def format_level(lvl: Dict[str, Any]) -> str:
+    def row(name: str, p: Dict[str, float]) -> str:
+        if not p:
+            return f"    {name:<22} -"
+        return f"    {name:<22} p50 {p['p50']:>8.0f}  p95 {p['p95']:>8.0f}  p99 {p['p99']:>8.0f}  ms"
+    lines = [f"  c={lvl['concurrency']:<3} ok {lvl['ok']}/{lvl['sessions']}  wall {lvl['wall_s']}s  "
+             f"{lvl['throughput_per_min']}/min  rss {lvl['rss_peak_mb']}MB"]
+    lines.append(row("e2e", lvl["e2e_ms"]))
+    lines.append(row("answer (after intake)", lvl["answer_ms"]))
+    lines.append(row("first answer token", lvl["first_answer_token_ms"]))
+    for name, p in lvl["stages_ms"].items():
+        lines.append(row(f"stage:{name}", p))
+    for e in lvl["errors"]:
+        lines.append(f"    ! {e}")
+    return "\n".join(lines)
+
+def save_report(report: Dict[str, Any], out_dir: str, name: str = "bench") -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], keys: Sequence[str] = ("p50", "p95")) -> str:
+    """按并发级别对比 e2e / 首答 token / 各阶段分位数，输出相对变化"""
+    base = {lvl["concurrency"]: lvl for lvl in baseline.get("levels", [])}
+    lines = [f"[Bench] 对比基线 {baseline.get('created_at')} ({baseline.get('git')})"]
+    for lvl in report.get("levels", []):
+        b = base.get(lvl["concurrency"])
+        if not b:
+            continue
+        lines.append(f"  c={lvl['concurrency']}  throughput {b['throughput_per_min']} -> {lvl['throughput_per_min']}/min")
+        pairs = [("e2e", lvl["e2e_ms"], b["e2e_ms"]),
+                 ("first answer token", lvl["first_answer_token_ms"], b["first_answer_token_ms"])]
+        pairs += [(f"stage:{n}", p, b["stages_ms"].get(n, {})) for n, p in lvl["stages_ms"].items()]
+        for name, cur, old in pairs:
+            cells = []
+            for k in keys:
+                if cur.get(k) is None or not old.get(k):
+                    continue
+                cells.append(f"{k} {old[k]:.0f} -> {cur[k]:.0f} ({(cur[k] - old[k]) / old[k] * 100:+.1f}%)")
+            if cells:
+                lines.append(f"    {name:<22} " + "  ".join(cells))
+    return "\n".join(lines)
@@ -0,0 +1,261 @@
+# app/bench/standins.py
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+# 离线压测用的本地替身服务：
+# - SiliconFlow（OpenAI 兼容）：/v1/chat/completions（流式）、/v1/rerank、/v1/embeddings
+# - Tavily：/search，按查询生成固定大小的合成网页
+# 行为参数（首 token 延迟、生成速度、错误率、网页大小……）见 StandinConfig。
+
+_WORDS = ("model retrieval evidence benchmark hallucination grounding calibration dataset "
+          "evaluation decoding reasoning factuality citation knowledge alignment feedback").split()
+_CJK = "模型检索证据基准幻觉校准数据评测推理事实引用知识对齐反馈方法研究结果表明显著提升"
+
+@dataclass
+class StandinConfig:
+    ttft: float = 0.3                # 首 token 延迟（秒）
+    tokens_per_sec: float = 200.0    # 生成速度；<=0 表示不限速
+    answer_tokens: int = 300         # 写作阶段输出 token 数
+    think_tokens: int = 0            # 每次调用附带的 reasoning_content token 数
+    sub_goals: int = 3               # 规划阶段输出的子目标数
+    research_rounds: int = 1         # 多轮研究时规划到第几轮才给出 need_more=false（每轮重复一条旧子目标）
+    error_rate: float = 0.0          # chat / rerank / search 返回 5xx 的概率
+    search_latency: float = 0.5      # 检索延迟（秒）
+    page_kb: float = 20.0            # 合成网页大小（KB）
+    noisy_ratio: float = 0.3         # 带导航 / 编码块噪声的网页比例
+    dup_ratio: float = 0.2           # 与其它查询共用 URL 的结果比例
+    json_trailer: int = 0            # JSON 输出闭合后继续“啰嗦”的字符数（测提前结束）
+    seed: int = 0
+
+def _rng(*parts: Any) -> random.Random:
+    h = hashlib.sha1(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    return random.Random(int(h[:16], 16))
+
+def _sentence(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+    return "".join(rng.choice(_CJK) for _ in range(rng.randint(15, 30))) + "。"
+
+def synthetic_page(query: str, i: int, cfg: StandinConfig) -> Tuple[str, str, str]:
+    """(title, url, raw_content)；同一 (query, i) 结果固定，便于对比"""
+    rng = _rng(cfg.seed, query, i)
+    shared = rng.random() < cfg.dup_ratio
+    url_key = f"shared-{rng.randint(0, 20)}" if shared else hashlib.sha1(f"{query}|{i}".encode()).hexdigest()[:12]
+    rng_page = _rng(cfg.seed, url_key)
+    title = f"{query[:30]} — 资料 {url_key}"
+    paras, size = [], 0
+    target = int(cfg.page_kb * 1024)
+    while size < target:
+        p = " ".join(_sentence(rng_page) for _ in range(rng_page.randint(3, 6)))
+        paras.append(p)
+        size += len(p.encode("utf-8"))
+    body = "\n\n".join([f"# {title}", f"{query}。"] + paras)
+    if rng_page.random() < cfg.noisy_ratio:
+        nav = " | ".join(f"[菜单{j}](https://example.com/{j})" for j in range(8))
+        blob = "data:image/png;base64," + "A" * 2000
+        body = f"{nav}\n{body}\n![logo]({blob})\n版权所有 © 2025\n" + "\n".join(
+            f"[相关文章 {j}](https://example.com/r/{j})" for j in range(10))
+    return title, f"https://bench.example.com/{url_key}", body
+
+def _chunks(text: str, n: int = 4) -> List[str]:
+    return [text[i:i + n] for i in range(0, len(text), n)] or [""]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cfg: StandinConfig = StandinConfig()
+    stats: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _json(self, code: int, obj: Any) -> None:
+        b = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(b)))
+        self.end_headers()
+        self.wfile.write(b)
+
+    def _fail(self) -> bool:
+        if self.cfg.error_rate > 0 and random.random() < self.cfg.error_rate:
+            self._count("errors")
+            self._json(503, {"error": {"message": "stand-in injected error"}})
+            return True
+        return False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.rstrip("/")
+        self._count(path)
+        if self._fail():
+            return
+        if path.endswith("/chat/completions"):
+            return self._chat(body)
+        if path.endswith("/rerank"):
+            return self._rerank(body)
+        if path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if path.endswith("/search"):
+            return self._search(body)
+        self._json(404, {"error": "not found"})
+
+    # ---------- chat ----------
+    def _reply(self, body: Dict[str, Any]) -> str:
+        """根据提示词判断是哪个 agent，给出形状正确的输出"""
+        prompt = "\n".join(str(m.get("content") or "") for m in body.get("messages") or [])
+        rng = _rng(self.cfg.seed, prompt[:2000])
+        if '"questions"' in prompt:
+            return json.dumps({"questions": [f"澄清问题{i + 1}" for i in range(3)]}, ensure_ascii=False)
+        if '"goal"' in prompt:
+            q = re.search(r"原始问题：(.*)", prompt)
+            return json.dumps({"goal": (q.group(1) if q else "目标")[:50]}, ensure_ascii=False)
+        if "need_more" in prompt:
+            g = re.search(r"Goal: (.*)", prompt)
+            goal = (g.group(1) if g else "目标")[:60]
+            n_docs = re.search(r"Docs count: (\d+)", prompt)
+            need = not n_docs or n_docs.group(1) == "0"
+            # 多轮研究：提示词里列出已检索过的子目标，按已检索条数推算第几轮
+            done = len(re.findall(r"^- .*（保留 \d+ 篇）$", prompt, flags=re.M))
+            rnd = -(-done // max(1, self.cfg.sub_goals)) + 1
+            if done:
+                need = rnd <= self.cfg.research_rounds
+            subs = [f"{goal} 方面{done + i + 1}" for i in range(self.cfg.sub_goals)] if need else []
+            if done and subs:
+                subs[-1] = f"{goal} 方面1"
+            return json.dumps({"need_more": need, "sub_goals": subs}, ensure_ascii=False)
+        if "键名必须是 keep" in prompt:
+            n = len(re.findall(r"^\[\d+\]", prompt, flags=re.M))
+            keep = sorted(rng.sample(range(n), k=min(n, max(1, n // 2), 8))) if n else []
+            return json.dumps({"keep": keep})
+        if "文本清洗器" in prompt:
+            src = prompt.split("待清洗文本：", 1)[-1].strip()
+            return src[: max(200, len(src) // 2)]
+        return " ".join(_sentence(rng) for _ in range(max(1, self.cfg.answer_tokens // 12)))
+
+    def _chat(self, body: Dict[str, Any]) -> None:
+        text = self._reply(body)
+        if self.cfg.json_trailer and text.startswith("{"):
+            text += "\n\n以上为输出结果。" + "补充说明" * (self.cfg.json_trailer // 4)
+        model = body.get("model") or "stand-in"
+        cid = "chatcmpl-" + uuid.uuid4().hex[:12]
+        if not body.get("stream"):
+            time.sleep(self.cfg.ttft)
+            return self._json(200, {
+                "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            })
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.cfg.tokens_per_sec if self.cfg.tokens_per_sec > 0 else 0.0
+
+        def send(delta: Dict[str, Any], finish: str | None = None) -> None:
+            ev = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                  "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self._write_chunk(f"data: {json.dumps(ev, ensure_ascii=False)}\n\n")
+
+        try:
+            time.sleep(self.cfg.ttft)
+            for _ in range(self.cfg.think_tokens):
+                send({"role": "assistant", "content": "", "reasoning_content": "思"})
+                if delay:
+                    time.sleep(delay)
+            for piece in _chunks(text):
+                send({"role": "assistant", "content": piece})
+                if delay:
+                    time.sleep(delay)
+            send({}, "stop")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（取消 / 提前结束解析）
+            self._count("client_aborts")
+            self.close_connection = True
+
+    def _write_chunk(self, s: str) -> None:
+        b = s.encode("utf-8")
+        self.wfile.write(f"{len(b):x}\r\n".encode() + b + b"\r\n")
+        self.wfile.flush()
+
+    # ---------- rerank / embeddings ----------
+    def _rerank(self, body: Dict[str, Any]) -> None:
+        q = set(str(body.get("query") or ""))
+        docs = body.get("documents") or []
+        time.sleep(0.02 + 0.0005 * len(docs))
+        res = [{"index": i, "relevance_score": round(len(q & set(str(d)[:2000])) / (len(q) or 1), 4)}
+               for i, d in enumerate(docs)]
+        res.sort(key=lambda x: -x["relevance_score"])
+        self._json(200, {"id": uuid.uuid4().hex, "results": res})
+
+    def _embeddings(self, body: Dict[str, Any]) -> None:
+        inputs = body.get("input") or []
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = []
+        for i, t in enumerate(inputs):
+            rng = _rng("emb", t)
+            data.append({"object": "embedding", "index": i, "embedding": [rng.uniform(-1, 1) for _ in range(64)]})
+        self._json(200, {"object": "list", "data": data, "model": body.get("model")})
+
+    # ---------- tavily ----------
+    def _search(self, body: Dict[str, Any]) -> None:
+        query = str(body.get("query") or "")
+        k = int(body.get("max_results") or 5)
+        time.sleep(self.cfg.search_latency)
+        results = []
+        for i in range(k):
+            title, url, raw = synthetic_page(query, i, self.cfg)
+            results.append({"title": title, "url": url, "content": raw[:300], "raw_content": raw,
+                            "score": round(1.0 - i / (k + 1), 3)})
+        self._json(200, {"query": query, "results": results, "response_time": self.cfg.search_latency})
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭 keep-alive 连接属正常情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+class StandinServer:
+    """在后台线程里起一个替身服务；base_url 供 Settings 使用"""
+
+    def __init__(self, cfg: StandinConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (_Handler,), {"cfg": cfg or StandinConfig(), "stats": {},
+                                                 "lock": threading.Lock()})
+        self.httpd = _Server((host, port), handler)
+        self.handler = handler
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="standin", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self.handler.lock:
+            return dict(self.handler.stats)
+
+    def start(self) -> "StandinServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
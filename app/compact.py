@@ -0,0 +1,144 @@
+# app/compact.py
+import math
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.schema import Doc, SubGoal, Workspace
+from app.storage.fs_store import get_blob_store
+
+# 工作区的紧凑内存表示，给要同时持有大量工作区的长驻进程用（如 GET /sessions）：
+# - WorkspaceHeader：只有表头字段与条数，不含 docs / sub_goals / trace；
+# - DocTable：doc 元数据按列存（score 用 array('d')，source 驻留为共享字符串，空 meta 存 None），
+#   正文只存 BlobStore 引用，按需读取，不常驻内存；还没进 BlobStore 的正文（JSON 后端、内存里的新文档）
+#   就地 zlib 压缩保存——读取路径不写 BlobStore，只有 save_ws 写；
+# - CompactWorkspace：表头 + DocTable + 子目标元组；to_workspace() 还原为 pydantic Workspace
+#   （Doc 为惰性对象），与原 schema 往返一致。
+
+_HEADER = ("id", "question", "goal", "checkpoint", "created_at", "updated_at")
+
+def _dt(v: Any) -> datetime:
+    return datetime.fromisoformat(v) if isinstance(v, str) else v
+
+class WorkspaceHeader:
+    """load_ws(ws_id, mode="header") 的结果：只读表头字段，docs / sub_goals 只给条数"""
+    __slots__ = _HEADER + ("n_docs", "n_sub_goals")
+
+    def __init__(self, data: Dict[str, Any], n_docs: int = 0, n_sub_goals: int = 0):
+        self.id = data["id"]
+        self.question = data["question"]
+        self.goal = data.get("goal")
+        self.checkpoint = data.get("checkpoint") or {}
+        self.created_at = _dt(data.get("created_at"))
+        self.updated_at = _dt(data.get("updated_at"))
+        self.n_docs = n_docs
+        self.n_sub_goals = n_sub_goals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class DocTable:
+    """Doc 元数据的列式存储；refs 为 BlobStore 引用（str）或压缩后的正文（bytes）"""
+    __slots__ = ("ids", "titles", "urls", "scores", "sources", "metas", "refs")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.titles: List[Optional[str]] = []
+        self.urls: List[Optional[str]] = []
+        # None 记为 NaN
+        self.scores = array("d")
+        self.sources: List[Optional[str]] = []
+        self.metas: List[Optional[Dict]] = []
+        self.refs: List[str | bytes] = []
+
+    def append_row(self, row: Dict[str, Any], ref: str | None, content: str | None = None) -> None:
+        """row 为不含 content 的 Doc 字段（WorkspaceStore.load_dict 的 doc 行）；没有 ref 时 content 压缩保存"""
+        self.ids.append(row["id"])
+        self.titles.append(row.get("title"))
+        self.urls.append(row.get("url"))
+        score = row.get("score")
+        self.scores.append(math.nan if score is None else float(score))
+        source = row.get("source")
+        self.sources.append(sys.intern(source) if source else source)
+        self.metas.append(row.get("meta") or None)
+        self.refs.append(ref if ref is not None else zlib.compress((content or "").encode("utf-8")))
+
+    def append(self, d: Doc) -> None:
+        """未加载的惰性 Doc 直接复用原引用，已加载的正文压缩保存（不写 BlobStore）"""
+        ref = (d.__pydantic_private__ or {}).get("_content_ref")
+        if d.content_loaded:
+            ref = None
+        self.append_row(d.model_dump(exclude={"content"}), ref, None if ref is not None else d.content)
+
+    @classmethod
+    def from_docs(cls, docs: List[Doc]) -> "DocTable":
+        t = cls()
+        for d in docs:
+            t.append(d)
+        return t
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def fields(self, i: int) -> Dict[str, Any]:
+        score = self.scores[i]
+        return {"id": self.ids[i], "title": self.titles[i], "url": self.urls[i],
+                "score": None if math.isnan(score) else score, "source": self.sources[i],
+                "meta": dict(self.metas[i] or {})}
+
+    def content(self, i: int) -> str:
+        ref = self.refs[i]
+        if isinstance(ref, bytes):
+            return zlib.decompress(ref).decode("utf-8")
+        return get_blob_store().get(ref)
+
+    def __getitem__(self, i: int) -> Doc:
+        ref = self.refs[i]
+        if isinstance(ref, bytes):
+            return Doc(content=self.content(i), **self.fields(i))
+        return Doc.lazy(ref, **self.fields(i))
+
+    def __iter__(self) -> Iterator[Doc]:
+        return (self[i] for i in range(len(self)))
+
+class CompactWorkspace:
+    """load_ws(ws_id, mode="compact") 的结果；to_workspace() 还原为 Workspace"""
+    __slots__ = _HEADER + ("docs", "sub_goals", "trace")
+
+    def __init__(self, data: Dict[str, Any], docs: DocTable, sub_goals: List[Tuple[str, str, str]]):
+        head = WorkspaceHeader(data)
+        for k in _HEADER:
+            setattr(self, k, getattr(head, k))
+        self.docs = docs
+        self.sub_goals = sub_goals
+        self.trace: List[Dict[str, Any]] = data.get("trace") or []
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompactWorkspace":
+        """data 为 WorkspaceStore.load_dict 的结果（doc 行带 _content_ref）或 Workspace JSON（带 content）"""
+        docs = DocTable()
+        for row in data.get("docs") or []:
+            row = dict(row)
+            ref = row.pop("_content_ref", None)
+            docs.append_row(row, ref, row.pop("content", None))
+        subs = [(sg["id"], sg["query"], sg.get("status", "pending")) for sg in data.get("sub_goals") or []]
+        return cls(data, docs, subs)
+
+    @classmethod
+    def from_workspace(cls, ws: Workspace) -> "CompactWorkspace":
+        data = ws.model_dump(exclude={"docs", "sub_goals"})
+        return cls(data, DocTable.from_docs(ws.docs), [(sg.id, sg.query, sg.status) for sg in ws.sub_goals])
+
+    @property
+    def header(self) -> WorkspaceHeader:
+        return WorkspaceHeader({k: getattr(self, k) for k in _HEADER}, len(self.docs), len(self.sub_goals))
+
+    def to_workspace(self) -> Workspace:
+        return Workspace(
+            id=self.id, question=self.question, goal=self.goal,
+            docs=list(self.docs),
+            sub_goals=[SubGoal(id=i, query=q, status=st) for i, q, st in self.sub_goals],
+            trace=list(self.trace), checkpoint=dict(self.checkpoint),
+            created_at=self.created_at, updated_at=self.updated_at,
+        )
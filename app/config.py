@@ -1,25 +1,153 @@
 import os
 from functools import lru_cache
-from dotenv import load_dotenv, find_dotenv
 
-# 强制从当前工作目录向上查找 .env，并覆盖系统环境
-_DOTENV_PATH = find_dotenv(filename=".env", usecwd=True)
-if not _DOTENV_PATH:
-    print("[config] WARN: .env not found from CWD")
-else:
-    print(f"[config] load .env -> {_DOTENV_PATH}")
-    load_dotenv(_DOTENV_PATH, override=True)  # 关键：override=True
+_DOTENV_LOADED = False
+
+def _load_dotenv() -> None:
+    """从当前工作目录向上查找 .env 并覆盖系统环境；首次读取配置时执行一次，导入本模块不做任何 IO。
+    环境变量 NO_DOTENV=1 时跳过（离线压测用，防止 .env 里的真实地址 / key 覆盖替身配置）"""
+    global _DOTENV_LOADED
+    if _DOTENV_LOADED:
+        return
+    _DOTENV_LOADED = True
+    if os.getenv("NO_DOTENV") == "1":
+        print("[config] NO_DOTENV=1, skip .env")
+        return
+    from dotenv import load_dotenv, find_dotenv
+    path = find_dotenv(filename=".env", usecwd=True)
+    if not path:
+        print("[config] WARN: .env not found from CWD")
+    else:
+        print(f"[config] load .env -> {path}")
+        load_dotenv(path, override=True)  # 关键：override=True
 
 class Settings:
-    SF_API_KEY: str = os.getenv("SILICONFLOW_API_KEY", "").strip()
-    SF_BASE_URL: str = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").strip()
-    SF_CHAT_MODEL: str = os.getenv("SF_CHAT_MODEL", "deepseek-ai/DeepSeek-V3").strip()
-    SF_RERANK_MODEL: str = os.getenv("SF_RERANK_MODEL", "Qwen/Qwen3-Reranker-8B").strip()
-    LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.2"))
-    TAVILY_API_KEY: str = os.getenv("TAVILY_API_KEY", "").strip()
-    DEFAULT_TOPK: int = int(os.getenv("DEFAULT_TOPK", "8"))
-    DATA_DIR: str = os.getenv("DATA_DIR", "data").strip()
-    SHOW_THINK: bool = os.getenv("SHOW_THINK", "1") in ("1", "true", "True")
+    """实例化时读取环境变量（先加载 .env）；通过 get_settings() 取进程内单例"""
+
+    def __init__(self) -> None:
+        _load_dotenv()
+        self.SF_API_KEY: str = os.getenv("SILICONFLOW_API_KEY", "").strip()
+        self.SF_BASE_URL: str = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").strip()
+        self.SF_CHAT_MODEL: str = os.getenv("SF_CHAT_MODEL", "deepseek-ai/DeepSeek-V3").strip()
+        self.SF_RERANK_MODEL: str = os.getenv("SF_RERANK_MODEL", "Qwen/Qwen3-Reranker-8B").strip()
+        self.LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+        self.TAVILY_API_KEY: str = os.getenv("TAVILY_API_KEY", "").strip()
+        # Tavily 接口地址，空 = SDK 默认（压测时指向本地替身服务）
+        self.TAVILY_BASE_URL: str = os.getenv("TAVILY_BASE_URL", "").strip()
+        self.DEFAULT_TOPK: int = int(os.getenv("DEFAULT_TOPK", "8"))
+        self.DATA_DIR: str = os.getenv("DATA_DIR", "data").strip()
+        # 工作区存储：sqlite（增量写入）/ json（每次整体重写）
+        self.WS_BACKEND: str = os.getenv("WS_BACKEND", "sqlite").strip()
+        self.SHOW_THINK: bool = os.getenv("SHOW_THINK", "1") in ("1", "true", "True")
+        # 控制台输出：stream 逐 token / buffer 整段 / silent 不打印
+        self.STREAM_ECHO: str = os.getenv("STREAM_ECHO", "stream").strip()
+        # 子目标并发检索：最大并发数、单条查询超时（秒）、整体检索截止时间（秒）
+        self.RETRIEVE_CONCURRENCY: int = int(os.getenv("RETRIEVE_CONCURRENCY", "4"))
+        self.RETRIEVE_TIMEOUT: float = float(os.getenv("RETRIEVE_TIMEOUT", "30"))
+        self.RETRIEVE_DEADLINE: float = float(os.getenv("RETRIEVE_DEADLINE", "60"))
+        # 流水线执行：规划边输出边检索、检索边 rerank 预打分、筛选边清洗；0 = 各阶段逐个完成（屏障模式）
+        self.PIPELINE: bool = os.getenv("PIPELINE", "1") in ("1", "true", "True")
+        # 筛选：按子目标分组各自筛选；单次清单超过 FILTER_SHARD_SIZE 篇时分片并发筛选（0 = 不分片），
+        # 分片合并后超过 top_k 时 FILTER_TOURNAMENT=1 再复选一轮，否则按 rerank 顺序截断
+        self.FILTER_PER_SUBGOAL: bool = os.getenv("FILTER_PER_SUBGOAL", "1") in ("1", "true", "True")
+        self.FILTER_SHARD_SIZE: int = int(os.getenv("FILTER_SHARD_SIZE", "20"))
+        self.FILTER_CONCURRENCY: int = int(os.getenv("FILTER_CONCURRENCY", "4"))
+        self.FILTER_TOURNAMENT: bool = os.getenv("FILTER_TOURNAMENT", "0") in ("1", "true", "True")
+        # 清洗阶段并发数（1 = 串行逐 token 打印）
+        self.CLEAN_CONCURRENCY: int = int(os.getenv("CLEAN_CONCURRENCY", "4"))
+        # 规则预清洗：质量达标的文档不再调用 LLM 清洗
+        self.RULE_CLEAN: bool = os.getenv("RULE_CLEAN", "1") in ("1", "true", "True")
+        # LLM 响应本地缓存（默认关闭）：存活秒数、最大条数、最大字节数
+        self.LLM_CACHE: bool = os.getenv("LLM_CACHE", "0") in ("1", "true", "True")
+        self.LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+        self.LLM_CACHE_MAX_BYTES: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        # 检索结果缓存（规范化查询 + k + 选项 -> Docs）
+        self.SEARCH_CACHE: bool = os.getenv("SEARCH_CACHE", "1") in ("1", "true", "True")
+        self.SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+        self.SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+        self.SEARCH_CACHE_MAX_BYTES: int = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+        # 本地向量索引：嵌入后端 hash（离线特征哈希）/ local（离线小模型，需 sentence-transformers）/
+        # sf（SiliconFlow embeddings）；EMBED_DIM 用于 hash / sf，local 的维度取自模型
+        self.EMBED_BACKEND: str = os.getenv("EMBED_BACKEND", "hash").strip()
+        self.EMBED_DIM: int = int(os.getenv("EMBED_DIM", "512"))
+        self.SF_EMBED_MODEL: str = os.getenv("SF_EMBED_MODEL", "BAAI/bge-m3").strip()
+        self.LOCAL_EMBED_MODEL: str = os.getenv("LOCAL_EMBED_MODEL", "BAAI/bge-small-zh-v1.5").strip()
+        # 本地模型设备：空 = 自动（有 GPU 用 GPU），或 cpu / cuda / mps
+        self.LOCAL_EMBED_DEVICE: str = os.getenv("LOCAL_EMBED_DEVICE", "").strip()
+        self.LOCAL_INDEX: bool = os.getenv("LOCAL_INDEX", "1") in ("1", "true", "True")
+        # 本地索引最高分 >= 该值时直接用本地结果、跳过联网检索；0 = 关闭
+        self.LOCAL_FIRST_SCORE: float = float(os.getenv("LOCAL_FIRST_SCORE", "0"))
+        # 语义查询缓存：目标 / 子目标嵌入相似度 >= 阈值、且数字与专名一致时复用以前筛选、清洗好的文档；
+        # 只在语义嵌入器（EMBED_BACKEND=local / sf）下生效，hash 嵌入分不清只差一个年份的查询；
+        # 最大存活秒数、最大条数（按最近访问淘汰）
+        self.SEMANTIC_CACHE: bool = os.getenv("SEMANTIC_CACHE", "1") in ("1", "true", "True")
+        self.SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        self.SEMANTIC_CACHE_MAX_AGE: float = float(os.getenv("SEMANTIC_CACHE_MAX_AGE", str(24 * 3600)))
+        self.SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+        # 检索后去重：URL 规范化 + SimHash 近似重复（汉明距离阈值）
+        self.DEDUP: bool = os.getenv("DEDUP", "1") in ("1", "true", "True")
+        self.DEDUP_HAMMING: int = int(os.getenv("DEDUP_HAMMING", "3"))
+        # 写作上下文 token 预算（按模型上下文窗口设置）与单篇最少分配
+        self.TOKEN_ENCODING: str = os.getenv("TOKEN_ENCODING", "cl100k_base").strip()
+        self.WRITE_CONTEXT_TOKENS: int = int(os.getenv("WRITE_CONTEXT_TOKENS", "6000"))
+        self.WRITE_MIN_DOC_TOKENS: int = int(os.getenv("WRITE_MIN_DOC_TOKENS", "120"))
+        # 段落级筛选：切块大小/重叠（token）、每个子目标保留段数、是否用 rerank 精排
+        self.PASSAGES: bool = os.getenv("PASSAGES", "1") in ("1", "true", "True")
+        self.PASSAGE_TOKENS: int = int(os.getenv("PASSAGE_TOKENS", "256"))
+        self.PASSAGE_OVERLAP: int = int(os.getenv("PASSAGE_OVERLAP", "32"))
+        self.PASSAGE_TOPN: int = int(os.getenv("PASSAGE_TOPN", "8"))
+        self.PASSAGE_RERANK: bool = os.getenv("PASSAGE_RERANK", "0") in ("1", "true", "True")
+        # 筛选前的 rerank 粗排：后端 sf（接口，不可用时退回 BM25）/ bm25 / off；只把 top-N 交给 LLM 筛选
+        self.RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "sf").strip()
+        self.RERANK_TOPN: int = int(os.getenv("RERANK_TOPN", "20"))
+        self.RERANK_BATCH: int = int(os.getenv("RERANK_BATCH", "32"))
+        self.RERANK_CONCURRENCY: int = int(os.getenv("RERANK_CONCURRENCY", "4"))
+        self.RERANK_TIMEOUT: float = float(os.getenv("RERANK_TIMEOUT", "30"))
+        # 单块最大 token（按 rerank 模型上限设置）与每篇最多送出的块数
+        self.RERANK_DOC_TOKENS: int = int(os.getenv("RERANK_DOC_TOKENS", "512"))
+        self.RERANK_MAX_CHUNKS: int = int(os.getenv("RERANK_MAX_CHUNKS", "4"))
+        # 出站连接池（每个服务商一个）：最大连接数、保活连接数与保活时长（秒）、请求超时、是否启用 HTTP/2
+        self.HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+        self.HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+        self.HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+        self.HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "120"))
+        self.HTTP2: bool = os.getenv("HTTP2", "0") in ("1", "true", "True")
+        # HTTP 服务：同时运行的会话数、排队上限（超出返回 503）、SSE 心跳间隔（秒）
+        self.API_MAX_CONCURRENT: int = int(os.getenv("API_MAX_CONCURRENT", "4"))
+        self.API_MAX_QUEUE: int = int(os.getenv("API_MAX_QUEUE", "16"))
+        self.API_HEARTBEAT: float = float(os.getenv("API_HEARTBEAT", "15"))
+        # 常驻进程（scripts/daemon.py）的 Unix socket 路径，空 = DATA_DIR/daemon.sock；并发上限同 API_MAX_CONCURRENT
+        self.DAEMON_SOCKET: str = os.getenv("DAEMON_SOCKET", "").strip()
+        # 批量模式（scripts/batch.py）：同时运行的查询数
+        self.BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+        # 多轮研究（app/pipelines/budget.py）：最多轮数（1 = 只规划、检索一轮）与预算（墙钟秒数 / LLM token /
+        # 检索次数，0 = 不限），可按请求覆盖；批量模式默认轮数 BATCH_MAX_ROUNDS（批量任务可以查得更深）
+        self.RESEARCH_MAX_ROUNDS: int = int(os.getenv("RESEARCH_MAX_ROUNDS", "1"))
+        self.RESEARCH_TIME_BUDGET: float = float(os.getenv("RESEARCH_TIME_BUDGET", "0"))
+        self.RESEARCH_TOKEN_BUDGET: int = int(os.getenv("RESEARCH_TOKEN_BUDGET", "0"))
+        self.RESEARCH_SEARCH_BUDGET: int = int(os.getenv("RESEARCH_SEARCH_BUDGET", "0"))
+        self.BATCH_MAX_ROUNDS: int = int(os.getenv("BATCH_MAX_ROUNDS", "3"))
+        # 调用调度（app/llm/ratelimit.py）：按服务 / 模型的令牌桶（每分钟请求数 / token 数，0 = 不限）、
+        # 自适应并发上限（429 / 5xx 时减半，成功后逐步加回）、可重试错误的退避重试次数与时间
+        self.RATE_LIMIT: bool = os.getenv("RATE_LIMIT", "1") in ("1", "true", "True")
+        self.LLM_RPM: float = float(os.getenv("LLM_RPM", "0"))
+        self.LLM_TPM: float = float(os.getenv("LLM_TPM", "0"))
+        self.SEARCH_RPM: float = float(os.getenv("SEARCH_RPM", "0"))
+        self.RERANK_RPM: float = float(os.getenv("RERANK_RPM", "0"))
+        self.RATE_MAX_CONCURRENCY: int = int(os.getenv("RATE_MAX_CONCURRENCY", "16"))
+        self.RETRY_MAX: int = int(os.getenv("RETRY_MAX", "3"))
+        self.RETRY_BASE_DELAY: float = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+        self.RETRY_MAX_DELAY: float = float(os.getenv("RETRY_MAX_DELAY", "20"))
+        self.RETRY_DEADLINE: float = float(os.getenv("RETRY_DEADLINE", "180"))
+        # 运行追踪：span 记入 Workspace.trace（保留条数上限）与 /metrics；TRACE_FILE 非空时逐条追加为 JSONL
+        self.TRACE: bool = os.getenv("TRACE", "1") in ("1", "true", "True")
+        self.TRACE_MAX_SPANS: int = int(os.getenv("TRACE_MAX_SPANS", "500"))
+        self.TRACE_FILE: str = os.getenv("TRACE_FILE", "").strip()
+        # LLM 单价（每百万 token），用于估算费用；0 = 不计
+        self.LLM_PRICE_INPUT: float = float(os.getenv("LLM_PRICE_INPUT", "0"))
+        self.LLM_PRICE_OUTPUT: float = float(os.getenv("LLM_PRICE_OUTPUT", "0"))
+
 @lru_cache()
 def get_settings() -> "Settings":
     s = Settings()
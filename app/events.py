@@ -0,0 +1,77 @@
+# app/events.py
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from app import trace
+
+# 流水线事件：默认无接收者（命令行只打印）；HTTP 服务为每个请求绑定一个 sink 与取消标记。
+# 用 contextvars 传递，线程池任务需经 submit() 提交才能继承。
+Sink = Callable[[str, Dict[str, Any]], None]
+_SINK: contextvars.ContextVar[Optional[Sink]] = contextvars.ContextVar("event_sink", default=None)
+_CANCEL: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("cancel", default=None)
+_STAGE: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("stage", default=None)
+
+class Cancelled(BaseException):
+    """
+    请求已取消（客户端断开等），流水线在下一个检查点退出。
+    与 asyncio.CancelledError 一样继承 BaseException，不会被各处的 except Exception 吞掉。
+    """
+
+@contextmanager
+def bind(sink: Optional[Sink] = None, cancel: Optional[threading.Event] = None) -> Iterator[None]:
+    t1, t2 = _SINK.set(sink), _CANCEL.set(cancel)
+    try:
+        yield
+    finally:
+        _SINK.reset(t1)
+        _CANCEL.reset(t2)
+
+def emit(event: str, **data: Any) -> None:
+    sink = _SINK.get()
+    if sink is None:
+        return
+    stage = _STAGE.get()
+    if stage and "stage" not in data:
+        data["stage"] = stage
+    try:
+        sink(event, data)
+    except Exception:
+        # 接收端出错不影响流水线
+        pass
+
+def is_cancelled() -> bool:
+    ev = _CANCEL.get()
+    return ev is not None and ev.is_set()
+
+def check_cancelled() -> None:
+    if is_cancelled():
+        raise Cancelled()
+
+def current_stage() -> Optional[str]:
+    return _STAGE.get()
+
+@contextmanager
+def stage(name: str, **data: Any) -> Iterator[None]:
+    """标记一个流水线阶段：进入前检查取消，前后各发一个 stage 事件（附耗时），并记一个 stage span"""
+    check_cancelled()
+    token = _STAGE.set(name)
+    t0 = time.perf_counter()
+    emit("stage", name=name, status="start", **data)
+    status = "error"
+    try:
+        with trace.span(name, kind="stage", **data):
+            yield
+        status = "done"
+    except Cancelled:
+        status = "cancelled"
+        raise
+    finally:
+        emit("stage", name=name, status=status, ms=round((time.perf_counter() - t0) * 1000, 1))
+        _STAGE.reset(token)
+
+def submit(pool: Executor, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+    """pool.submit 的上下文版本：任务线程继承当前请求的 sink / 取消标记 / 阶段"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
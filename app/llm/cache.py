@@ -0,0 +1,45 @@
+# app/llm/cache.py
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from app.config import get_settings
+from app.storage.fs_store import KVStore, get_kv_store
+
+def _llm_params(llm) -> Dict[str, Any]:
+    """提取影响输出的模型参数；兼容 .bind() 得到的 RunnableBinding"""
+    bound: Dict[str, Any] = {}
+    while hasattr(llm, "bound") and hasattr(llm, "kwargs"):
+        bound = {**llm.kwargs, **bound}
+        llm = llm.bound
+    params = {
+        "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+        "base_url": getattr(llm, "openai_api_base", None),
+        "temperature": getattr(llm, "temperature", None),
+        "top_p": getattr(llm, "top_p", None),
+        "max_tokens": getattr(llm, "max_tokens", None),
+        "model_kwargs": getattr(llm, "model_kwargs", None),
+    }
+    params["bound"] = bound
+    return params
+
+def cache_key(llm, messages, **bound: Any) -> str:
+    """模型 + 渲染后的消息 + 绑定参数 的内容哈希"""
+    msgs = [(getattr(m, "type", ""), getattr(m, "content", m)) for m in messages]
+    payload = {"llm": _llm_params(llm), "messages": msgs, "bound": bound}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def get_llm_cache() -> KVStore:
+    s = get_settings()
+    return get_kv_store("llm", ttl=s.LLM_CACHE_TTL, max_entries=s.LLM_CACHE_MAX_ENTRIES,
+                        max_bytes=s.LLM_CACHE_MAX_BYTES)
+
+def cache_get(key: str) -> Optional[str]:
+    return get_llm_cache().get(key)
+
+def cache_put(key: str, text: str) -> None:
+    if text:
+        get_llm_cache().set(key, text)
+
+def cache_stats() -> Dict[str, float]:
+    return get_llm_cache().stats()
@@ -1,11 +1,17 @@
-from langchain_openai import ChatOpenAI
+from typing import TYPE_CHECKING
 from app.config import get_settings
+from app.llm.clients import get_chat_model
 
-def get_chat(model: str | None = None) -> ChatOpenAI:
+if TYPE_CHECKING:
+    # langchain_openai 导入较慢，只在真正创建实例时加载（见 clients.get_chat_model）
+    from langchain_openai import ChatOpenAI
+
+def get_chat(model: str | None = None) -> "ChatOpenAI":
+    """进程内按 (model, base_url, 参数) 复用同一个 ChatOpenAI 及其连接池"""
     s = get_settings()
-    return ChatOpenAI(
-        model=model or s.SF_CHAT_MODEL,
-        api_key=s.SF_API_KEY.strip(),
-        base_url=s.SF_BASE_URL.strip(),   # 一定要传
+    return get_chat_model(
+        model or s.SF_CHAT_MODEL,
+        s.SF_BASE_URL.strip(),   # 一定要传
+        s.SF_API_KEY.strip(),
         temperature=s.LLM_TEMPERATURE,
     )
\ No newline at end of file
@@ -0,0 +1,149 @@
+# app/llm/clients.py
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+import httpx
+from app.config import get_settings
+
+# 进程内共享的客户端：同一服务商（scheme://host）共用一个连接池，连接数上限按服务商计
+_LOCK = threading.Lock()
+_HTTP: Dict[Tuple, httpx.Client] = {}
+_AHTTP: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = \
+    weakref.WeakKeyDictionary()
+# 没有运行中的事件循环时（同步代码里构造 ChatOpenAI 等）共用的异步客户端
+_AHTTP_NO_LOOP: Dict[str, httpx.AsyncClient] = {}
+_OPENAI: Dict[Tuple, Any] = {}
+_CHATS: Dict[Tuple, Any] = {}
+# 在事件循环里构造的 ChatOpenAI 带着该循环的异步客户端，按循环分开缓存
+_ACHATS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Any]]" = \
+    weakref.WeakKeyDictionary()
+_SESSIONS: Dict[str, Any] = {}
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _provider(base_url: str | None) -> str:
+    parts = urlsplit(base_url or get_settings().SF_BASE_URL)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def _http2() -> bool:
+    if not get_settings().HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("[clients] 未安装 h2，HTTP/2 关闭（pip install 'httpx[http2]'）")
+        return False
+
+def _pool_kwargs() -> Dict[str, Any]:
+    s = get_settings()
+    return {
+        "timeout": httpx.Timeout(s.HTTP_TIMEOUT, connect=min(10.0, s.HTTP_TIMEOUT)),
+        "limits": httpx.Limits(
+            max_connections=max(1, s.HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=max(1, min(s.HTTP_MAX_KEEPALIVE, s.HTTP_MAX_CONNECTIONS)),
+            keepalive_expiry=s.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "http2": _http2(),
+    }
+
+def get_http_client(base_url: str | None = None) -> httpx.Client:
+    """同步 httpx 客户端（按服务商复用）；超时可在单次请求里覆盖"""
+    key = (_provider(base_url),)
+    with _LOCK:
+        c = _HTTP.get(key)
+        if c is None or c.is_closed:
+            c = _HTTP[key] = httpx.Client(**_pool_kwargs())
+        return c
+
+def get_async_http_client(base_url: str | None = None) -> httpx.AsyncClient:
+    """异步 httpx 客户端；连接绑定事件循环，所以按（当前循环, 服务商）复用，循环结束后随之释放；
+    不在事件循环里调用时按服务商共用一个"""
+    loop = _running_loop()
+    key = _provider(base_url)
+    with _LOCK:
+        per_loop = _AHTTP_NO_LOOP if loop is None else _AHTTP.setdefault(loop, {})
+        c = per_loop.get(key)
+        if c is None or c.is_closed:
+            c = per_loop[key] = httpx.AsyncClient(**_pool_kwargs())
+        return c
+
+def get_openai(base_url: str | None = None, api_key: str | None = None, async_: bool = False):
+    """OpenAI SDK 客户端，底层走共享连接池"""
+    from openai import AsyncOpenAI, OpenAI
+    s = get_settings()
+    base_url = (base_url or s.SF_BASE_URL).strip()
+    api_key = (api_key or s.SF_API_KEY).strip()
+    if async_:
+        # 异步客户端与事件循环绑定，不进缓存
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=s.HTTP_TIMEOUT,
+                           http_client=get_async_http_client(base_url))
+    key = (base_url, api_key)
+    with _LOCK:
+        c = _OPENAI.get(key)
+    if c is None:
+        c = OpenAI(api_key=api_key, base_url=base_url, timeout=s.HTTP_TIMEOUT,
+                   http_client=get_http_client(base_url))
+        with _LOCK:
+            c = _OPENAI.setdefault(key, c)
+    return c
+
+def get_chat_model(model: str, base_url: str, api_key: str, **params):
+    """按 (model, base_url, 参数) 复用 ChatOpenAI；实例本身无状态，可跨线程共享。
+    同步 / 异步调用都走共享连接池；在事件循环里构造的实例按循环缓存"""
+    from langchain_openai import ChatOpenAI
+    key = (model, base_url, api_key, tuple(sorted(params.items())))
+    loop = _running_loop()
+    with _LOCK:
+        cache = _CHATS if loop is None else _ACHATS.setdefault(loop, {})
+        llm = cache.get(key)
+    if llm is None:
+        llm = ChatOpenAI(
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            timeout=get_settings().HTTP_TIMEOUT,
+            http_client=get_http_client(base_url),
+            http_async_client=get_async_http_client(base_url),
+            # 重试由 app/llm/ratelimit.py 统一调度，SDK 内部不再重试
+            max_retries=0 if get_settings().RATE_LIMIT else 2,
+            **params,
+        )
+        with _LOCK:
+            llm = cache.setdefault(key, llm)
+    return llm
+
+def get_requests_session(name: str):
+    """requests.Session（Tavily SDK 用），按名称复用并设置连接池大小"""
+    with _LOCK:
+        sess = _SESSIONS.get(name)
+        if sess is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = get_settings()
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, s.HTTP_MAX_CONNECTIONS))
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _SESSIONS[name] = sess
+        return sess
+
+def close_clients() -> None:
+    """关闭全部同步客户端（进程退出或测试时调用）；异步客户端由各自事件循环负责"""
+    with _LOCK:
+        for c in _HTTP.values():
+            c.close()
+        for sess in _SESSIONS.values():
+            sess.close()
+        _HTTP.clear()
+        _OPENAI.clear()
+        _CHATS.clear()
+        _ACHATS.clear()
+        _AHTTP_NO_LOOP.clear()
+        _SESSIONS.clear()
@@ -0,0 +1,302 @@
+# app/llm/json_stream.py
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 增量 JSON 解析：边收增量边解析，每个值完整时回调 on_value(path, value)，
+# 顶层对象（或数组）闭合即 done，调用方可以立刻停止生成。
+# 顶层值之前的任意文字（思考、说明、```json 围栏）都会被跳过；只从与 schema 顶层类型相符的括号开始
+# （object 只认 {，避免锁定说明文字里的“[1]”）；从某个括号开始解析失败时，从它之后的下一个重新开始。
+
+Path = Tuple[Any, ...]
+
+class JsonStreamError(ValueError):
+    pass
+
+_WS = " \t\r\n"
+_NUM = set("+-0123456789.eE")
+_LITERALS = {"true": True, "false": False, "null": None}
+_OPENS = {"object": "{", "array": "["}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class _Frame:
+    __slots__ = ("value", "key", "expect")
+
+    def __init__(self, value):
+        self.value = value
+        self.key: Any = None
+        # 对象：key / colon / value / next；数组：value / next
+        self.expect = "key" if isinstance(value, dict) else "value"
+
+class JsonStreamParser:
+    """
+    feed(text) 逐段喂入；done 后 value 为完整结果，后续文本忽略。
+    root 在解析过程中即可读取（已完成的键/元素），便于回调里查看前面的字段。
+    top：顶层值的类型 object（默认）/ array（schema 的 type），None 时两者都接受。
+    """
+
+    def __init__(self, on_value: Callable[[Path, Any], None] | None = None, top: str | None = "object"):
+        self.on_value = on_value
+        self.opens = _OPENS.get(top, "{[") if isinstance(top, str) else "{["
+        self.buf = ""
+        self.done = False
+        self.value: Any = None
+        self.root: Any = None
+        self._start = -1            # 当前顶层值在 buf 中的起点
+        self._reset()
+
+    def _reset(self) -> None:
+        self._stack: List[_Frame] = []
+        self._tok: Optional[str] = None     # None / str / esc / uni / num / lit
+        self._chars: List[str] = []
+        self._uni = ""
+        self._is_key = False
+        self.root = None
+
+    # ---------------- 输入 ----------------
+    def feed(self, text: str) -> bool:
+        """返回是否已解析出完整的顶层值"""
+        if self.done or not text:
+            return self.done
+        pos = len(self.buf)
+        self.buf += text
+        self._scan(pos)
+        return self.done
+
+    def _scan(self, pos: int) -> None:
+        while not self.done:
+            try:
+                self._run(pos)
+                return
+            except JsonStreamError:
+                # 从失败起点之后的下一个顶层括号重来
+                nxt = self._next_open(self._start + 1)
+                self._reset()
+                if nxt < 0:
+                    self._start = len(self.buf)
+                    return
+                pos = nxt
+
+    def _next_open(self, i: int) -> int:
+        cands = [j for j in (self.buf.find(c, i) for c in self.opens) if j >= 0]
+        return min(cands) if cands else -1
+
+    def _run(self, pos: int) -> None:
+        buf = self.buf
+        i = pos
+        n = len(buf)
+        if self.root is None and not self._stack:
+            i = self._next_open(i)
+            if i < 0:
+                return
+        while i < n and not self.done:
+            c = buf[i]
+            tok = self._tok
+            if tok == "str":
+                if c == '"':
+                    s = "".join(self._chars)
+                    self._tok = None
+                    if self._is_key:
+                        self._stack[-1].key = s
+                        self._stack[-1].expect = "colon"
+                    else:
+                        self._value(s)
+                elif c == "\\":
+                    self._tok = "esc"
+                else:
+                    self._chars.append(c)
+            elif tok == "esc":
+                if c == "u":
+                    self._tok, self._uni = "uni", ""
+                elif c in _ESCAPES:
+                    self._chars.append(_ESCAPES[c])
+                    self._tok = "str"
+                else:
+                    raise JsonStreamError(f"bad escape \\{c}")
+            elif tok == "uni":
+                self._uni += c
+                if len(self._uni) == 4:
+                    try:
+                        self._chars.append(chr(int(self._uni, 16)))
+                    except ValueError:
+                        raise JsonStreamError("bad \\u escape")
+                    self._tok = "str"
+            elif tok == "num":
+                if c in _NUM:
+                    self._chars.append(c)
+                else:
+                    self._end_number()
+                    continue            # 当前字符按结构字符再处理一次
+            elif tok == "lit":
+                if c.isalpha():
+                    self._chars.append(c)
+                    if len(self._chars) > 5:
+                        raise JsonStreamError("bad literal")
+                else:
+                    self._end_literal()
+                    continue
+            else:
+                self._structural(c, i)
+            i += 1
+        # 顶层结束后不再读取（数字 / 字面量不会出现在顶层容器末尾）
+
+    def _structural(self, c: str, i: int) -> None:
+        if c in _WS:
+            return
+        if not self._stack:
+            if c not in self.opens:
+                raise JsonStreamError(f"expected {' or '.join(self.opens)}")
+            self._start = i
+            self._open(c)
+            return
+        f = self._stack[-1]
+        if f.expect == "key":
+            if c == '"':
+                self._tok, self._chars, self._is_key = "str", [], True
+            elif c == "}" and not f.value:
+                self._close()
+            else:
+                raise JsonStreamError(f"expected key, got {c!r}")
+        elif f.expect == "colon":
+            if c != ":":
+                raise JsonStreamError(f"expected ':', got {c!r}")
+            f.expect = "value"
+        elif f.expect == "value":
+            if c == "]" and isinstance(f.value, list) and not f.value:
+                self._close()
+            elif c in "{[":
+                self._open(c)
+            elif c == '"':
+                self._tok, self._chars, self._is_key = "str", [], False
+            elif c in "-0123456789":
+                self._tok, self._chars = "num", [c]
+            elif c in "tfn":
+                self._tok, self._chars = "lit", [c]
+            else:
+                raise JsonStreamError(f"unexpected {c!r}")
+        elif f.expect == "next":
+            if c == ",":
+                f.expect = "key" if isinstance(f.value, dict) else "value"
+                if isinstance(f.value, dict):
+                    f.key = None
+            elif c == ("}" if isinstance(f.value, dict) else "]"):
+                self._close()
+            else:
+                raise JsonStreamError(f"expected ',' or close, got {c!r}")
+
+    def _end_number(self) -> None:
+        s = "".join(self._chars)
+        self._tok = None
+        try:
+            v = int(s) if all(ch in "+-0123456789" for ch in s) else float(s)
+        except ValueError:
+            raise JsonStreamError(f"bad number {s!r}")
+        self._value(v)
+
+    def _end_literal(self) -> None:
+        s = "".join(self._chars)
+        self._tok = None
+        if s not in _LITERALS:
+            raise JsonStreamError(f"bad literal {s!r}")
+        self._value(_LITERALS[s])
+
+    def _open(self, c: str) -> None:
+        container: Any = {} if c == "{" else []
+        if not self._stack:
+            self.root = container
+        else:
+            self._attach(container)
+        self._stack.append(_Frame(container))
+
+    def _attach(self, v: Any) -> None:
+        f = self._stack[-1]
+        if isinstance(f.value, dict):
+            f.value[f.key] = v
+        else:
+            f.value.append(v)
+
+    def _path(self) -> Path:
+        out = []
+        for f in self._stack:
+            out.append(f.key if isinstance(f.value, dict) else len(f.value) - 1)
+        return tuple(out)
+
+    def _value(self, v: Any) -> None:
+        self._attach(v)
+        self._stack[-1].expect = "next"
+        if self.on_value:
+            self.on_value(self._path(), v)
+
+    def _close(self) -> None:
+        f = self._stack.pop()
+        if not self._stack:
+            self.value = f.value
+            self.done = True
+            if self.on_value:
+                self.on_value((), f.value)
+            return
+        self._stack[-1].expect = "next"
+        if self.on_value:
+            self.on_value(self._path(), f.value)
+
+# ---------------- schema 校验（JSON Schema 常用子集） ----------------
+
+_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+def _is_type(v: Any, t: str) -> bool:
+    if t in ("integer", "number") and isinstance(v, bool):
+        return False
+    return isinstance(v, _TYPES.get(t, object))
+
+def validate(value: Any, schema: Dict[str, Any] | None, path: str = "$") -> List[str]:
+    """按 type / properties / required / additionalProperties / items / 长度 / 取值范围 / enum 校验，返回错误列表"""
+    if not schema:
+        return []
+    errs: List[str] = []
+    t = schema.get("type")
+    if t:
+        types = t if isinstance(t, list) else [t]
+        if not any(_is_type(value, x) for x in types):
+            return [f"{path}: expected {t}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errs.append(f"{path}: not in enum")
+    if isinstance(value, dict):
+        props = schema.get("properties") or {}
+        for k in schema.get("required") or []:
+            if k not in value:
+                errs.append(f"{path}: missing {k}")
+        for k, v in value.items():
+            if k in props:
+                errs.extend(validate(v, props[k], f"{path}.{k}"))
+            elif schema.get("additionalProperties") is False:
+                errs.append(f"{path}: unexpected key {k}")
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errs.append(f"{path}: fewer than {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errs.append(f"{path}: more than {schema['maxItems']} items")
+        if schema.get("uniqueItems") and len({repr(x) for x in value}) < len(value):
+            errs.append(f"{path}: duplicate items")
+        for i, x in enumerate(value):
+            errs.extend(validate(x, schema.get("items"), f"{path}[{i}]"))
+    elif isinstance(value, str):
+        if len(value) < schema.get("minLength", 0):
+            errs.append(f"{path}: shorter than {schema['minLength']}")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errs.append(f"{path}: longer than {schema['maxLength']}")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errs.append(f"{path}: below {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errs.append(f"{path}: above {schema['maximum']}")
+    return errs
+
+def subschema(schema: Dict[str, Any] | None, path: Path) -> Dict[str, Any] | None:
+    """按路径取子 schema：字符串走 properties，整数走 items"""
+    s = schema
+    for p in path:
+        if not s:
+            return None
+        s = (s.get("properties") or {}).get(p) if isinstance(p, str) else s.get("items")
+    return s
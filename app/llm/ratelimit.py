@@ -0,0 +1,335 @@
+# app/llm/ratelimit.py
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.config import get_settings
+from app.events import check_cancelled, current_stage
+
+# 进程级调用调度：按 (服务, 模型) 各一个闸门，所有线程共用。
+# - 令牌桶：每分钟请求数（RPM）与 token 数（TPM），0 = 不限；
+# - 自适应并发：429 / 5xx / 超时时并发上限减半，成功时逐步加回（AIMD），上限 RATE_MAX_CONCURRENCY；
+# - 优先级：排队时按优先级再按先后放行，交互（改写 / 写作）先于普通（规划 / 筛选）先于后台（清洗）；
+# - 重试：可重试错误按指数退避加随机抖动重试，尊重 Retry-After，不超过调用方给的截止时间。
+# 用法：
+#   for attempt in attempts("llm", model, tokens=n):
+#       with attempt:
+#           ...发请求...
+
+PRIORITIES = {"interactive": 0, "normal": 1, "background": 2}
+_STAGE_PRIORITY = {"intake": "interactive", "rewrite": "interactive", "write": "interactive",
+                   "clean": "background"}
+_PRIORITY: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("priority", default=None)
+
+class RateLimitTimeout(TimeoutError):
+    """排队超过截止时间"""
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """在此范围内发出的调用使用指定优先级（默认按当前阶段推断）"""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown priority: {name}")
+    token = _PRIORITY.set(name)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+def current_priority() -> str:
+    return _PRIORITY.get() or _STAGE_PRIORITY.get(current_stage() or "", "normal")
+
+class _Bucket:
+    """每分钟 rate 个令牌，容量 = rate；rate<=0 表示不限。允许透支（事后补扣输出 token）"""
+
+    def __init__(self, rate: float):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.t = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.rate, self.tokens + (now - self.t) * self.rate / 60.0)
+        self.t = now
+
+    def delay(self, n: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(n, self.rate)
+        return 0.0 if self.tokens >= need else (need - self.tokens) * 60.0 / self.rate
+
+    def take(self, n: float, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= n
+
+class _Gate:
+    def __init__(self, key: Tuple[str, str], rpm: float, tpm: float, max_concurrency: int):
+        self.key = key
+        self.cond = threading.Condition()
+        self.max = max(1, max_concurrency)
+        self.limit = float(self.max)
+        self.inflight = 0
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.waiters: list = []
+        self.seq = itertools.count()
+        self.waits: deque = deque(maxlen=1000)
+        self.counts = {"calls": 0, "ok": 0, "throttled": 0, "server_errors": 0, "timeouts": 0,
+                       "retries": 0, "gave_up": 0}
+
+    def acquire(self, tokens: int, prio: str, deadline: Optional[float]) -> float:
+        """排队拿到一个并发名额并扣除令牌，返回排队耗时（毫秒）"""
+        t0 = time.monotonic()
+        entry = (PRIORITIES.get(prio, 1), next(self.seq))
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = 0.5          # 定期醒来检查取消
+                    if self.waiters[0] == entry and self.inflight < int(self.limit):
+                        d = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+                        if d <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            break
+                        wait = min(wait, d)
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise RateLimitTimeout(f"{self.key[0]} queue deadline exceeded")
+                        wait = min(wait, deadline - now)
+                    check_cancelled()
+                    self.cond.wait(wait)
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+            self.inflight += 1
+            self.counts["calls"] += 1
+            ms = (time.monotonic() - t0) * 1000
+            self.waits.append(ms)
+        return ms
+
+    def charge(self, tokens: int) -> None:
+        """事后补扣（如输出 token 数）"""
+        with self.cond:
+            self.tokens.take(tokens, time.monotonic())
+
+    def count(self, name: str) -> None:
+        with self.cond:
+            self.counts[name] += 1
+
+    def release(self, outcome: Optional[str]) -> None:
+        with self.cond:
+            self.inflight -= 1
+            if outcome in ("throttled", "server_errors", "timeouts"):
+                self.counts[outcome] += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif outcome == "ok":
+                self.counts["ok"] += 1
+                self.limit = min(float(self.max), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            waits = sorted(self.waits)
+            out: Dict[str, Any] = dict(self.counts, inflight=self.inflight, queued=len(self.waiters),
+                                       concurrency_limit=round(self.limit, 2))
+        if waits:
+            out["queue_ms"] = {
+                "p50": round(waits[len(waits) // 2], 1),
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1),
+                "max": round(waits[-1], 1),
+                "mean": round(sum(waits) / len(waits), 1),
+            }
+        return out
+
+_GATES: Dict[Tuple[str, str], _Gate] = {}
+_GATES_LOCK = threading.Lock()
+
+def _limits(service: str) -> Tuple[float, float]:
+    s = get_settings()
+    if service == "llm":
+        return s.LLM_RPM, s.LLM_TPM
+    if service == "tavily":
+        return s.SEARCH_RPM, 0
+    if service in ("rerank", "embed"):
+        return s.RERANK_RPM, 0
+    return 0, 0
+
+def gate(service: str, model: str = "") -> _Gate:
+    key = (service, model or "")
+    with _GATES_LOCK:
+        g = _GATES.get(key)
+        if g is None:
+            rpm, tpm = _limits(service)
+            g = _GATES[key] = _Gate(key, rpm, tpm, get_settings().RATE_MAX_CONCURRENCY)
+        return g
+
+def rate_stats() -> Dict[str, Dict[str, Any]]:
+    """各闸门的调用数、限流 / 错误 / 重试次数、当前并发上限与排队耗时分位数"""
+    with _GATES_LOCK:
+        gates = list(_GATES.values())
+    return {f"{g.key[0]}:{g.key[1]}" if g.key[1] else g.key[0]: g.stats() for g in gates}
+
+def render_prometheus() -> str:
+    out = []
+    rows = rate_stats()
+    for metric, typ, get in (
+        ("searchagent_ratelimit_calls_total", "counter", lambda st: st["calls"]),
+        ("searchagent_ratelimit_throttled_total", "counter", lambda st: st["throttled"]),
+        ("searchagent_ratelimit_retries_total", "counter", lambda st: st["retries"]),
+        ("searchagent_ratelimit_concurrency_limit", "gauge", lambda st: st["concurrency_limit"]),
+        ("searchagent_ratelimit_queued", "gauge", lambda st: st["queued"]),
+        ("searchagent_ratelimit_queue_ms_p95", "gauge", lambda st: (st.get("queue_ms") or {}).get("p95", 0)),
+    ):
+        out.append(f"# TYPE {metric} {typ}")
+        for key, st in rows.items():
+            out.append(f'{metric}{{gate="{key}"}} {get(st)}')
+    return "\n".join(out) + "\n" if rows else ""
+
+# ---------------- 错误分类与重试 ----------------
+
+def _status(e: BaseException) -> Optional[int]:
+    for obj in (e, getattr(e, "response", None)):
+        code = getattr(obj, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+def classify(e: BaseException) -> Optional[str]:
+    """throttled / server_errors / timeouts；None 表示不可重试"""
+    code = _status(e)
+    name = e.__class__.__name__
+    if code == 429 or "RateLimit" in name or "UsageLimitExceeded" in name:
+        return "throttled"
+    if code is not None:
+        return "server_errors" if code >= 500 or code == 408 else None
+    if isinstance(e, RateLimitTimeout):
+        return None
+    if isinstance(e, TimeoutError) or "Timeout" in name:
+        return "timeouts"
+    if isinstance(e, ConnectionError) or "Connect" in name or "RemoteProtocol" in name:
+        return "server_errors"
+    return None
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        v = headers.get("retry-after") or headers.get("Retry-After")
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def backoff(n: int, retry_after: Optional[float] = None) -> float:
+    """第 n 次重试前的等待：full jitter 指数退避；服务端给了 Retry-After 时不少于它"""
+    s = get_settings()
+    d = random.uniform(0, min(s.RETRY_MAX_DELAY, s.RETRY_BASE_DELAY * (2 ** n)))
+    if retry_after is not None:
+        d = max(d, min(retry_after, s.RETRY_MAX_DELAY))
+    return d
+
+def _sleep(seconds: float) -> None:
+    end = time.monotonic() + seconds
+    while True:
+        check_cancelled()
+        left = end - time.monotonic()
+        if left <= 0:
+            return
+        time.sleep(min(left, 0.25))
+
+class Attempt:
+    """一次调用尝试：进入时排队，退出时归还名额；可重试的失败被吞掉并在退避后由 attempts() 发起下一次"""
+
+    def __init__(self, g: _Gate, n: int, tokens: int, prio: str, deadline: Optional[float], retries: int):
+        self.gate = g
+        self.n = n
+        self.tokens = tokens
+        self.prio = prio
+        self.deadline = deadline
+        self.retries = retries
+        self.retryable = True
+        self.ok = False
+        self.queue_ms = 0.0
+
+    def no_retry(self) -> None:
+        """已经产生副作用（如已向外输出 token）后调用，失败不再重试"""
+        self.retryable = False
+
+    def charge(self, tokens: int) -> None:
+        self.gate.charge(tokens)
+
+    def __enter__(self) -> "Attempt":
+        self.queue_ms = self.gate.acquire(self.tokens, self.prio, self.deadline)
+        return self
+
+    def __exit__(self, et, e, tb) -> bool:
+        if et is None:
+            self.gate.release("ok")
+            self.ok = True
+            return False
+        kind = classify(e) if isinstance(e, Exception) else None
+        self.gate.release(kind)
+        if kind is None or not self.retryable:
+            return False
+        delay = backoff(self.n, _retry_after(e))
+        if self.n >= self.retries or (self.deadline is not None and time.monotonic() + delay >= self.deadline):
+            self.gate.count("gave_up")
+            return False
+        self.gate.count("retries")
+        print(f"[Retry] {self.gate.key[0]} {kind}（{e.__class__.__name__}），{delay:.1f}s 后第 {self.n + 1} 次重试")
+        _sleep(delay)
+        return True
+
+class _Passthrough:
+    """RATE_LIMIT=0 时的空闸门：不排队、不计数"""
+    key = ("off", "")
+
+    def acquire(self, tokens: int, prio: str, deadline: Optional[float]) -> float:
+        return 0.0
+
+    def charge(self, tokens: int) -> None:
+        pass
+
+    def count(self, name: str) -> None:
+        pass
+
+    def release(self, outcome: Optional[str]) -> None:
+        pass
+
+_PASS = _Passthrough()
+
+def attempts(service: str, model: str = "", tokens: int = 0, prio: Optional[str] = None,
+             deadline: Optional[float] = None, retries: Optional[int] = None) -> Iterator[Attempt]:
+    """
+    产出若干次 Attempt，直到某次成功；deadline 为 time.monotonic() 时刻，排队与退避都不超过它。
+    RATE_LIMIT=0 时只产出一次且不排队、不重试。
+    """
+    s = get_settings()
+    if s.RATE_LIMIT:
+        g = gate(service, model)
+        retries = s.RETRY_MAX if retries is None else retries
+    else:
+        g, retries = _PASS, 0
+    prio = prio or current_priority()
+    n = 0
+    while True:
+        a = Attempt(g, n, tokens, prio, deadline, retries)
+        yield a
+        if a.ok:
+            return
+        n += 1
+
+def call(service: str, fn, *args: Any, model: str = "", tokens: int = 0, prio: Optional[str] = None,
+         deadline: Optional[float] = None, **kwargs: Any) -> Any:
+    """fn(*args, **kwargs) 的排队 + 重试版本"""
+    for a in attempts(service, model, tokens=tokens, prio=prio, deadline=deadline):
+        with a:
+            return fn(*args, **kwargs)
+    raise RuntimeError("unreachable")
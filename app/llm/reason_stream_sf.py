@@ -1,6 +1,6 @@
 from typing import Iterable, Dict, Any, Optional
-from openai import OpenAI
 from app.config import get_settings
+from app.llm.clients import get_openai
 
 def stream_reason_and_answer(
     messages: Iterable[Dict[str, Any]],
@@ -14,7 +14,7 @@ def stream_reason_and_answer(
     依赖：SILICONFLOW_BASE_URL, SILICONFLOW_API_KEY 在 .env 中设置。
     """
     s = get_settings()
-    client = OpenAI(api_key=s.SF_API_KEY, base_url=s.SF_BASE_URL)
+    client = get_openai()
     mdl = model or s.SF_CHAT_MODEL
 
     print("[stream] model =", mdl)
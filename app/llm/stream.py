@@ -1,9 +1,19 @@
 # app/llm/stream.py
 import json
-from typing import Optional, Dict, Any, Iterable, List
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
 from app.llm.chat_sf import get_chat
-from langchain_core.messages import BaseMessage
+from app.llm.cache import cache_key, cache_get, cache_put
+from app.llm.json_stream import JsonStreamParser, Path, subschema, validate
+from app.llm.ratelimit import attempts
 from app.config import get_settings
+from app.events import check_cancelled, current_stage, emit
+from app.tools.tokens import count_tokens
+from app import trace
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
 
 def _safe_json(text: str) -> dict:
     try:
@@ -12,9 +22,40 @@ def _safe_json(text: str) -> dict:
         s = text[text.find("{"): text.rfind("}") + 1]
         return json.loads(s)
 
-def stream_text(messages, response_format=None, llm=None) -> str:
+# 控制台输出模式：stream 逐 token 打印；buffer 整段生成完后一次性打印（并发时不交错）；silent 不打印
+ECHO_MODES = ("stream", "buffer", "silent")
+_PRINT_LOCK = threading.Lock()
+
+def print_block(text: str) -> None:
+    """整段打印，多线程下不与其它输出交错"""
+    with _PRINT_LOCK:
+        print(text, flush=True)
+
+def stream_text(messages, response_format=None, llm=None, echo: str | None = None, label: str | None = None,
+                cache: bool | None = None, on_text: Callable[[str], None] | None = None) -> str:
+    """
+    流式生成文本；cache=None 时按 LLM_CACHE 设置决定是否读写本地响应缓存，False 则绕过。
+    on_text 逐段收到正文增量（不含思考内容；命中缓存时一次收到全文），用于边生成边解析；
+    返回 True 时提前结束生成（关闭底层流，不再消耗 token）。
+    """
     llm = llm or get_chat()
     s = get_settings()
+    echo = echo or s.STREAM_ECHO
+    if echo not in ECHO_MODES:
+        raise ValueError(f"unknown echo mode: {echo}")
+    shown: List[str] = []
+
+    def _show(t: str) -> None:
+        if echo == "stream":
+            print(t, end="", flush=True)
+        elif echo == "buffer":
+            shown.append(t)
+
+    def _finish() -> None:
+        if echo == "stream":
+            print()
+        elif echo == "buffer":
+            print_block((f"{label}\n" if label else "") + "".join(shown))
 
     # A. 显示思考时开启返回开关，并给预算
     if getattr(s, "SHOW_THINK", False):
@@ -29,36 +70,131 @@ def stream_text(messages, response_format=None, llm=None) -> str:
     if response_format and not getattr(s, "SHOW_THINK", False):
         llm = llm.bind(response_format=response_format)
 
-    buf = []
-    for chunk in llm.stream(messages):
-        if getattr(s, "SHOW_THINK", False):
-            rc = (getattr(chunk, "additional_kwargs", {}) or {}).get("reasoning_content") or ""
-
-            # 兜底：从原始增量里拿
-            if not rc:
-                meta = getattr(chunk, "response_metadata", {}) or {}
-                delta = (meta.get("delta") or {})
-                if not delta:
-                    raw = meta.get("raw") or {}
-                    choices = raw.get("choices") or []
-                    delta = (choices[0].get("delta") if choices else {}) or {}
-                rc = delta.get("reasoning_content") or ""
-
-            if rc:
-                print(rc, end="", flush=True)
-
-        part = getattr(chunk, "content", "") or ""
-        if part:
-            print(part, end="", flush=True)
-            buf.append(part)
-
-    print()
-    return "".join(buf)
-
-def stream_json(messages: Iterable[BaseMessage], schema: Optional[Dict[str, Any]] = None, llm=None) -> dict:
+    # C. 命中缓存直接返回（键 = 模型 + 消息 + 绑定参数）
+    messages = list(messages)
+    use_cache = s.LLM_CACHE if cache is None else cache
+    key = None
+    with trace.span(current_stage() or "llm", kind="llm", label=label, model=_model_name(llm)) as sp:
+        if use_cache:
+            key = cache_key(llm, messages)
+            hit = cache_get(key)
+            if hit is not None:
+                sp.attrs["cached"] = True
+                emit("token", text=hit, kind="answer", label=label, cached=True)
+                if on_text:
+                    on_text(hit)
+                _show(hit)
+                _finish()
+                return hit
+
+        # 排队（令牌桶 + 自适应并发 + 优先级）后发请求；还没向外输出任何内容时，可重试的错误自动退避重试
+        est = sum(count_tokens(str(getattr(m, "content", m))) for m in messages) if s.LLM_TPM > 0 else 0
+        for attempt in attempts("llm", _model_name(llm) or "", tokens=est,
+                                deadline=time.monotonic() + s.RETRY_DEADLINE):
+            with attempt:
+                buf, think = [], []
+                usage = None
+                check_cancelled()
+                chunks = llm.stream(messages)
+                for chunk in chunks:
+                    # 每个增量检查一次取消：抛出后生成器关闭，底层 HTTP 流随之断开
+                    check_cancelled()
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if getattr(s, "SHOW_THINK", False):
+                        rc = (getattr(chunk, "additional_kwargs", {}) or {}).get("reasoning_content") or ""
+
+                        # 兜底：从原始增量里拿
+                        if not rc:
+                            meta = getattr(chunk, "response_metadata", {}) or {}
+                            delta = (meta.get("delta") or {})
+                            if not delta:
+                                raw = meta.get("raw") or {}
+                                choices = raw.get("choices") or []
+                                delta = (choices[0].get("delta") if choices else {}) or {}
+                            rc = delta.get("reasoning_content") or ""
+
+                        if rc:
+                            sp.first_token()
+                            attempt.no_retry()
+                            think.append(rc)
+                            emit("token", text=rc, kind="think", label=label)
+                            _show(rc)
+
+                    part = getattr(chunk, "content", "") or ""
+                    if part:
+                        sp.first_token()
+                        attempt.no_retry()
+                        emit("token", text=part, kind="answer", label=label)
+                        _show(part)
+                        buf.append(part)
+                        if on_text and on_text(part):
+                            sp.attrs["early_stop"] = True
+                            # 主动关闭生成器，底层 HTTP 流随之断开
+                            chunks.close()
+                            break
+
+        if attempt.queue_ms >= 1:
+            sp.attrs["queue_ms"] = round(attempt.queue_ms, 1)
+        if attempt.n:
+            sp.attrs["retries"] = attempt.n
+        text = "".join(buf)
+        # 服务端返回 usage 时用真实值，否则按编码估算
+        if usage:
+            sp.prompt_tokens = int(usage.get("input_tokens") or 0)
+            sp.completion_tokens = int(usage.get("output_tokens") or 0)
+        else:
+            sp.prompt_tokens = est or sum(count_tokens(str(getattr(m, "content", m))) for m in messages)
+            sp.completion_tokens = count_tokens(text) + count_tokens("".join(think))
+            sp.attrs["estimated"] = True
+        sp.cost = trace.llm_cost(sp.prompt_tokens, sp.completion_tokens)
+        # 输出 token 事后计入 TPM；服务端给了真实输入 token 时按差额修正
+        attempt.charge(sp.completion_tokens + (sp.prompt_tokens - est if est else 0))
+
+    _finish()
+    if key:
+        cache_put(key, text)
+    return text
+
+def _model_name(llm) -> str | None:
+    inner = getattr(llm, "bound", llm)
+    return getattr(inner, "model_name", None) or getattr(inner, "model", None)
+
+def stream_json(messages: Iterable["BaseMessage"], schema: Optional[Dict[str, Any]] = None, llm=None,
+                echo: str | None = None, cache: bool | None = None,
+                on_value: Callable[[Path, Any], None] | None = None, strict: bool = False,
+                label: str | None = None) -> Any:
+    """
+    流式生成 JSON，边收边增量解析：
+    - on_value(path, value) 在每个值完整时回调（如 ("sub_goals", 0) -> "..."），
+      给了 schema 时只回调符合对应子 schema 的值；
+    - 顶层对象闭合即结束生成，忽略模型之后的多余输出；
+    - 结果按 schema 校验，不符合时打印告警（strict=True 时抛 ValueError）。
+    """
+    body = (schema or {}).get("schema")
+
+    def _cb(path: Path, value: Any) -> None:
+        if on_value is None or not path:
+            return
+        if body and validate(value, subschema(body, path)):
+            return
+        on_value(path, value)
+
+    # 没有 schema 时按 json_object 要求，只认对象
+    parser = JsonStreamParser(_cb, top=(body or {}).get("type") or "object")
     text = stream_text(
         messages,
         response_format=({"type": "json_schema", "json_schema": schema} if schema else {"type": "json_object"}),
         llm=llm,
+        echo=echo,
+        label=label,
+        cache=cache,
+        on_text=parser.feed,
     )
-    return _safe_json(text)
\ No newline at end of file
+    data = parser.value if parser.done else _safe_json(text)
+    errs = validate(data, body) if body else []
+    if errs:
+        msg = f"JSON 不符合 schema {schema.get('name')}: " + "; ".join(errs[:5])
+        if strict:
+            raise ValueError(msg)
+        print(f"[JSON] {msg}")
+    return data
@@ -0,0 +1,213 @@
+# app/pipelines/batch.py
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+from app.config import get_settings
+from app.events import Cancelled, bind, submit
+from app.llm.ratelimit import rate_stats
+
+# 批量模式：从 JSONL 读取查询（可附带预先写好的澄清回答），并发跑完整流程，答案与指标逐行写入 JSONL。
+# 输入每行：{"id": "q1", "query": "...", "answers": "...", "budget": {...}}；id 缺省为行号，answers 缺省时先生成澄清问题、
+# 以空回答继续；budget（{max_rounds, time_s, tokens, searches}）覆盖整批的预算，整批默认 BATCH_MAX_ROUNDS 轮。
+# 断点续跑：
+#   - 输出文件里 ok 的 id 直接跳过（失败的会重跑）；
+#   - <输出>.ckpt 记录 id -> ws_id，中断时已完成的阶段存在 Workspace.checkpoint，
+#     重跑时载入同一工作区，从中断的阶段继续（见 continue_after_answers(resume=True)）。
+# LLM / 检索客户端、连接池、缓存都是进程级单例，整批共用。
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    jobs: List[Dict[str, Any]] = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if isinstance(rec, str):
+                rec = {"query": rec}
+            if not rec.get("query"):
+                print(f"[Batch] 第 {n} 行没有 query，跳过", file=sys.stderr)
+                continue
+            rec["id"] = str(rec.get("id") or f"L{n}")
+            if rec["id"] in seen:
+                print(f"[Batch] 重复 id {rec['id']}（第 {n} 行），跳过", file=sys.stderr)
+                continue
+            seen.add(rec["id"])
+            jobs.append(rec)
+    return jobs
+
+def _read_jsonl(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                # 被强杀时最后一行可能只写了一半
+                continue
+    return out
+
+class _Appender:
+    """线程安全地追加 JSONL 行，每行写完即 flush"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.f = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        line = json.dumps(row, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            self.f.write(line)
+            self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+def _metrics(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stages: Dict[str, float] = {}
+    m: Dict[str, Any] = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                         "searches": 0, "errors": 0}
+    for sp in spans:
+        kind = sp.get("kind")
+        if kind == "stage":
+            stages[sp["name"]] = round(stages.get(sp["name"], 0.0) + sp.get("ms", 0.0), 1)
+        elif kind == "llm":
+            m["llm_calls"] += 1
+            m["prompt_tokens"] += sp.get("prompt_tokens", 0)
+            m["completion_tokens"] += sp.get("completion_tokens", 0)
+            m["cost"] += sp.get("cost", 0.0)
+        elif kind == "retrieve":
+            m["searches"] += 1
+        if sp.get("error") and kind != "stage":
+            m["errors"] += 1
+    m["cost"] = round(m["cost"], 6)
+    m["stages"] = stages
+    return m
+
+def _run_job(job: Dict[str, Any], prev: Dict[str, Any], ckpt: _Appender,
+             budget: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    from app.pipelines.main_loop import continue_after_answers, start_intake
+    from app.schema import Workspace
+    from app.workspace import load_ws, save_ws
+    t0 = time.perf_counter()
+    ws, questions, resumed = None, prev.get("questions"), False
+    if prev.get("ws_id"):
+        try:
+            ws = load_ws(prev["ws_id"])
+            resumed = True
+        except Exception:
+            ws = None
+    if ws is None:
+        if "answers" in job:
+            # 已有澄清回答：不再生成澄清问题
+            ws = Workspace(question=job["query"])
+            save_ws(ws)
+        else:
+            ws, questions = start_intake(job["query"])
+        ckpt.write({"id": job["id"], "ws_id": ws.id, "questions": questions})
+    seen = {sp.get("id") for sp in ws.trace or []} if resumed else set()
+    budget = dict(budget or {}, **(job.get("budget") or {}))
+    ws, answer = continue_after_answers(ws, job.get("answers") or "", resume=resumed, budget=budget)
+    spans = [sp for sp in ws.trace or [] if sp.get("id") not in seen]
+    metrics = _metrics(spans)
+    metrics.update(e2e_ms=round((time.perf_counter() - t0) * 1000, 1), resumed=resumed, docs=len(ws.docs),
+                   rounds=ws.checkpoint.get("rounds", 1), stop=ws.checkpoint.get("stop"))
+    row: Dict[str, Any] = {
+        "id": job["id"], "query": job["query"], "ws_id": ws.id, "ok": True, "answer": answer,
+        "sources": [{"title": d.title, "url": d.url} for d in ws.docs if d.url],
+        "metrics": metrics,
+    }
+    if questions is not None:
+        row["questions"] = questions
+    return row
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return round(v[min(len(v) - 1, int(q * len(v)))], 1)
+
+def run_batch(in_path: str, out_path: str, concurrency: int | None = None,
+              limit: int | None = None, budget: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    跑完 in_path 里尚未成功的查询，结果追加到 out_path；返回汇总。
+    budget：整批的研究预算（缺省 max_rounds=BATCH_MAX_ROUNDS），单条查询的 budget 字段优先。
+    Ctrl-C（KeyboardInterrupt）时通知运行中的查询在下一个检查点退出，已完成的阶段留在断点里。
+    """
+    s = get_settings()
+    concurrency = max(1, concurrency or s.BATCH_CONCURRENCY)
+    budget = dict({"max_rounds": s.BATCH_MAX_ROUNDS}, **{k: v for k, v in (budget or {}).items() if v is not None})
+    jobs = load_jobs(in_path)
+    done = {r.get("id") for r in _read_jsonl(out_path) if r.get("ok")}
+    ckpt_path = out_path + ".ckpt"
+    prev = {r["id"]: r for r in _read_jsonl(ckpt_path) if r.get("id")}
+    todo = [j for j in jobs if j["id"] not in done]
+    summary: Dict[str, Any] = {"total": len(jobs), "skipped": len(jobs) - len(todo),
+                               "ok": 0, "failed": 0, "cancelled": 0, "resumed": 0}
+    if limit is not None:
+        todo = todo[:limit]
+    print(f"[Batch] 共 {len(jobs)} 条，已完成 {summary['skipped']}，本次 {len(todo)}（并发 {concurrency}）",
+          file=sys.stderr, flush=True)
+    out, ckpt = _Appender(out_path), _Appender(ckpt_path)
+    cancel = threading.Event()
+    lat: List[float] = []
+    t0 = time.perf_counter()
+
+    def one(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if cancel.is_set():
+            return None
+        try:
+            with bind(None, cancel):
+                return _run_job(job, prev.get(job["id"]) or {}, ckpt, budget)
+        except Cancelled:
+            return None
+        except Exception as e:
+            return {"id": job["id"], "query": job["query"], "ok": False,
+                    "error": f"{e.__class__.__name__}: {e}"[:300]}
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        futs = [submit(pool, one, j) for j in todo]
+        for n, f in enumerate(as_completed(futs), 1):
+            row = f.result()
+            if row is None:
+                summary["cancelled"] += 1
+                continue
+            out.write(row)
+            if row["ok"]:
+                summary["ok"] += 1
+                summary["resumed"] += int(row["metrics"]["resumed"])
+                lat.append(row["metrics"]["e2e_ms"])
+            else:
+                summary["failed"] += 1
+                print(f"[Batch] {row['id']} 失败：{row['error']}", file=sys.stderr, flush=True)
+            elapsed = time.perf_counter() - t0
+            eta = elapsed / n * (len(todo) - n)
+            print(f"[Batch] {n}/{len(todo)} ok={summary['ok']} failed={summary['failed']} "
+                  f"elapsed={elapsed:.0f}s eta={eta:.0f}s", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        cancel.set()
+        print("[Batch] 中断：等待运行中的查询在检查点退出……", file=sys.stderr, flush=True)
+        pool.shutdown(wait=True, cancel_futures=True)
+        summary["cancelled"] = len(todo) - summary["ok"] - summary["failed"]
+        summary["interrupted"] = True
+    finally:
+        pool.shutdown(wait=True)
+        out.close()
+        ckpt.close()
+    wall = time.perf_counter() - t0
+    summary.update(
+        wall_s=round(wall, 2),
+        throughput_per_min=round(summary["ok"] / wall * 60, 2) if wall > 0 else 0.0,
+        e2e_ms={"p50": _pct(lat, 0.5), "p95": _pct(lat, 0.95), "max": _pct(lat, 1.0)},
+        rate=rate_stats(),
+    )
+    return summary
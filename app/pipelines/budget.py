@@ -0,0 +1,62 @@
+# app/pipelines/budget.py
+import time
+from typing import Any, Dict, Mapping
+from app.config import get_settings
+from app import trace
+
+# 一次研究（continue_after_answers）的预算：轮数、墙钟时间（秒）、LLM token、检索调用次数，0 = 不限。
+# 用量按本次运行的 trace span 统计（TRACE=0 时 token / 检索次数预算不生效），时间从本次运行开始算起。
+# 预算只决定要不要再开一轮：第一轮总是完整执行，进行中的一轮不打断，只按剩余时间收紧检索截止时间。
+
+class Budget:
+    FIELDS = ("max_rounds", "time_s", "tokens", "searches")
+
+    def __init__(self, max_rounds: int | None = None, time_s: float | None = None,
+                 tokens: int | None = None, searches: int | None = None):
+        s = get_settings()
+        self.max_rounds = max(1, int(s.RESEARCH_MAX_ROUNDS if max_rounds is None else max_rounds))
+        self.time_s = float(s.RESEARCH_TIME_BUDGET if time_s is None else time_s)
+        self.tokens = int(s.RESEARCH_TOKEN_BUDGET if tokens is None else tokens)
+        self.searches = int(s.RESEARCH_SEARCH_BUDGET if searches is None else searches)
+        self.t0 = time.monotonic()
+
+    @classmethod
+    def of(cls, spec: "Budget | Mapping[str, Any] | None") -> "Budget":
+        """None 用 Settings 默认值；dict 只覆盖给出的字段，未知字段报 ValueError"""
+        if isinstance(spec, Budget):
+            return spec
+        spec = dict(spec or {})
+        unknown = set(spec) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"unknown budget fields: {', '.join(sorted(unknown))}")
+        return cls(**{k: v for k, v in spec.items() if v is not None})
+
+    def used(self) -> Dict[str, float]:
+        tokens = searches = 0
+        tr = trace.current()
+        for sp in list(tr.spans) if tr is not None else []:
+            if sp.get("kind") == "llm":
+                tokens += sp.get("prompt_tokens", 0) + sp.get("completion_tokens", 0)
+            elif sp.get("kind") == "retrieve":
+                searches += 1
+        return {"time_s": round(time.monotonic() - self.t0, 2), "tokens": tokens, "searches": searches}
+
+    def time_left(self) -> float | None:
+        return self.time_s - (time.monotonic() - self.t0) if self.time_s > 0 else None
+
+    def searches_left(self) -> int | None:
+        return max(0, self.searches - self.used()["searches"]) if self.searches > 0 else None
+
+    def exhausted(self, rounds: int) -> str | None:
+        """已跑 rounds 轮后是否该停：返回原因 max_rounds / time_s / tokens / searches，还能继续返回 None"""
+        if rounds >= self.max_rounds:
+            return "max_rounds"
+        used = self.used()
+        for k in ("time_s", "tokens", "searches"):
+            limit = getattr(self, k)
+            if limit > 0 and used[k] >= limit:
+                return k
+        return None
+
+    def to_dict(self) -> Dict[str, float]:
+        return {k: getattr(self, k) for k in self.FIELDS}
@@ -1,14 +1,26 @@
 # app/pipelines/main_loop.py
-from typing import List, Tuple
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
 from app.schema import Workspace, Doc, SubGoal, Decision
 from app.workspace import save_ws, add_docs, set_goal, add_subgoals
 from app.agents.agent0_intake import gen_clarifying_questions, rewrite_goal
 from app.agents.agent1_plan import decide_and_plan
 from app.agents.agent2_filter import select_docs
-from app.agents.agent2b_clean import clean_docs   # ← 新增导入
+from app.agents.agent2b_clean import CleanPool, clean_docs   # ← 新增导入
 from app.agents.agent3_write import compose_answer
-from app.retrievers.web_tavily import WebRetriever
+from app.retrievers.web_tavily import get_web_retriever
+from app.retrievers.passages import select_passages
+from app.retrievers.rerank_sf import RerankPrefetch, rerank
+from app.tools.dedup import canonical_url, dedup_docs
 from app.config import get_settings
+from app.events import check_cancelled, emit, stage, submit
+from app.pipelines.budget import Budget
+from app import trace
+
+if TYPE_CHECKING:
+    from app.retrievers.local_vector import LocalVectorRetriever
 
 def _init_ws(query: str) -> Workspace:
     ws = Workspace(question=query)
@@ -17,49 +29,632 @@ def _init_ws(query: str) -> Workspace:
 
 def start_intake(query: str) -> Tuple[Workspace, List[str]]:
     ws = _init_ws(query)
-    qs = gen_clarifying_questions(query=query, k=3)
+    with trace.run(ws) as tr:
+        with stage("intake"):
+            qs = gen_clarifying_questions(query=query, k=3)
+    _report(tr)
     save_ws(ws)
     return ws, qs
 
-def _gather_more(ws: Workspace, dec: Decision, k: int = 8) -> Workspace:
+def _report(tr: trace.Trace) -> None:
+    if tr.spans:
+        print("[Trace] 耗时汇总：\n" + trace.summarize(tr.spans))
+
+def _open_local() -> "LocalVectorRetriever | None":
+    # 本地索引依赖 numpy / faiss，用到时才导入
+    from app.retrievers.local_vector import get_local_retriever
     try:
-        retr = WebRetriever()
-    except Exception:
+        return get_local_retriever()
+    except Exception as e:
+        print(f"[Local] 本地索引不可用：{e}")
+        return None
+
+def _search_one(retr, sg: SubGoal, k: int, timeout: float, starts: Dict[str, float],
+                local: "LocalVectorRetriever | None" = None, min_score: float = 0.0) -> List[Doc]:
+    starts[sg.id] = time.monotonic()
+    docs: List[Doc] = []
+    # 本地索引足够相关时不再联网
+    if local is not None and local is not retr and min_score > 0:
+        docs = local.search(query=sg.query, k=k)
+        if not docs or (docs[0].score or 0) < min_score:
+            docs = []
+    if not docs:
+        docs = retr.search(query=sg.query, k=k, timeout=timeout)
+    for d in docs:
+        d.meta = dict(d.meta or {})
+        d.meta["sub_goal"] = sg.id
+    return docs
+
+class _Gatherer:
+    """
+    子目标并发检索。submit() 可以在规划输出期间逐条调用（流水线模式），finish() 统一等待、
+    按子目标顺序合并、去重、写入本地索引；超时/失败的子目标只记录在 SubGoal.status，不阻塞也不中断流程。
+    on_batch(sg, docs) 在每个子目标检索完成时于检索线程中调用，应尽快返回。
+    """
+
+    def __init__(self, k: int = 8, concurrency: int | None = None, timeout: float | None = None,
+                 deadline: float | None = None, on_batch: Callable[[SubGoal, List[Doc]], None] | None = None):
+        s = get_settings()
+        self.k = k
+        try:
+            retr = get_web_retriever()
+        except Exception:
+            retr = None
+        self.local = _open_local() if (s.LOCAL_INDEX or retr is None) else None
+        if retr is None and self.local is not None and len(self.local):
+            # 无联网检索时由本地索引回答
+            retr = self.local
+        self.retr = retr
+        self.concurrency = max(1, concurrency or s.RETRIEVE_CONCURRENCY)
+        self.timeout = timeout or s.RETRIEVE_TIMEOUT
+        self.deadline = deadline or s.RETRIEVE_DEADLINE
+        self.on_batch = on_batch
+        self.t_end: float | None = None
+        self.pool: ThreadPoolExecutor | None = None
+        self.starts: Dict[str, float] = {}
+        self.futs: Dict[Future, SubGoal] = {}
+
+    def submit(self, sg: SubGoal) -> None:
+        if self.retr is None or any(x.id == sg.id for x in self.futs.values()):
+            return
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="retrieve")
+            # 整体截止时间从第一条子目标提交时算起
+            self.t_end = time.monotonic() + self.deadline
+        sg.status = "pending"
+        self.futs[submit(self.pool, self._run, sg)] = sg
+
+    def _run(self, sg: SubGoal) -> List[Doc]:
+        docs = _search_one(self.retr, sg, self.k, self.timeout, self.starts, self.local,
+                           get_settings().LOCAL_FIRST_SCORE)
+        if self.on_batch is not None:
+            self.on_batch(sg, docs)
+        return docs
+
+    def close(self) -> None:
+        if self.pool is not None:
+            # 不等待被放弃的查询线程，它们会在 HTTP 超时后自行结束
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def finish(self, ws: Workspace, sub_goals: List[SubGoal], save: bool = True) -> Workspace:
+        """save=False：不保存 ws（多轮研究时检索结果先放在临时工作区里筛选）"""
+        if self.retr is None or not sub_goals:
+            self.close()
+            return ws
+        s = get_settings()
+        for sg in sub_goals:
+            self.submit(sg)
+        wanted = {sg.id for sg in sub_goals}
+        futs = {f: sg for f, sg in self.futs.items() if sg.id in wanted}
+        # 提前提交但最终未采用的子目标直接放弃
+        for f, sg in self.futs.items():
+            if sg.id not in wanted:
+                f.cancel()
+
+        print(f"[Retrieve] 并发检索 {len(sub_goals)} 个子目标（并发 {self.concurrency}）：")
+        timeout, starts, t_end = self.timeout, self.starts, self.t_end
+        results: Dict[str, List[Doc]] = {}
+        pending = set(futs)
+        try:
+            while pending:
+                check_cancelled()
+                now = time.monotonic()
+                # 单条超时：已开始执行且超过 timeout 的查询直接放弃等待
+                for f in list(pending):
+                    t0 = starts.get(futs[f].id)
+                    if t0 is not None and now - t0 > timeout:
+                        futs[f].status = "timeout"
+                        pending.discard(f)
+                if not pending:
+                    break
+                # 整体截止：未开始的取消，已开始的记为超时
+                if now >= t_end:
+                    for f in pending:
+                        sg = futs[f]
+                        sg.status = "timeout" if sg.id in starts else "cancelled"
+                        f.cancel()
+                    break
+                waits = [t_end - now] + [starts[futs[f].id] + timeout - now for f in pending if futs[f].id in starts]
+                done, pending = wait(pending, timeout=max(0.05, min(waits)), return_when=FIRST_COMPLETED)
+                for f in done:
+                    sg = futs[f]
+                    try:
+                        results[sg.id] = f.result()
+                        sg.status = "done"
+                    except Exception as e:
+                        sg.status = "error"
+                        print(f"  · 检索失败：{sg.query} -> {e}")
+        finally:
+            self.close()
+
+        all_new: List[Doc] = []
+        for sg in sub_goals:
+            docs = results.get(sg.id, [])
+            print(f"  · [{sg.status}] {len(docs)} docs <- {sg.query}")
+            emit("retrieve", sub_goal=sg.id, query=sg.query, status=sg.status, docs=len(docs))
+            all_new.extend(docs)
+        if all_new:
+            ws = add_docs(ws, all_new)
+            if s.DEDUP:
+                n0 = len(ws.docs)
+                ws.docs = dedup_docs(ws.docs, max_hamming=s.DEDUP_HAMMING)
+                if len(ws.docs) < n0:
+                    print(f"[Dedup] 合并重复文档 {n0} -> {len(ws.docs)}")
+        if save:
+            save_ws(ws)
+        if self.local is not None and s.LOCAL_INDEX:
+            try:
+                n = self.local.index_docs([d for d in all_new if d.source != "local"])
+                if n:
+                    print(f"[Local] 新增索引分块 {n}（共 {len(self.local)}）")
+            except Exception as e:
+                print(f"[Local] 索引失败：{e}")
         return ws
-    all_new: List[Doc] = []
-    for sg in dec.sub_goals:
-        all_new.extend(retr.search(query=sg.query, k=k))
-    if all_new:
-        ws = add_docs(ws, all_new)
-        save_ws(ws)
-    return ws
 
-def _filter_then_clean(ws: Workspace, query: str, subquery: str | None = None, top_k: int = 8) -> List[Doc]:
+def _gather_more(
+    ws: Workspace,
+    dec: Decision,
+    k: int = 8,
+    concurrency: int | None = None,
+    timeout: float | None = None,
+    deadline: float | None = None,
+) -> Workspace:
+    """并发检索全部子目标"""
+    if not dec.sub_goals:
+        return ws
+    return _Gatherer(k, concurrency, timeout, deadline).finish(ws, dec.sub_goals)
+
+def _doc_sub_goals(d: Doc) -> List[str]:
+    """文档所属的子目标 id：检索来源 sub_goal，加上去重时合并进来的重复文档的 sub_goals"""
+    m = d.meta or {}
+    return list(dict.fromkeys(x for x in [m.get("sub_goal"), *(m.get("sub_goals") or [])] if x))
+
+def _doc_groups(ws: Workspace, docs: List[Doc], fallback: str) -> List[Tuple[str, List[Doc]]]:
+    """
+    按检索来源的子目标把候选分组（组内保持原顺序）；没有子目标标记的文档归入 fallback 查询。
+    去重合并了多个子目标结果的文档进入每个相关的组，除第一组外放副本（rerank 会写 score）。
+    """
+    queries = {sg.id: sg.query for sg in ws.sub_goals}
+    groups: Dict[str, List[Doc]] = {}
+    for d in docs:
+        qs = list(dict.fromkeys(queries[x] for x in _doc_sub_goals(d) if x in queries)) or [fallback]
+        for j, q in enumerate(qs):
+            groups.setdefault(q, []).append(d if j == 0 else d.model_copy())
+    return list(groups.items())
+
+def _round_robin(lists: List[List[Doc]], limit: int) -> List[Doc]:
+    """各组轮流取一篇，保证每个子目标都有代表；按 id 去重"""
+    out: List[Doc] = []
+    seen = set()
+    for r in range(max((len(x) for x in lists), default=0)):
+        for x in lists:
+            if r < len(x) and x[r].id not in seen:
+                seen.add(x[r].id)
+                out.append(x[r])
+    return out[:limit]
+
+def _select(ws: Workspace, query: str, subquery: str, top_k: int, prefetch: RerankPrefetch | None = None,
+            on_keep: Callable[[Doc], None] | None = None) -> List[Doc]:
+    """
+    rerank 粗排 + LLM 筛选。FILTER_PER_SUBGOAL=1 时每个子目标只用自己检索到的文档、对着自己的子查询筛选，
+    各组并发，结果轮流合并到 top_k 篇；否则全部候选对着 subquery 一次筛选。
+    """
+    s = get_settings()
+    groups = _doc_groups(ws, ws.docs, subquery) if s.FILTER_PER_SUBGOAL else [(subquery, list(ws.docs))]
+    n = len(groups)
+    use_rerank = s.RERANK_BACKEND.lower() != "off"
+    top_n = max(1, -(-s.RERANK_TOPN // n))
+    # rerank 粗排：候选过多时只把 top-N 交给 LLM 筛选
+    if use_rerank and any(len(docs) > top_n for _, docs in groups):
+        with stage("rerank", groups=n):
+            def _rank(q: str, docs: List[Doc]) -> List[Doc]:
+                if len(docs) <= top_n:
+                    return docs
+                known = prefetch.result(q) if prefetch is not None else None
+                return rerank(q, list(docs), top_n=top_n, known=known)
+
+            if n == 1:
+                groups = [(groups[0][0], _rank(*groups[0]))]
+            else:
+                with ThreadPoolExecutor(max_workers=min(n, s.FILTER_CONCURRENCY), thread_name_prefix="rerank-g") as pool:
+                    futs = [submit(pool, _rank, q, docs) for q, docs in groups]
+                    groups = [(q, f.result()) for (q, _), f in zip(groups, futs)]
+        print(f"[Rerank] {len(ws.docs)} -> {sum(len(d) for _, d in groups)} 篇")
+    if n == 1:
+        with stage("filter"):
+            return select_docs(query=query, subquery=groups[0][0], docs=groups[0][1], top_k=top_k, on_keep=on_keep)
+
+    per_k = max(1, -(-top_k // n))
+    # 并发筛选时逐 token 打印会交错，改为整段打印
+    echo = "buffer" if s.STREAM_ECHO == "stream" else None
+    with stage("filter", groups=n):
+        with ThreadPoolExecutor(max_workers=min(n, s.FILTER_CONCURRENCY), thread_name_prefix="filter-g") as pool:
+            futs = [submit(pool, select_docs, query=query, subquery=q, docs=docs, top_k=per_k, on_keep=on_keep,
+                           echo=echo) for q, docs in groups]
+            kept = _round_robin([f.result() for f in futs], top_k)
+    print(f"[Filter] 按子目标筛选 {n} 组 -> {len(kept)} 篇")
+    return kept
+
+def _filter_then_clean(ws: Workspace, query: str, subquery: str | None = None, top_k: int = 8,
+                       prefetch: RerankPrefetch | None = None, overlap: bool = False) -> List[Doc]:
+    """
+    prefetch：检索期间已开始的 rerank 预打分；overlap=True 且未开段落筛选时，
+    筛选输出的保留索引一到就开始清洗（流水线模式）。
+    """
     if not ws.docs:
         return []
-    # 保持原有行为：直接用 agent2 在 ws.docs 上筛选
-    kept = select_docs(query=query, subquery=subquery or query, docs=ws.docs, top_k=top_k)
+    s = get_settings()
+    subquery = subquery or query
+    if overlap and not s.PASSAGES:
+        # 段落筛选要看全部保留文档才能分组取 top-N，只有关闭时才能逐篇提前清洗
+        cp = CleanPool()
+        kept = _select(ws, query, subquery, top_k, prefetch=prefetch, on_keep=cp.submit)
+        with stage("clean", docs=len(kept)):
+            return cp.collect(kept)
+    kept = _select(ws, query, subquery, top_k, prefetch=prefetch)
+    # 段落级筛选：每个子目标只留最相关的若干段，清洗与写作只处理这些段落
+    if s.PASSAGES and kept:
+        queries = {sg.id: sg.query for sg in ws.sub_goals}
+        with stage("passages"):
+            passages = select_passages(kept, queries, default_query=subquery)
+        if passages:
+            print(f"[Passages] {len(kept)} 篇 -> {sum(len(d.meta['passages']) for d in passages)} 段")
+            kept = passages
     # 新增最小步骤：对保留文档做逐条 LLM 清洗，覆盖 content
-    cleaned = clean_docs(docs=kept)
+    with stage("clean", docs=len(kept)):
+        cleaned = clean_docs(docs=kept)
     return cleaned
 
-def continue_after_answers(ws: Workspace, answers: str) -> Tuple[Workspace, str]:
-    goal = rewrite_goal(query=ws.question, user_answers=[answers])
-    ws = set_goal(ws, goal)
+def continue_after_answers(ws: Workspace, answers: str, resume: bool = False,
+                           budget: Budget | Dict | None = None) -> Tuple[Workspace, str]:
+    """
+    resume=True：按 ws.checkpoint 跳过上次已完成的阶段（改写 / 规划 / 检索 / 清洗 / 后续各轮），
+    从中断处继续；没有断点时与正常运行相同。
+    budget：本次研究的轮数与预算（Budget 或 {max_rounds, time_s, tokens, searches}），缺省用 Settings。
+    """
+    budget = Budget.of(budget)
+    with trace.run(ws) as tr:
+        ws, answer = _continue(ws, answers, resume=resume, budget=budget)
+    _report(tr)
+    save_ws(ws)
+    return ws, answer
 
-    dec = decide_and_plan(ws=ws)
-    ws = add_subgoals(ws, dec.sub_goals)
+def _done(ws: Workspace, step: str) -> bool:
+    return step in (ws.checkpoint or {}).get("done", [])
+
+def _checkpoint(ws: Workspace, step: str, **extra) -> None:
+    """记录已完成的阶段并立即保存（SQLite 后端只写表头与变化的行）"""
+    cp = dict(ws.checkpoint or {})
+    cp["done"] = list(dict.fromkeys(list(cp.get("done", [])) + [step]))
+    cp.update(extra)
+    ws.checkpoint = cp
     save_ws(ws)
 
-    if dec.need_more:
-        ws = _gather_more(ws, dec, k=get_settings().DEFAULT_TOPK)
+def _resumed_plan(ws: Workspace) -> Decision:
+    """从断点还原规划结果：need_more 与本次规划出的子目标"""
+    ids = ws.checkpoint.get("sub_goals") or []
+    by_id = {sg.id: sg for sg in ws.sub_goals}
+    return Decision(need_more=bool(ws.checkpoint.get("need_more")),
+                    sub_goals=[by_id[i] for i in ids if i in by_id])
 
-    subq = dec.sub_goals[0].query if dec.sub_goals else ws.goal or ws.question
-    kept_cleaned = _filter_then_clean(ws, query=ws.question, subquery=subq, top_k=get_settings().DEFAULT_TOPK)
+# ---------------- 语义缓存：复用近似问题 / 子目标以前筛选、清洗好的文档 ----------------
+
+_SEMCACHE_OFF_WARNED = False
+
+def _semcache():
+    global _SEMCACHE_OFF_WARNED
+    if not get_settings().SEMANTIC_CACHE:
+        return None
+    # 依赖 numpy（与本地索引共用嵌入器），用到时才导入
+    from app.storage.semantic_cache import get_semantic_cache
+    from app.storage.vectorstore import SEMANTIC_EMBEDDERS
+    try:
+        sc = get_semantic_cache()
+    except Exception as e:
+        print(f"[SemCache] 不可用：{e}")
+        return None
+    # 特征哈希嵌入分不清只差一个年份 / 编号的查询，只在语义嵌入器下启用
+    if sc.embedder.name not in SEMANTIC_EMBEDDERS:
+        if not _SEMCACHE_OFF_WARNED:
+            _SEMCACHE_OFF_WARNED = True
+            print(f"[SemCache] 未生效：需要语义嵌入器（EMBED_BACKEND=local / sf），当前 {sc.embedder.name}")
+        return None
+    return sc
+
+def _lookup(kind: str, text: str):
+    sc = _semcache()
+    if sc is None:
+        return None
+    try:
+        hit = sc.lookup(kind, text)
+    except Exception as e:
+        print(f"[SemCache] 查找失败：{e}")
+        return None
+    if hit is not None:
+        print(f"[SemCache] {kind} 命中 {hit['score']:.2f}（{hit['age_s'] / 3600:.1f}h 前）：{text} ≈ {hit['query']}"
+              f" -> 复用 {len(hit['docs'])} 篇")
+        emit("semantic_hit", kind=kind, query=text, cached_query=hit["query"], score=hit["score"],
+             docs=len(hit["docs"]))
+    return hit
+
+def _reuse_goal(ws: Workspace) -> bool:
+    """目标命中：直接复用当时的子目标与最终文档，跳过规划、检索、筛选、清洗"""
+    hit = _lookup("goal", ws.goal or "")
+    if hit is None:
+        return False
+    subs: Dict[str, SubGoal] = {}
+    for old_id, q in hit["data"].get("sub_goals") or []:
+        subs[old_id] = SubGoal(query=q, status="cached")
+    for d in hit["docs"]:
+        sg = subs.get((d.meta or {}).get("sub_goal"))
+        if sg is not None:
+            d.meta["sub_goal"] = sg.id
+        if d.meta.get("sub_goals"):
+            d.meta["sub_goals"] = [subs[x].id for x in d.meta["sub_goals"] if x in subs]
+    ws = add_subgoals(ws, list(subs.values()))
+    ws.docs = hit["docs"]
+    _checkpoint(ws, "plan", need_more=False, sub_goals=[sg.id for sg in subs.values()])
+    _checkpoint(ws, "retrieve")
+    # 复用的是以前研究的最终结果，不再开新一轮
+    _checkpoint(ws, "clean", stop="cached")
+    return True
+
+def _reuse_sub_goal(sg: SubGoal) -> List[Doc] | None:
+    hit = _lookup("sub", sg.query)
+    if hit is None or not hit["docs"]:
+        return None
+    for d in hit["docs"]:
+        d.meta["sub_goal"] = sg.id
+        # 以前研究里的子目标 id 在本次无意义
+        d.meta.pop("sub_goals", None)
+    sg.status = "cached"
+    return hit["docs"]
 
+def _reuse_sub_goals(ws: Workspace, subs: List[SubGoal],
+                     hits: Dict[str, List[Doc] | None] | None = None) -> List[SubGoal]:
+    """命中的子目标把缓存文档加入工作区，返回仍需检索的子目标；hits 为规划期间已查过的结果"""
+    hits = hits if hits is not None else {}
+    todo = []
+    for sg in subs:
+        docs = hits[sg.id] if sg.id in hits else _reuse_sub_goal(sg)
+        if docs:
+            ws = add_docs(ws, docs)
+        else:
+            todo.append(sg)
+    return todo
+
+def _split_reused(ws: Workspace) -> List[Doc]:
+    """把缓存复用的文档（已筛选、清洗过）从工作区取出，不再参与筛选与清洗"""
+    reused = [d for d in ws.docs if (d.meta or {}).get("reused_from")]
+    if reused:
+        ws.docs = [d for d in ws.docs if not (d.meta or {}).get("reused_from")]
+    return reused
+
+def _finish_clean(ws: Workspace, dec: Decision, reused: List[Doc], kept_cleaned: List[Doc]) -> None:
     if kept_cleaned:
         ws.docs = kept_cleaned
-        save_ws(ws)
+        _remember(dec.sub_goals, kept_cleaned)
+    elif ws.docs:
+        # 筛选一篇没留时沿用未筛选、未清洗的候选写作，但不能当作筛选结果写进语义缓存
+        ws.checkpoint["unfiltered"] = True
+    ws.docs = reused + ws.docs
+    _checkpoint(ws, "clean")
+
+def _remember(subs: List[SubGoal], fresh: List[Doc]) -> None:
+    """新筛选、清洗出的文档按子目标写入语义缓存"""
+    sc = _semcache()
+    if sc is None or not fresh:
+        return
+    try:
+        for sg in subs:
+            docs = [d for d in fresh if sg.id in _doc_sub_goals(d)]
+            if docs:
+                sc.put("sub", sg.query, docs)
+    except Exception as e:
+        print(f"[SemCache] 写入失败：{e}")
+
+def _remember_goal(ws: Workspace) -> None:
+    """研究结束后按目标写一条：全部子目标与最终文档"""
+    sc = _semcache()
+    if sc is None or not ws.docs or ws.checkpoint.get("unfiltered"):
+        return
+    try:
+        sc.put("goal", ws.goal or ws.question, ws.docs, sub_goals=[[sg.id, sg.query] for sg in ws.sub_goals])
+    except Exception as e:
+        print(f"[SemCache] 写入失败：{e}")
+
+# ---------------- 多轮研究：第一轮之后按预算继续规划、检索、筛选、清洗 ----------------
+
+def _norm_query(q: str) -> str:
+    return re.sub(r"[\W_]+", "", (q or "").lower())
+
+def _searched(ws: Workspace) -> Dict[str, int]:
+    """已检索过的子目标查询 -> 保留文档数"""
+    kept: Dict[str, int] = {}
+    for d in ws.docs:
+        for sid in _doc_sub_goals(d):
+            kept[sid] = kept.get(sid, 0) + 1
+    return {sg.query: kept.get(sg.id, 0) for sg in ws.sub_goals if sg.status != "pending"}
+
+def _drop_known(scratch: Workspace, known: List[Doc]) -> None:
+    """去掉与已保留文档同一 URL（含已合并的重复 URL）的新候选"""
+    urls = set()
+    for d in known:
+        urls.update(canonical_url(u) for u in [d.url, *((d.meta or {}).get("merged_urls") or [])] if u)
+    n0 = len(scratch.docs)
+    scratch.docs = [d for d in scratch.docs if not d.url or canonical_url(d.url) not in urls]
+    if len(scratch.docs) < n0:
+        print(f"[Round] 去掉已保留过的文档 {n0 - len(scratch.docs)} 篇")
+
+def _research_round(ws: Workspace, n: int, budget: Budget) -> str | None:
+    """
+    第 n 轮：规划（提示词列出已检索过的子目标）→ 只检索新子目标 → 新候选在临时工作区里筛选、清洗 →
+    合并进 ws。返回停止原因（enough / no_new_sub_goals / no_new_docs），还应继续返回 None。
+    一轮完成才写入 ws 并记断点，中途中断时 ws 保持上一轮结束时的样子。
+    """
+    s = get_settings()
+    searched = _searched(ws)
+    with stage("plan", round=n):
+        dec = decide_and_plan(ws=ws, searched=searched)
+    if not dec.need_more:
+        return "enough"
+    seen = {_norm_query(q) for q in searched}
+    subs = [sg for sg in dec.sub_goals if _norm_query(sg.query) not in seen]
+    if len(subs) < len(dec.sub_goals):
+        print(f"[Round {n}] 跳过已检索过的子目标 {len(dec.sub_goals) - len(subs)} 条")
+    left = budget.searches_left()
+    if left is not None:
+        subs = subs[:left]
+    if not subs:
+        return "no_new_sub_goals"
+
+    scratch = Workspace(question=ws.question, goal=ws.goal, sub_goals=subs)
+    todo = _reuse_sub_goals(scratch, subs)
+    _drop_known(scratch, ws.docs)
+    # 缓存给出的文档已全部保留过的子目标（近似查询命中了已检索过的条目）照常检索
+    hit = {sid for d in scratch.docs for sid in _doc_sub_goals(d)}
+    todo += [sg for sg in subs if sg.status == "cached" and sg.id not in hit]
+    t_left = budget.time_left()
+    deadline = max(1.0, min(t_left, s.RETRIEVE_DEADLINE)) if t_left is not None else None
+    with stage("retrieve", round=n, sub_goals=len(todo)):
+        scratch = _Gatherer(k=s.DEFAULT_TOPK, deadline=deadline).finish(scratch, todo, save=False)
+    _drop_known(scratch, ws.docs)
+    reused = _split_reused(scratch)
+    fresh = _filter_then_clean(scratch, query=ws.question, subquery=subs[0].query, top_k=s.DEFAULT_TOPK)
+    _remember(subs, fresh)
+
+    new = reused + fresh
+    ws = add_subgoals(ws, subs)
+    ws = add_docs(ws, new)
+    print(f"[Round {n}] 新子目标 {len(subs)} 条，新增保留文档 {len(new)} 篇（共 {len(ws.docs)}）")
+    emit("round", round=n, sub_goals=len(subs), new_docs=len(new), docs=len(ws.docs), used=budget.used())
+    _checkpoint(ws, f"round{n}", rounds=n)
+    return None if new else "no_new_docs"
+
+def _more_rounds(ws: Workspace, budget: Budget) -> None:
+    """
+    第一轮之后继续研究，直到规划给出 need_more=false、一轮没有新增保留文档或预算用完；
+    结束时记下轮数、停止原因与用量（ws.checkpoint），并按目标写入语义缓存。
+    """
+    cp = ws.checkpoint
+    if cp.get("stop"):
+        return
+    n = cp.get("rounds", 1)
+    stop = None if cp.get("need_more") else "enough"
+    while stop is None:
+        stop = budget.exhausted(n)
+        if stop is None:
+            stop = _research_round(ws, n + 1, budget)
+            # 规划阶段就停下的一轮不计入轮数
+            n = ws.checkpoint.get("rounds", n)
+    used = budget.used()
+    if budget.max_rounds > 1:
+        print(f"[Research] {n} 轮，停止：{stop}（用时 {used['time_s']}s，token {used['tokens']}，"
+              f"检索 {used['searches']} 次）")
+    _checkpoint(ws, "research", rounds=n, stop=stop, used=used)
+    _remember_goal(ws)
+
+def _continue(ws: Workspace, answers: str, resume: bool = False,
+              budget: Budget | None = None) -> Tuple[Workspace, str]:
+    s = get_settings()
+    if not resume:
+        ws.checkpoint = {}
+    elif ws.checkpoint.get("done"):
+        print(f"[Resume] 跳过已完成阶段：{', '.join(ws.checkpoint['done'])}")
+    # 中途恢复走屏障模式：流水线模式的阶段重叠执行，无法从中间接上
+    budget = budget or Budget()
+    if s.PIPELINE and not ws.checkpoint.get("done"):
+        return _continue_pipelined(ws, answers, budget)
+    if not _done(ws, "rewrite"):
+        with stage("rewrite"):
+            goal = rewrite_goal(query=ws.question, user_answers=[answers])
+        ws = set_goal(ws, goal)
+        _checkpoint(ws, "rewrite")
+        _reuse_goal(ws)
+
+    if _done(ws, "plan"):
+        dec = _resumed_plan(ws)
+    else:
+        with stage("plan"):
+            dec = decide_and_plan(ws=ws)
+        ws = add_subgoals(ws, dec.sub_goals)
+        _checkpoint(ws, "plan", need_more=dec.need_more, sub_goals=[sg.id for sg in dec.sub_goals])
+
+    if dec.need_more and not _done(ws, "retrieve"):
+        todo = _reuse_sub_goals(ws, dec.sub_goals)
+        with stage("retrieve", sub_goals=len(todo)):
+            ws = _gather_more(ws, Decision(need_more=True, sub_goals=todo), k=s.DEFAULT_TOPK)
+        _checkpoint(ws, "retrieve")
+
+    if not _done(ws, "clean"):
+        subq = dec.sub_goals[0].query if dec.sub_goals else ws.goal or ws.question
+        reused = _split_reused(ws)
+        kept_cleaned = _filter_then_clean(ws, query=ws.question, subquery=subq, top_k=s.DEFAULT_TOPK)
+        _finish_clean(ws, dec, reused, kept_cleaned)
+    _more_rounds(ws, budget)
+
+    with stage("write"):
+        answer = compose_answer(ws=ws)
+    return ws, answer
+
+def _continue_pipelined(ws: Workspace, answers: str, budget: Budget) -> Tuple[Workspace, str]:
+    """
+    流水线模式：规划流式输出时每解析出一条子目标就立即提交检索；每批检索结果到达即做 rerank 预打分；
+    未开段落筛选时，筛选输出的保留索引一到就开始清洗。交给各 LLM 的输入与屏障模式相同，
+    回答内容一致，只是阶段之间重叠执行。
+    """
+    s = get_settings()
+    with stage("rewrite"):
+        goal = rewrite_goal(query=ws.question, user_answers=[answers])
+    ws = set_goal(ws, goal)
+    _checkpoint(ws, "rewrite")
+    if _reuse_goal(ws):
+        with stage("write"):
+            answer = compose_answer(ws=ws)
+        return ws, answer
+
+    needs_rerank = s.RERANK_BACKEND.lower() != "off"
+    pre = RerankPrefetch() if needs_rerank and RerankPrefetch.enabled() else None
+
+    def _prefetch(sg: SubGoal, docs: List[Doc]) -> None:
+        # 与 _select 的 rerank 查询一致：按子目标筛选时各组对着自己的子查询，否则都对着第一条子目标
+        pre.add(docs, sg.query if s.FILTER_PER_SUBGOAL else None)
+
+    g = _Gatherer(k=s.DEFAULT_TOPK, on_batch=_prefetch if pre else None)
+    hits: Dict[str, List[Doc] | None] = {}
+
+    def _dispatch(sg: SubGoal) -> None:
+        if pre is not None and pre.query is None:
+            pre.query = sg.query
+        hits[sg.id] = _reuse_sub_goal(sg)
+        if not hits[sg.id]:
+            g.submit(sg)
+
+    try:
+        with stage("plan"):
+            dec = decide_and_plan(ws=ws, on_sub_goal=_dispatch)
+        ws = add_subgoals(ws, dec.sub_goals)
+        _checkpoint(ws, "plan", need_more=dec.need_more, sub_goals=[sg.id for sg in dec.sub_goals])
+
+        if dec.need_more:
+            todo = _reuse_sub_goals(ws, dec.sub_goals, hits)
+            with stage("retrieve", sub_goals=len(todo)):
+                ws = g.finish(ws, todo)
+            _checkpoint(ws, "retrieve")
+    finally:
+        g.close()
+
+    subq = dec.sub_goals[0].query if dec.sub_goals else ws.goal or ws.question
+    reused = _split_reused(ws)
+    try:
+        kept_cleaned = _filter_then_clean(ws, query=ws.question, subquery=subq, top_k=s.DEFAULT_TOPK,
+                                          prefetch=pre, overlap=True)
+    finally:
+        if pre is not None:
+            pre.close()
+    _finish_clean(ws, dec, reused, kept_cleaned)
+    _more_rounds(ws, budget)
 
-    answer = compose_answer(ws=ws)
-    return ws, answer
\ No newline at end of file
+    with stage("write"):
+        answer = compose_answer(ws=ws)
+    return ws, answer
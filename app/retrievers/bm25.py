@@ -0,0 +1,47 @@
+# app/retrievers/bm25.py
+import math
+import re
+from collections import Counter
+from typing import List, Sequence
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK = re.compile(r"[一-鿿]+")
+
+def tokenize(text: str) -> List[str]:
+    """英文按词、中文按单字 + 二元组（无需分词词典）"""
+    t = (text or "").lower()
+    toks = _WORD.findall(t)
+    for run in _CJK.findall(t):
+        toks.extend(run)
+        toks.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return toks
+
+class BM25:
+    """Okapi BM25，在内存里对一小批文本打分"""
+
+    def __init__(self, corpus: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.tfs = [Counter(tokenize(t)) for t in corpus]
+        self.lens = [sum(tf.values()) for tf in self.tfs]
+        self.avgdl = (sum(self.lens) / len(self.lens)) if self.lens else 0.0
+        df: Counter = Counter()
+        for tf in self.tfs:
+            df.update(tf.keys())
+        n = len(self.tfs)
+        self.idf = {w: math.log(1 + (n - c + 0.5) / (c + 0.5)) for w, c in df.items()}
+
+    def scores(self, query: str) -> List[float]:
+        q = set(tokenize(query))
+        out = []
+        for tf, dl in zip(self.tfs, self.lens):
+            norm = self.k1 * (1 - self.b + self.b * dl / (self.avgdl or 1.0))
+            s = 0.0
+            for w in q:
+                f = tf.get(w)
+                if f:
+                    s += self.idf[w] * f * (self.k1 + 1) / (f + norm)
+            out.append(s)
+        return out
+
+def bm25_scores(query: str, texts: Sequence[str]) -> List[float]:
+    return BM25(texts).scores(query) if texts else []
@@ -0,0 +1,79 @@
+# app/retrievers/local_vector.py
+import hashlib
+import os
+import threading
+from typing import List
+from app.schema import Doc
+from app.config import get_settings
+from app.storage.vectorstore import VectorStore, get_embedder
+from app.tools.splitters import split_text
+from app import trace
+
+class LocalVectorRetriever:
+    """本地向量检索：索引流水线取回过的全部 Doc（分块），接口与 WebRetriever.search 一致"""
+
+    def __init__(self, store: VectorStore | None = None, embedder=None):
+        s = get_settings()
+        self.embedder = embedder or get_embedder()
+        self.store = store or VectorStore(
+            os.path.join(s.DATA_DIR, "vectors", self.embedder.name),
+            dim=self.embedder.dim,
+            embedder_name=self.embedder.name,
+        )
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def index_docs(self, docs: List[Doc]) -> int:
+        """分块、嵌入并增量写入；已索引过的分块（按内容哈希）跳过。返回新增分块数"""
+        s = get_settings()
+        texts, items = [], []
+        for d in docs:
+            for j, chunk in enumerate(split_text(d.content or "", s.PASSAGE_TOKENS, s.PASSAGE_OVERLAP)):
+                h = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+                if h in self.store.hashes:
+                    continue
+                # 先占位：同一批与并发的索引不重复嵌入同一分块
+                self.store.hashes.add(h)
+                texts.append(chunk)
+                items.append({"hash": h, "title": d.title, "url": d.url, "chunk": j, "text": chunk,
+                              "source": d.source})
+        if not texts:
+            return 0
+        try:
+            n = self.store.add(self.embedder.embed(texts), items)
+        except BaseException:
+            # 嵌入或写入失败：撤销占位，这些分块下次还能重新索引
+            self.store.hashes.difference_update(it["hash"] for it in items)
+            raise
+        self.store.persist()
+        return n
+
+    def search(self, query: str, k: int = 8, timeout: float | None = None) -> List[Doc]:
+        if not len(self.store):
+            return []
+        with trace.span("local", kind="retrieve", query=query, k=k) as sp:
+            hits = self.store.search(self.embedder.embed([query])[0], k=k)
+            sp.attrs["docs"] = len(hits)
+        return [
+            Doc(
+                title=it.get("title") or "",
+                url=it.get("url") or "",
+                content=it.get("text") or "",
+                score=score,
+                source="local",
+                meta={"score": score, "position": i, "chunk": it.get("chunk"), "origin": it.get("source")},
+            )
+            for i, (score, it) in enumerate(hits)
+        ]
+
+_LOCAL: LocalVectorRetriever | None = None
+_LOCAL_LOCK = threading.Lock()
+
+def get_local_retriever() -> LocalVectorRetriever:
+    """进程内共享一个本地索引"""
+    global _LOCAL
+    with _LOCAL_LOCK:
+        if _LOCAL is None:
+            _LOCAL = LocalVectorRetriever()
+        return _LOCAL
@@ -0,0 +1,81 @@
+# app/retrievers/passages.py
+from typing import Dict, List
+from app.schema import Doc
+from app.config import get_settings
+from app.retrievers.bm25 import bm25_scores
+from app.tools.splitters import split_text
+
+def _rank(query: str, passages: List[Doc], use_rerank: bool) -> List[float]:
+    scores = bm25_scores(query, [p.content for p in passages])
+    if not use_rerank:
+        return scores
+    # 先用 BM25 取 3 倍候选，再交给 rerank 模型精排；接口失败时沿用 BM25 分数
+    from app.retrievers.rerank_sf import rerank
+    order = sorted(range(len(passages)), key=lambda i: -scores[i])
+    cand = order[: max(1, 3 * get_settings().PASSAGE_TOPN)]
+    try:
+        ranked = rerank(query, [passages[i] for i in cand])
+    except Exception as e:
+        print(f"[Passages] rerank 失败，改用 BM25：{e}")
+        return scores
+    out = [float("-inf")] * len(passages)
+    for rank, p in enumerate(ranked):
+        out[p.meta["_i"]] = float(len(ranked) - rank)
+    return out
+
+def select_passages(
+    docs: List[Doc],
+    queries: Dict[str, str],
+    default_query: str,
+    top_n: int | None = None,
+    chunk_tokens: int | None = None,
+    overlap_tokens: int | None = None,
+    use_rerank: bool | None = None,
+) -> List[Doc]:
+    """
+    段落级筛选：把每篇文档切块，按所属子目标的查询（meta["sub_goal(s)"] -> queries）分组，
+    组内用 BM25（可选 rerank）排序，每个子目标只留 top_n 段；
+    同一文档被选中的段落按原文顺序拼回一个 Doc（保持 id / url / title），未选中段落的文档被丢弃。
+    """
+    s = get_settings()
+    top_n = top_n or s.PASSAGE_TOPN
+    chunk_tokens = chunk_tokens or s.PASSAGE_TOKENS
+    overlap_tokens = s.PASSAGE_OVERLAP if overlap_tokens is None else overlap_tokens
+    use_rerank = s.PASSAGE_RERANK if use_rerank is None else use_rerank
+
+    groups: Dict[str, List[int]] = {}
+    for i, d in enumerate(docs):
+        m = d.meta or {}
+        subs = m.get("sub_goals") or ([m["sub_goal"]] if m.get("sub_goal") else [])
+        q = next((queries[x] for x in subs if x in queries), default_query)
+        groups.setdefault(q, []).append(i)
+
+    chunks: Dict[int, List[str]] = {i: split_text(d.content or "", chunk_tokens, overlap_tokens)
+                                    for i, d in enumerate(docs)}
+    picked: Dict[int, Dict[int, float]] = {}
+    for q, members in groups.items():
+        passages: List[Doc] = []
+        for i in members:
+            for j, c in enumerate(chunks[i]):
+                passages.append(Doc(content=c, url=docs[i].url, meta={"_i": len(passages), "doc": i, "chunk": j}))
+        if not passages:
+            continue
+        scores = _rank(q, passages, use_rerank)
+        best = [k for k in sorted(range(len(passages)), key=lambda k: -scores[k]) if scores[k] > 0][:top_n]
+        if not best:
+            # 与查询毫无词面重合时退回各文档开头一段
+            best = [k for k, p in enumerate(passages) if p.meta["chunk"] == 0][:top_n]
+        for k in best:
+            p = passages[k].meta
+            picked.setdefault(p["doc"], {})[p["chunk"]] = scores[k]
+
+    out: List[Doc] = []
+    for i, d in enumerate(docs):
+        sel = picked.get(i)
+        if not sel:
+            continue
+        idx = sorted(sel)
+        meta = dict(d.meta or {})
+        meta.update(passages=idx, passage_score=max(sel.values()), page_chunks=len(chunks[i]))
+        out.append(d.model_copy(update={"content": "\n...\n".join(chunks[i][j] for j in idx), "meta": meta}))
+    return out
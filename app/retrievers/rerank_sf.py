@@ -1,31 +1,197 @@
-from typing import List
-import httpx
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
 from app.schema import Doc
 from app.config import get_settings
+from app.events import submit
+from app import trace
+from app.llm.clients import get_http_client
+from app.llm.ratelimit import attempts
+from app.retrievers.bm25 import bm25_scores
+from app.tools.splitters import split_text
 
-def rerank(query: str, docs: List[Doc], model: str | None = None) -> List[Doc]:
+def _chunks(d: Doc, max_tokens: int, max_chunks: int) -> List[str]:
+    """标题 + 正文按模型长度上限切块，只取前 max_chunks 块"""
+    title = (d.title or "").strip()
+    parts = split_text(d.content or "", max_tokens, 0)[:max(1, max_chunks)] or [""]
+    return [f"{title}\n{p}" if title else p for p in parts]
+
+def _post_batch(query: str, texts: List[str], model: str) -> List[float]:
     """Call SiliconFlow rerank adapter (OpenAI-style). Assumes /v1/rerank."""
     s = get_settings()
-    _model = model or s.SF_RERANK_MODEL
     payload = {
-        "model": _model,
+        "model": model,
         "query": query,
-        "documents": [d.content for d in docs],
-        "return_documents": False
+        "documents": texts,
+        "return_documents": False,
     }
     headers = {"Authorization": f"Bearer {s.SF_API_KEY}"}
     url = f"{s.SF_BASE_URL.rstrip('/')}/rerank"
-    with httpx.Client(timeout=60) as client:
-        r = client.post(url, json=payload, headers=headers)
-        r.raise_for_status()
-        data = r.json()
-    # Expect scores aligned to input order or ranked indices
-    scored = data.get("results") or []
-    # results: [{"index": int, "relevance_score": float}, ...]
-    ordered = []
-    for item in sorted(scored, key=lambda x: x.get("relevance_score", 0), reverse=True):
+    deadline = time.monotonic() + s.RERANK_TIMEOUT
+    with trace.span("rerank", kind="http", model=model, documents=len(texts)) as sp:
+        for attempt in attempts("rerank", model, deadline=deadline):
+            with attempt:
+                r = get_http_client(s.SF_BASE_URL).post(url, json=payload, headers=headers,
+                                                        timeout=max(1.0, deadline - time.monotonic()))
+                sp.bytes = len(r.content)
+                r.raise_for_status()
+        if attempt.n:
+            sp.attrs["retries"] = attempt.n
+    # results: [{"index": int, "relevance_score": float}, ...]，index 对应本批次内的顺序
+    out = [0.0] * len(texts)
+    for item in r.json().get("results") or []:
         idx = item.get("index")
-        d = docs[idx]
-        d.score = float(item.get("relevance_score", 0))
+        if isinstance(idx, int) and 0 <= idx < len(texts):
+            out[idx] = float(item.get("relevance_score", 0))
+    return out
+
+def _sf_scores(query: str, texts: List[str], model: str | None = None, batch_size: int | None = None,
+               concurrency: int | None = None) -> List[float]:
+    """分批并发调用 rerank 接口；任一批失败即抛出"""
+    s = get_settings()
+    model = model or s.SF_RERANK_MODEL
+    size = max(1, batch_size or s.RERANK_BATCH)
+    batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+    n = max(1, min(concurrency or s.RERANK_CONCURRENCY, len(batches)))
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="rerank") as pool:
+        futs = [submit(pool, _post_batch, query, b, model) for b in batches]
+        parts = [f.result() for f in futs]
+    return [x for p in parts for x in p]
+
+def _bm25(query: str, texts: List[str]) -> List[float]:
+    scores = bm25_scores(query, texts)
+    top = max(scores) if scores else 0.0
+    return [x / top for x in scores] if top > 0 else [0.0] * len(scores)
+
+def rerank_scores(
+    query: str,
+    texts: Sequence[str],
+    model: str | None = None,
+    backend: str | None = None,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> List[float]:
+    """
+    对 texts 打分（与输入顺序对齐）。backend=sf 时分批并发调用 rerank 接口；
+    未配置 key、接口失败或 backend=bm25 时用本地 BM25（按最高分归一到 0~1）。
+    """
+    s = get_settings()
+    texts = list(texts)
+    if not texts:
+        return []
+    backend = (backend or s.RERANK_BACKEND).lower()
+    if backend == "sf" and s.SF_API_KEY:
+        try:
+            return _sf_scores(query, texts, model, batch_size, concurrency)
+        except Exception as e:
+            print(f"[Rerank] 接口不可用，改用 BM25：{e}")
+    return _bm25(query, texts)
+
+def _doc_chunks(docs: List[Doc]) -> Tuple[List[str], List[int]]:
+    s = get_settings()
+    texts: List[str] = []
+    owner: List[int] = []
+    for i, d in enumerate(docs):
+        for c in _chunks(d, s.RERANK_DOC_TOKENS, s.RERANK_MAX_CHUNKS):
+            texts.append(c)
+            owner.append(i)
+    return texts, owner
+
+def _best(n: int, owner: List[int], chunk_scores: List[float]) -> List[float]:
+    best = [float("-inf")] * n
+    for i, sc in zip(owner, chunk_scores):
+        best[i] = max(best[i], sc)
+    return best
+
+def rerank(
+    query: str,
+    docs: List[Doc],
+    model: str | None = None,
+    top_n: int | None = None,
+    backend: str | None = None,
+    known: Dict[str, float] | None = None,
+) -> List[Doc]:
+    """
+    按得分降序返回（可截取 top_n）；长文档切块打分，取各块最高分作为文档得分。
+    known：已由接口提前算好的文档得分（doc.id -> 分数，见 RerankPrefetch），只对其余文档调用接口；
+    接口失败时全部改用 BM25，与未预打分时结果一致。
+    """
+    if not docs:
+        return []
+    s = get_settings()
+    backend = (backend or s.RERANK_BACKEND).lower()
+    best: List[float] | None = None
+    if known and backend == "sf" and s.SF_API_KEY:
+        todo = [d for d in docs if d.id not in known]
+        texts, owner = _doc_chunks(todo)
+        try:
+            fresh = _best(len(todo), owner, _sf_scores(query, texts, model)) if todo else []
+            scores = dict(known)
+            scores.update({d.id: sc for d, sc in zip(todo, fresh)})
+            best = [scores[d.id] for d in docs]
+        except Exception as e:
+            print(f"[Rerank] 接口不可用，改用 BM25：{e}")
+            backend = "bm25"
+    if best is None:
+        texts, owner = _doc_chunks(docs)
+        best = _best(len(docs), owner, rerank_scores(query, texts, model=model, backend=backend))
+    order = sorted(range(len(docs)), key=lambda i: -best[i])
+    ordered = []
+    for i in order[:top_n] if top_n else order:
+        d = docs[i]
+        d.score = best[i]
         ordered.append(d)
-    return ordered
\ No newline at end of file
+    return ordered
+
+class RerankPrefetch:
+    """
+    检索结果陆续到达时提前调用 rerank 接口给文档打分（仅 sf 后端：接口分数只取决于查询与文本本身，
+    与批次组成无关，所以结果与统一打分一致）。打分按查询分开保存：每批可以对着自己子目标的查询打分，
+    也可以都对着统一的 query；某个查询有一批失败则该查询的预打分作废，由 rerank() 重新打分。
+    """
+
+    def __init__(self, model: str | None = None, concurrency: int | None = None):
+        s = get_settings()
+        # add() 不指定查询时使用的统一查询
+        self.query: str | None = None
+        self.model = model
+        self.pool = ThreadPoolExecutor(max_workers=max(1, concurrency or s.RERANK_CONCURRENCY),
+                                       thread_name_prefix="rerank-prefetch")
+        self.futs: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled() -> bool:
+        s = get_settings()
+        return s.RERANK_BACKEND.lower() == "sf" and bool(s.SF_API_KEY)
+
+    def add(self, docs: List[Doc], query: str | None = None) -> None:
+        query = query or self.query
+        if not docs or query is None:
+            return
+        with self._lock:
+            self.futs.setdefault(query, []).append(submit(self.pool, self._score, query, list(docs)))
+
+    def _score(self, query: str, docs: List[Doc]) -> Dict[str, float]:
+        texts, owner = _doc_chunks(docs)
+        best = _best(len(docs), owner, _sf_scores(query, texts, self.model))
+        return {d.id: sc for d, sc in zip(docs, best)}
+
+    def result(self, query: str) -> Dict[str, float] | None:
+        """等待该查询已提交的打分；没有预打分或有失败时返回 None"""
+        with self._lock:
+            futs = list(self.futs.get(query, ()))
+        if not futs:
+            return None
+        out: Dict[str, float] = {}
+        try:
+            for f in futs:
+                out.update(f.result())
+        except Exception as e:
+            print(f"[Rerank] 预打分失败，稍后统一打分：{e}")
+            return None
+        return out
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
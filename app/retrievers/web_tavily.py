@@ -1,17 +1,72 @@
-from typing import List
-from tavily import TavilyClient
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List
 from app.schema import Doc
 from app.config import get_settings
+from app.llm.clients import get_requests_session
+from app.llm.ratelimit import attempts
+from app import trace
+from app.storage.fs_store import KVStore, get_kv_store
+
+def _norm_query(q: str) -> str:
+    """全半角统一、大小写折叠、空白合并，让近似相同的查询命中同一缓存项"""
+    return " ".join(unicodedata.normalize("NFKC", q or "").casefold().split())
+
+def _search_cache() -> KVStore:
+    s = get_settings()
+    return get_kv_store("search", ttl=s.SEARCH_CACHE_TTL, max_entries=s.SEARCH_CACHE_MAX_ENTRIES,
+                        max_bytes=s.SEARCH_CACHE_MAX_BYTES)
+
+def search_cache_stats() -> Dict[str, float]:
+    return _search_cache().stats()
 
 class WebRetriever:
-    def __init__(self):
+    def __init__(self, use_cache: bool | None = None):
         s = get_settings()
         if not s.TAVILY_API_KEY:
             raise RuntimeError("TAVILY_API_KEY missing")
-        self.client = TavilyClient(api_key=s.TAVILY_API_KEY)
+        from tavily import TavilyClient
+        extra = {"api_base_url": s.TAVILY_BASE_URL} if s.TAVILY_BASE_URL else {}
+        try:
+            # 共享 requests.Session：各次检索复用 keep-alive 连接
+            self.client = TavilyClient(api_key=s.TAVILY_API_KEY, session=get_requests_session("tavily"), **extra)
+        except TypeError:
+            # 旧版 SDK 不支持传入 session
+            self.client = TavilyClient(api_key=s.TAVILY_API_KEY, **extra)
+        self.cache = _search_cache() if (s.SEARCH_CACHE if use_cache is None else use_cache) else None
+
+    def search(self, query: str, k: int = 8, timeout: float = 60) -> List[Doc]:
+        with trace.span("tavily", kind="retrieve", query=query, k=k) as sp:
+            docs = self._search(query, k, timeout, sp)
+            sp.attrs["docs"] = len(docs)
+            return docs
 
-    def search(self, query: str, k: int = 8) -> List[Doc]:
-        res = self.client.search(query=query, max_results=k, include_raw_content=True, include_answer=False)
+    def _search(self, query: str, k: int, timeout: float, sp: trace.Span) -> List[Doc]:
+        opts: Dict[str, Any] = {"include_raw_content": True, "include_answer": False}
+        key = None
+        if self.cache is not None:
+            raw = json.dumps([_norm_query(query), k, opts], ensure_ascii=False, sort_keys=True)
+            key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+            hit = self.cache.get(key)
+            if hit is not None:
+                sp.attrs["cached"] = True
+                # 每次返回新的 Doc（新 id），避免多个工作区共享同一对象
+                return [Doc(**d) for d in json.loads(hit)]
+
+        # 限流排队 + 可重试错误退避重试，整体不超过 timeout
+        deadline = time.monotonic() + timeout
+        for attempt in attempts("tavily", deadline=deadline):
+            with attempt:
+                res = self.client.search(query=query, max_results=k,
+                                         timeout=max(1.0, deadline - time.monotonic()), **opts)
+        if attempt.queue_ms >= 1:
+            sp.attrs["queue_ms"] = round(attempt.queue_ms, 1)
+        if attempt.n:
+            sp.attrs["retries"] = attempt.n
+        sp.bytes = len(json.dumps(res, ensure_ascii=False).encode("utf-8"))
         docs: List[Doc] = []
         for i, item in enumerate(res.get("results", [])):
             content = item.get("raw_content") or item.get("content") or ""
@@ -22,4 +77,18 @@ class WebRetriever:
                 source="tavily",
                 meta={"score": item.get("score"), "position": i}
             ))
-        return docs
\ No newline at end of file
+        if key and docs:
+            self.cache.set(key, json.dumps([d.model_dump(mode="json", exclude={"id"}) for d in docs],
+                                           ensure_ascii=False))
+        return docs
+
+_WEB: WebRetriever | None = None
+_WEB_LOCK = threading.Lock()
+
+def get_web_retriever() -> WebRetriever:
+    """进程内共享一个 WebRetriever（无 TAVILY_API_KEY 时抛 RuntimeError）"""
+    global _WEB
+    with _WEB_LOCK:
+        if _WEB is None:
+            _WEB = WebRetriever()
+        return _WEB
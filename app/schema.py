@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from pydantic import BaseModel, Field, PrivateAttr, SerializationInfo, model_serializer
+from typing import Any, Optional, List, Dict
 from datetime import datetime
 import uuid
 
@@ -15,6 +15,37 @@ class Doc(BaseModel):
     source: Optional[str] = None
     meta: Dict = Field(default_factory=dict)
 
+    # 惰性 content：只持有 blob 引用，首次访问 .content 时才从 BlobStore 读取
+    _content_ref: Optional[str] = PrivateAttr(default=None)
+
+    @classmethod
+    def lazy(cls, content_ref: str, **fields) -> "Doc":
+        d = cls.model_construct(**fields)
+        d._content_ref = content_ref
+        return d
+
+    @property
+    def content_loaded(self) -> bool:
+        return "content" in self.__dict__
+
+    def __getattr__(self, name):
+        if name == "content":
+            ref = (self.__pydantic_private__ or {}).get("_content_ref")
+            if ref is not None:
+                from app.storage.fs_store import get_blob_store
+                text = get_blob_store().get(ref)
+                self.__dict__["content"] = text
+                return text
+        return super().__getattr__(name)
+
+    @model_serializer(mode="wrap")
+    def _load_before_dump(self, handler, info: SerializationInfo):
+        # 序列化前补齐惰性 content（显式排除 content 时不读取）
+        excluded = info.exclude is not None and "content" in info.exclude
+        if not excluded and not self.content_loaded:
+            self.content
+        return handler(self)
+
 class SubGoal(BaseModel):
     id: str = Field(default_factory=lambda: _id("sub"))
     query: str
@@ -26,6 +57,10 @@ class Workspace(BaseModel):
     goal: Optional[str] = None
     docs: List[Doc] = Field(default_factory=list)
     sub_goals: List[SubGoal] = Field(default_factory=list)
+    # 运行追踪：各阶段 / LLM / 检索调用的 span（见 app/trace.py）
+    trace: List[Dict[str, Any]] = Field(default_factory=list)
+    # 断点：已完成的阶段及恢复所需的少量状态（见 main_loop.continue_after_answers(resume=True)）
+    checkpoint: Dict[str, Any] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
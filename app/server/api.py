@@ -0,0 +1,202 @@
+# app/server/api.py
+import asyncio
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from app.config import get_settings
+from app.events import Cancelled, bind
+from app.trace import render_prometheus
+from app.llm.ratelimit import render_prometheus as rate_prometheus
+from app.pipelines.main_loop import continue_after_answers, start_intake
+from app.schema import Workspace
+from app.workspace import load_ws
+
+app = FastAPI(title="SearchAgent")
+
+class IntakeRequest(BaseModel):
+    query: str
+
+class BudgetRequest(BaseModel):
+    """本次研究的预算（见 app/pipelines/budget.py），缺省字段用 Settings"""
+    model_config = ConfigDict(extra="forbid")
+    max_rounds: Optional[int] = None
+    time_s: Optional[float] = None
+    tokens: Optional[int] = None
+    searches: Optional[int] = None
+
+class AnswersRequest(BaseModel):
+    answers: str
+    budget: Optional[BudgetRequest] = None
+
+class _Gate:
+    """并发上限 + 排队上限：运行中的会话不超过 limit，排队的超过 max_queue 时直接拒绝（503）"""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = max(1, limit)
+        self.sem = asyncio.Semaphore(self.limit)
+        self.max_queue = max(0, max_queue)
+        self.waiting = 0
+        self.running = 0
+
+    def admit(self) -> bool:
+        """在请求入口同步占一个排队位；满了返回 False"""
+        if self.running + self.waiting >= self.limit + self.max_queue:
+            return False
+        self.waiting += 1
+        return True
+
+    async def __aenter__(self):
+        # 排队位已在 admit() 中占用，拿到名额后释放
+        try:
+            await self.sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self.sem.release()
+
+_GATE: _Gate | None = None
+_POOL: ThreadPoolExecutor | None = None
+_END = object()
+_TASKS: set = set()
+
+def _gate() -> _Gate:
+    global _GATE, _POOL
+    if _GATE is None:
+        s = get_settings()
+        _GATE = _Gate(s.API_MAX_CONCURRENT, s.API_MAX_QUEUE)
+        # 流水线是同步代码，放进专用线程池；线程数与并发上限一致
+        _POOL = ThreadPoolExecutor(max_workers=max(1, s.API_MAX_CONCURRENT), thread_name_prefix="session")
+    return _GATE
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def _sources(ws: Workspace) -> List[Dict[str, Any]]:
+    return [{"title": d.title, "url": d.url} for d in ws.docs if d.url]
+
+def _stream(request: Request, fn: Callable, *args: Any) -> StreamingResponse:
+    """
+    在线程池里运行一次流水线调用，把 stage / token 等事件以 SSE 推给客户端。
+    客户端断开时置取消标记，流水线在下一个 token 或阶段边界退出。
+    """
+    gate = _gate()
+    if not gate.admit():
+        raise HTTPException(status_code=503, detail="server busy", headers={"Retry-After": "5"})
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel = threading.Event()
+
+    def sink(event: str, data: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    async def worker() -> None:
+        try:
+            if gate.sem.locked():
+                sink("status", {"state": "queued", "waiting": gate.waiting})
+            async with gate:
+                if cancel.is_set():
+                    return
+                sink("status", {"state": "running"})
+                with bind(sink, cancel):
+                    ctx = contextvars.copy_context()
+                result = await loop.run_in_executor(_POOL, ctx.run, fn, *args)
+                for event, data in result:
+                    sink(event, data)
+        except Cancelled:
+            sink("cancelled", {})
+        except FileNotFoundError as e:
+            sink("error", {"message": f"workspace not found: {e}"})
+        except Exception as e:
+            sink("error", {"message": f"{e.__class__.__name__}: {e}"})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    # 事件循环只弱引用任务，这里保存引用直到结束
+    task = asyncio.create_task(worker())
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+
+    async def gen():
+        heartbeat = get_settings().API_HEARTBEAT
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if item is _END:
+                    break
+                yield _sse(*item)
+        finally:
+            # 正常结束时无副作用；客户端断开时通知流水线停止（线程退出后 worker 才释放并发名额）
+            cancel.set()
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _run_intake(query: str):
+    ws, qs = start_intake(query)
+    return [("questions", {"ws_id": ws.id, "questions": qs}), ("done", {"ws_id": ws.id})]
+
+def _run_answers(ws_id: str, answers: str, budget: Dict[str, Any] | None = None):
+    ws = load_ws(ws_id)
+    ws, answer = continue_after_answers(ws, answers, budget=budget)
+    return [("answer", {"ws_id": ws.id, "answer": answer, "sources": _sources(ws)}), ("done", {"ws_id": ws.id})]
+
+@app.post("/intake")
+async def intake(req: IntakeRequest, request: Request):
+    """阶段 1：创建工作区并流式返回澄清问题"""
+    return _stream(request, _run_intake, req.query)
+
+@app.post("/sessions/{ws_id}/answers")
+async def answers(ws_id: str, req: AnswersRequest, request: Request):
+    """阶段 2：带澄清回答继续，流式返回各阶段进度、思考与回答 token"""
+    budget = req.budget.model_dump(exclude_none=True) if req.budget else None
+    return _stream(request, _run_answers, ws_id, req.answers, budget)
+
+@app.get("/sessions/{ws_id}")
+async def session(ws_id: str):
+    try:
+        # 只读展示：紧凑表示，不构造 pydantic Doc、不读正文
+        ws = await asyncio.to_thread(load_ws, ws_id, "compact")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="workspace not found")
+    return {
+        "id": ws.id,
+        "question": ws.question,
+        "goal": ws.goal,
+        "sub_goals": [{"id": i, "query": q, "status": st} for i, q, st in ws.sub_goals],
+        "sources": [{"title": t, "url": u} for t, u in zip(ws.docs.titles, ws.docs.urls) if u],
+        "trace": ws.trace,
+        "updated_at": ws.updated_at,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 文本格式：各 span 的耗时直方图、首 token、token 数、字节数、费用；调用调度的限流 / 重试 / 排队"""
+    gate = _gate()
+    extra = (
+        "# TYPE searchagent_sessions_running gauge\n"
+        f"searchagent_sessions_running {gate.running}\n"
+        "# TYPE searchagent_sessions_waiting gauge\n"
+        f"searchagent_sessions_waiting {gate.waiting}\n"
+    )
+    return PlainTextResponse(render_prometheus() + extra + rate_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+async def healthz():
+    gate = _gate()
+    return {"ok": True, "running": gate.running, "waiting": gate.waiting}
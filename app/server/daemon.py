@@ -0,0 +1,190 @@
+# app/server/daemon.py
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+from app.config import get_settings
+
+# 常驻进程：启动时导入流水线、建好 LLM / 检索连接池、打开本地索引与缓存，
+# 之后通过 Unix socket 接收薄客户端（scripts/ask.py）的任务，省去每次命令行启动的导入与建连开销。
+# 协议：每个连接一个请求，一行 JSON；响应为逐行事件 {"event": ..., "data": {...}}，
+# 以 done / error / cancelled 结束。
+#   {"op": "intake", "query": "..."}                        -> stage / token / question / questions / done
+#   {"op": "answers", "ws_id": "...", "answers": "...", "budget": {...}} -> stage / retrieve / round / token / answer / done
+#   {"op": "ping"} / {"op": "stats"}                        -> pong / stats
+
+def socket_path() -> str:
+    s = get_settings()
+    return s.DAEMON_SOCKET or os.path.join(s.DATA_DIR, "daemon.sock")
+
+# ---------------- 服务端 ----------------
+
+_STATE: Dict[str, Any] = {"started": 0.0, "warm_ms": {}, "jobs": 0, "running": 0, "errors": 0}
+_STATE_LOCK = threading.Lock()
+_SEM: threading.BoundedSemaphore | None = None
+
+def warm_up() -> Dict[str, float]:
+    """预热：导入流水线、创建共享客户端、打开本地索引与缓存、加载分词器；返回各步耗时（毫秒）"""
+    s = get_settings()
+    steps: Dict[str, float] = {}
+
+    def timed(name: str, fn) -> None:
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"[Daemon] 预热 {name} 失败：{e}")
+        steps[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _imports() -> None:
+        import app.pipelines.main_loop  # noqa: F401
+        import langchain_core.prompts  # noqa: F401
+
+    def _llm() -> None:
+        from app.llm.chat_sf import get_chat
+        get_chat()
+
+    def _web() -> None:
+        from app.retrievers.web_tavily import get_web_retriever
+        get_web_retriever()
+
+    def _local() -> None:
+        from app.retrievers.local_vector import get_local_retriever
+        get_local_retriever()
+
+    def _caches() -> None:
+        from app.llm.cache import cache_stats
+        from app.retrievers.web_tavily import search_cache_stats
+        cache_stats()
+        search_cache_stats()
+
+    def _tokens() -> None:
+        from app.tools.tokens import count_tokens
+        count_tokens("warm up")
+
+    timed("imports", _imports)
+    timed("llm", _llm)
+    if s.TAVILY_API_KEY:
+        timed("web", _web)
+    if s.LOCAL_INDEX:
+        timed("local_index", _local)
+    timed("caches", _caches)
+    timed("tokenizer", _tokens)
+    return steps
+
+def _run(op: str, req: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    from app.pipelines.main_loop import continue_after_answers, start_intake
+    from app.workspace import load_ws
+    if op == "intake":
+        ws, qs = start_intake(req["query"])
+        return [("questions", {"ws_id": ws.id, "questions": qs})]
+    ws = load_ws(req["ws_id"])
+    ws, answer = continue_after_answers(ws, req.get("answers") or "", budget=req.get("budget"))
+    return [("answer", {"ws_id": ws.id, "answer": answer,
+                        "sources": [{"title": d.title, "url": d.url} for d in ws.docs if d.url]})]
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _send(self, event: str, data: Dict[str, Any]) -> None:
+        line = json.dumps({"event": event, "data": data}, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.wfile.write(line.encode("utf-8"))
+            self.wfile.flush()
+
+    def handle(self) -> None:
+        from app.events import Cancelled, bind
+        self._lock = threading.Lock()
+        try:
+            req = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            return self._send("error", {"message": "bad request"})
+        op = req.get("op")
+        if op == "ping":
+            return self._send("pong", {"pid": os.getpid(), "uptime_s": round(time.time() - _STATE["started"], 1)})
+        if op == "stats":
+            from app.llm.ratelimit import rate_stats
+            with _STATE_LOCK:
+                state = dict(_STATE, pid=os.getpid())
+            return self._send("stats", dict(state, rate=rate_stats()))
+        if op not in ("intake", "answers"):
+            return self._send("error", {"message": f"unknown op: {op}"})
+
+        cancel = threading.Event()
+
+        def sink(event: str, data: Dict[str, Any]) -> None:
+            try:
+                self._send(event, data)
+            except OSError:
+                # 客户端已断开：通知流水线在下一个检查点退出
+                cancel.set()
+
+        with _SEM:
+            with _STATE_LOCK:
+                _STATE["jobs"] += 1
+                _STATE["running"] += 1
+            try:
+                with bind(sink, cancel):
+                    for event, data in _run(op, req):
+                        sink(event, data)
+                sink("done", {})
+            except Cancelled:
+                sink("cancelled", {})
+            except Exception as e:
+                with _STATE_LOCK:
+                    _STATE["errors"] += 1
+                sink("error", {"message": f"{e.__class__.__name__}: {e}"})
+            finally:
+                with _STATE_LOCK:
+                    _STATE["running"] -= 1
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+def serve(path: str | None = None) -> None:
+    """预热后在 Unix socket 上阻塞服务；同时运行的任务数受 API_MAX_CONCURRENT 限制"""
+    global _SEM
+    s = get_settings()
+    path = path or socket_path()
+    if os.path.exists(path):
+        if _alive(path):
+            raise RuntimeError(f"daemon already running on {path}")
+        os.unlink(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    _SEM = threading.BoundedSemaphore(max(1, s.API_MAX_CONCURRENT))
+    t0 = time.perf_counter()
+    _STATE["warm_ms"] = warm_up()
+    _STATE["started"] = time.time()
+    print(f"[Daemon] 预热完成 {(time.perf_counter() - t0) * 1000:.0f}ms {_STATE['warm_ms']}")
+    server = _Server(path, _Handler)
+    print(f"[Daemon] 监听 {path}（pid {os.getpid()}）", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+# ---------------- 客户端（只用标准库，不导入流水线） ----------------
+
+def _alive(path: str) -> bool:
+    try:
+        return any(ev == "pong" for ev, _ in request({"op": "ping"}, path=path, timeout=2))
+    except OSError:
+        return False
+
+def request(payload: Dict[str, Any], path: str | None = None,
+            timeout: float | None = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """发一个请求，逐个产出 (event, data)；守护进程未启动时抛 OSError"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path or socket_path())
+        sock.sendall((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as f:
+            for line in f:
+                msg = json.loads(line)
+                yield msg.get("event"), msg.get("data") or {}
+    finally:
+        sock.close()
@@ -0,0 +1,379 @@
+# app/storage/fs_store.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+from app.config import get_settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns       TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    value    TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS kv_lru ON kv (ns, accessed);
+"""
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class KVStore:
+    """
+    SQLite 实现的本地 KV 存储（值为文本）。
+    - ttl：条目最大存活秒数，过期视为未命中并删除
+    - max_entries / max_bytes：超出后按最近访问时间（LRU）淘汰
+    - 每个线程独立连接；多进程通过 SQLite 文件锁 + WAL 共享同一文件
+    - stats()：本进程内的命中/未命中/写入/淘汰计数 + 当前条数与字节数
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "default",
+        ttl: float | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+    ):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ns = namespace
+        self.ttl = ttl or None
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM kv WHERE ns=? AND key=?", (self.ns, key)).fetchone()
+        now = time.time()
+        if row is None:
+            self._count("misses")
+            return None
+        value, created = row
+        if self.ttl and now - created > self.ttl:
+            conn.execute("DELETE FROM kv WHERE ns=? AND key=?", (self.ns, key))
+            self._count("expired")
+            self._count("misses")
+            return None
+        conn.execute("UPDATE kv SET accessed=? WHERE ns=? AND key=?", (now, self.ns, key))
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        conn = self._conn()
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.ns, key, value, size, now, now),
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """在当前事务内按 LRU 淘汰超出上限的条目，返回淘汰条数"""
+        if not (self.max_entries or self.max_bytes):
+            return 0
+        n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM kv WHERE ns=?", (self.ns,)).fetchone()
+        drop = max(0, n - self.max_entries) if self.max_entries else 0
+        if self.max_bytes and total > self.max_bytes:
+            excess, k = total - self.max_bytes, 0
+            for (size,) in conn.execute("SELECT size FROM kv WHERE ns=? ORDER BY accessed ASC", (self.ns,)):
+                k += 1
+                excess -= size
+                if excess <= 0:
+                    break
+            drop = max(drop, k)
+        if drop:
+            conn.execute(
+                "DELETE FROM kv WHERE ns=? AND key IN (SELECT key FROM kv WHERE ns=? ORDER BY accessed ASC LIMIT ?)",
+                (self.ns, self.ns, drop),
+            )
+        return drop
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE ns=? AND key=?", (self.ns, key))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM kv WHERE ns=?", (self.ns,))
+
+    def purge_expired(self) -> int:
+        if not self.ttl:
+            return 0
+        cur = self._conn().execute("DELETE FROM kv WHERE ns=? AND created < ?", (self.ns, time.time() - self.ttl))
+        self._count("expired", cur.rowcount)
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        n, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM kv WHERE ns=?", (self.ns,)
+        ).fetchone()
+        with self._lock:
+            out = dict(self._counts)
+        lookups = out["hits"] + out["misses"]
+        out.update(entries=n, bytes=total, hit_rate=(out["hits"] / lookups) if lookups else 0.0)
+        return out
+
+_STORES: Dict[str, KVStore] = {}
+_STORES_LOCK = threading.RLock()
+
+def get_kv_store(
+    namespace: str,
+    ttl: float | None = None,
+    max_entries: int | None = None,
+    max_bytes: int | None = None,
+) -> KVStore:
+    """进程内按命名空间复用 KVStore；所有命名空间共用 DATA_DIR/cache.sqlite3"""
+    with _STORES_LOCK:
+        st = _STORES.get(namespace)
+        if st is None:
+            path = os.path.join(get_settings().DATA_DIR, "cache.sqlite3")
+            st = _STORES[namespace] = KVStore(path, namespace, ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+        return st
+
+class BlobStore:
+    """
+    内容寻址的文本块存储：DATA_DIR/blobs/ab/<sha256>，zlib 压缩。
+    相同内容只存一份，被所有工作区共享；写入走临时文件 + 原子改名。
+    """
+
+    def __init__(self, root: str, level: int = 6):
+        self.root = root
+        self.level = level
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def ref_of(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], ref)
+
+    def has(self, ref: str) -> bool:
+        return os.path.exists(self._path(ref))
+
+    def put(self, text: str) -> str:
+        ref = self.ref_of(text)
+        p = self._path(ref)
+        if not os.path.exists(p):
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(text.encode("utf-8"), self.level))
+            os.replace(tmp, p)
+        return ref
+
+    def get(self, ref: str) -> str:
+        with open(self._path(ref), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+_BLOBS: BlobStore | None = None
+
+def get_blob_store() -> BlobStore:
+    global _BLOBS
+    with _STORES_LOCK:
+        if _BLOBS is None:
+            _BLOBS = BlobStore(os.path.join(get_settings().DATA_DIR, "blobs"))
+        return _BLOBS
+
+_WS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    id         TEXT PRIMARY KEY,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ws_rows (
+    ws_id TEXT NOT NULL,
+    kind  TEXT NOT NULL,
+    id    TEXT NOT NULL,
+    pos   INTEGER NOT NULL,
+    sig   TEXT NOT NULL,
+    data  TEXT NOT NULL,
+    ref   TEXT,
+    PRIMARY KEY (ws_id, kind, id)
+);
+"""
+
+class WorkspaceStore:
+    """
+    Workspace 的增量存储（SQLite）：表头字段一行，docs / sub_goals 每条一行。
+    save() 只写发生变化的行（按序列化内容签名比较），删除已移除的行，
+    整个保存在一个事务里完成，中途崩溃不会留下半个文件。
+    Doc.content 不进数据库，只存 BlobStore 引用；load_dict 返回的 doc 行带 "_content_ref"，
+    由调用方决定是否惰性加载。
+    """
+    _LIST_FIELDS = {"docs": "doc", "sub_goals": "sub"}
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (ws_id, kind) -> {row_id: (pos, sig)}，省去每次保存前回读签名
+        self._sigs: Dict[tuple, Dict[str, tuple]] = {}
+        self.blobs = get_blob_store()
+        conn = self._conn()
+        conn.executescript(_WS_SCHEMA)
+        if "ref" not in {r[1] for r in conn.execute("PRAGMA table_info(ws_rows)")}:
+            conn.execute("ALTER TABLE ws_rows ADD COLUMN ref TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _known(self, conn: sqlite3.Connection, ws_id: str, kind: str) -> Dict[str, tuple]:
+        with self._lock:
+            known = self._sigs.get((ws_id, kind))
+        if known is None:
+            rows = conn.execute("SELECT id, pos, sig FROM ws_rows WHERE ws_id=? AND kind=?", (ws_id, kind))
+            known = {rid: (pos, sig) for rid, pos, sig in rows}
+        return known
+
+    def save(self, ws) -> int:
+        """写入增量，返回实际写入/删除的行数"""
+        conn = self._conn()
+        header = ws.model_dump_json(exclude=set(self._LIST_FIELDS))
+        written = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO workspaces (id, data, updated_at) VALUES (?, ?, ?)",
+                (ws.id, header, time.time()),
+            )
+            fresh: Dict[str, Dict[str, tuple]] = {}
+            for field, kind in self._LIST_FIELDS.items():
+                known = self._known(conn, ws.id, kind)
+                now: Dict[str, tuple] = {}
+                for pos, item in enumerate(getattr(ws, field)):
+                    ref = None
+                    if kind == "doc":
+                        data, ref = self._doc_row(item)
+                    else:
+                        data = item.model_dump_json()
+                    sig = hashlib.blake2b(f"{data}\0{ref}".encode("utf-8"), digest_size=16).hexdigest()
+                    now[item.id] = (pos, sig)
+                    old = known.get(item.id)
+                    if old is None or old[1] != sig:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO ws_rows (ws_id, kind, id, pos, sig, data, ref) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (ws.id, kind, item.id, pos, sig, data, ref),
+                        )
+                        written += 1
+                    elif old[0] != pos:
+                        conn.execute("UPDATE ws_rows SET pos=? WHERE ws_id=? AND kind=? AND id=?",
+                                     (pos, ws.id, kind, item.id))
+                        written += 1
+                gone = [rid for rid in known if rid not in now]
+                for rid in gone:
+                    conn.execute("DELETE FROM ws_rows WHERE ws_id=? AND kind=? AND id=?", (ws.id, kind, rid))
+                written += len(gone)
+                fresh[kind] = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                for kind in self._LIST_FIELDS.values():
+                    self._sigs.pop((ws.id, kind), None)
+            raise
+        with self._lock:
+            for kind, now in fresh.items():
+                self._sigs.pop((ws.id, kind), None)
+                self._sigs[(ws.id, kind)] = now
+            while len(self._sigs) > 1024:  # 长驻进程里只保留最近保存过的工作区签名
+                self._sigs.pop(next(iter(self._sigs)))
+        return written
+
+    def _doc_row(self, d) -> tuple:
+        """(不含 content 的 JSON, content 引用)；未加载的惰性 Doc 直接复用原引用，不触发读取"""
+        if "content" in d.__dict__:
+            ref = self.blobs.put(d.content or "")
+        else:
+            ref = d._content_ref
+        return d.model_dump_json(exclude={"content"}), ref
+
+    def exists(self, ws_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM workspaces WHERE id=?", (ws_id,)).fetchone() is not None
+
+    def load_dict(self, ws_id: str, with_lists: bool = True) -> Dict:
+        """读出与 Workspace JSON 同结构的 dict；with_lists=False 只读表头"""
+        conn = self._conn()
+        row = conn.execute("SELECT data FROM workspaces WHERE id=?", (ws_id,)).fetchone()
+        if row is None:
+            raise KeyError(ws_id)
+        data = json.loads(row[0])
+        if with_lists:
+            for field, kind in self._LIST_FIELDS.items():
+                rows = conn.execute(
+                    "SELECT data, ref FROM ws_rows WHERE ws_id=? AND kind=? ORDER BY pos", (ws_id, kind)
+                )
+                items = []
+                for raw, ref in rows:
+                    item = json.loads(raw)
+                    if ref is not None:
+                        item["_content_ref"] = ref
+                    items.append(item)
+                data[field] = items
+        return data
+
+    def counts(self, ws_id: str) -> Dict[str, int]:
+        """各列表字段的条数（不读行内容）"""
+        rows = self._conn().execute("SELECT kind, COUNT(*) FROM ws_rows WHERE ws_id=? GROUP BY kind", (ws_id,))
+        n = dict(rows.fetchall())
+        return {field: n.get(kind, 0) for field, kind in self._LIST_FIELDS.items()}
+
+    def delete(self, ws_id: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM ws_rows WHERE ws_id=?", (ws_id,))
+        conn.execute("DELETE FROM workspaces WHERE id=?", (ws_id,))
+        conn.execute("COMMIT")
+        with self._lock:
+            for kind in self._LIST_FIELDS.values():
+                self._sigs.pop((ws_id, kind), None)
+
+    def list_ids(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT id FROM workspaces ORDER BY updated_at DESC")]
+
+_WS_STORE: WorkspaceStore | None = None
+
+def get_ws_store() -> WorkspaceStore:
+    global _WS_STORE
+    with _STORES_LOCK:
+        if _WS_STORE is None:
+            _WS_STORE = WorkspaceStore(os.path.join(get_settings().DATA_DIR, "workspaces.sqlite3"))
+        return _WS_STORE
@@ -0,0 +1,250 @@
+# app/storage/semantic_cache.py
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.config import get_settings
+from app.schema import Doc
+from app.storage.fs_store import _connect, get_blob_store
+from app.storage.vectorstore import get_embedder
+
+# 语义查询缓存：按 Workspace.goal / SubGoal.query 的嵌入向量查找以前做过的研究，
+# 相似度不低于阈值即复用当时筛选、清洗好的文档，省去检索与清洗。
+# - 只在语义嵌入器（EMBED_BACKEND=local 离线小模型 / sf）下启用：特征哈希对“2023 / 2024”“方面1 / 方面4”这类只差一个词的查询
+#   相似度也很高，同义改写反而匹配不上；
+# - 相似度过阈值之外，查询里的数字 / 年份与专名（英文专名、缩写、引号与书名号里的内容）必须完全一致才复用；
+# - 超过 max_age 的条目视为过期（命中时删除）；条数超过 max_entries 按最近访问时间淘汰；
+# - 文档正文存在 BlobStore（内容寻址，与工作区共用一份），表里只存引用；
+# - 多进程共用 DATA_DIR/cache.sqlite3，其它进程新写入的条目在下次查找时补入内存索引。
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS semantic (
+    id       TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    query    TEXT NOT NULL,
+    embedder TEXT NOT NULL,
+    vec      BLOB NOT NULL,
+    data     TEXT NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS semantic_lru ON semantic (accessed);
+"""
+
+_NUM = re.compile(r"\d+(?:[.,]\d+)*")
+_QUOTED = re.compile(r"[\"“”'‘’「」『』《》]([^\"“”'‘’「」『』《》]{1,40})[\"“”'‘’「」『』《》]")
+# 含大写字母或数字的英文词（OpenAI / GPT-4 / RLHF / iPhone15）视为专名
+_NAME = re.compile(r"[A-Za-z][A-Za-z0-9.+\-_]*")
+
+def anchors(text: str) -> frozenset:
+    """查询里必须完全一致的部分：数字 / 年份、专名、引号与书名号里的内容（小写）"""
+    text = text or ""
+    out = {n.replace(",", "") for n in _NUM.findall(text)}
+    out.update(w.lower() for w in _NAME.findall(text) if any(c.isupper() or c.isdigit() for c in w))
+    out.update(q.strip().lower() for q in _QUOTED.findall(text))
+    return frozenset(out)
+
+class SemanticCache:
+    def __init__(self, path: str, embedder=None, threshold: float = 0.9, max_age: float | None = None,
+                 max_entries: int | None = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.embedder = embedder or get_embedder()
+        self.tag = f"{self.embedder.name}:{getattr(self.embedder, 'model', '')}:{self.embedder.dim}"
+        self.threshold = threshold
+        self.max_age = max_age or None
+        self.max_entries = max_entries or None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # kind -> (ids, 向量矩阵, 创建时间)；按 rowid 增量补入
+        self._ids: Dict[str, List[str]] = {}
+        self._vecs: Dict[str, np.ndarray] = {}
+        self._created: Dict[str, List[float]] = {}
+        self._rowid = 0
+        self._counts = {"hits": 0, "misses": 0, "puts": 0, "expired": 0, "evictions": 0}
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    # ---------------- 内存索引 ----------------
+    def _refresh(self) -> None:
+        """补入 rowid 大于上次位置的条目（本进程与其它进程新写入的）"""
+        rows = self._conn().execute(
+            "SELECT rowid, id, kind, vec, created FROM semantic WHERE rowid > ? AND embedder = ? ORDER BY rowid",
+            (self._rowid, self.tag),
+        ).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            add: Dict[str, List] = {}
+            for rowid, eid, kind, vec, created in rows:
+                self._rowid = max(self._rowid, rowid)
+                add.setdefault(kind, []).append((eid, np.frombuffer(vec, dtype=np.float32), created))
+            for kind, items in add.items():
+                mat = np.stack([v for _, v, _ in items])
+                old = self._vecs.get(kind)
+                self._vecs[kind] = mat if old is None else np.vstack([old, mat])
+                self._ids.setdefault(kind, []).extend(eid for eid, _, _ in items)
+                self._created.setdefault(kind, []).extend(c for _, _, c in items)
+
+    def _forget(self, kind: str, eid: str) -> None:
+        with self._lock:
+            ids = self._ids.get(kind) or []
+            if eid in ids:
+                i = ids.index(eid)
+                ids.pop(i)
+                self._created[kind].pop(i)
+                self._vecs[kind] = np.delete(self._vecs[kind], i, axis=0)
+
+    def _embed(self, text: str) -> np.ndarray:
+        v = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    # ---------------- 查找 / 写入 ----------------
+    def lookup(self, kind: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        返回最相似且未过期、锚点（数字 / 专名，见 anchors）一致的条目 {id, query, score, age_s, docs: [Doc], data}；
+        没有则返回 None。
+        返回的 Doc 是新对象（新 id，content 惰性读取），可直接放进工作区。
+        """
+        if not (text or "").strip():
+            return None
+        self._refresh()
+        q = self._embed(text)
+        now = time.time()
+        with self._lock:
+            mat = self._vecs.get(kind)
+            cands = []
+            if mat is not None and len(mat):
+                sims = mat @ q
+                for i in np.argsort(-sims)[:8]:
+                    if sims[i] < self.threshold:
+                        break
+                    if self.max_age and now - self._created[kind][i] > self.max_age:
+                        continue
+                    cands.append((self._ids[kind][i], float(sims[i])))
+        conn = self._conn()
+        want = anchors(text)
+        hit = None
+        for eid, score in cands:
+            row = conn.execute("SELECT query, data, created FROM semantic WHERE id=?", (eid,)).fetchone()
+            if row is None:
+                # 已被其它进程淘汰
+                self._forget(kind, eid)
+            elif anchors(row[0]) == want:
+                hit = (eid, score, row)
+                break
+        if hit is None:
+            self._count("misses")
+            self._expire()
+            return None
+        eid, score, row = hit
+        conn.execute("UPDATE semantic SET accessed=? WHERE id=?", (now, eid))
+        self._count("hits")
+        query, raw, created = row
+        data = json.loads(raw)
+        docs = [Doc.lazy(d.pop("_content_ref"), **d) for d in data.pop("docs", [])]
+        for d in docs:
+            d.id = f"doc_{uuid.uuid4().hex[:8]}"
+            d.meta = dict(d.meta or {}, reused_from=eid)
+        return {"id": eid, "query": query, "score": round(score, 4), "age_s": round(now - created, 1),
+                "docs": docs, "data": data}
+
+    def put(self, kind: str, text: str, docs: List[Doc], **data: Any) -> Optional[str]:
+        """写入一条（正文进 BlobStore）；返回条目 id"""
+        if not (text or "").strip() or not docs:
+            return None
+        blobs = get_blob_store()
+        rows = []
+        for d in docs:
+            row = d.model_dump(mode="json", exclude={"id", "content"})
+            row["_content_ref"] = blobs.put(d.content or "")
+            rows.append(row)
+        vec = self._embed(text)
+        eid = uuid.uuid4().hex[:12]
+        now = time.time()
+        payload = json.dumps(dict(data, docs=rows), ensure_ascii=False, default=str)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO semantic (id, kind, query, embedder, vec, data, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (eid, kind, text, self.tag, vec.astype(np.float32).tobytes(), payload, now, now),
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("puts")
+        if evicted:
+            self._count("evictions", len(evicted))
+            for k, e in evicted:
+                self._forget(k, e)
+        return eid
+
+    def _evict(self, conn) -> List[tuple]:
+        """在当前事务内按最近访问时间淘汰超出 max_entries 的条目"""
+        if not self.max_entries:
+            return []
+        (n,) = conn.execute("SELECT COUNT(*) FROM semantic").fetchone()
+        if n <= self.max_entries:
+            return []
+        gone = conn.execute("SELECT kind, id FROM semantic ORDER BY accessed ASC LIMIT ?",
+                            (n - self.max_entries,)).fetchall()
+        conn.executemany("DELETE FROM semantic WHERE id=?", [(e,) for _, e in gone])
+        return gone
+
+    def _expire(self) -> None:
+        """删除过期条目（未命中时顺带做，量小）"""
+        if not self.max_age:
+            return
+        conn = self._conn()
+        gone = conn.execute("SELECT kind, id FROM semantic WHERE created < ? LIMIT 100",
+                            (time.time() - self.max_age,)).fetchall()
+        if gone:
+            conn.executemany("DELETE FROM semantic WHERE id=?", [(e,) for _, e in gone])
+            self._count("expired", len(gone))
+            for k, e in gone:
+                self._forget(k, e)
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM semantic")
+        with self._lock:
+            self._ids.clear()
+            self._vecs.clear()
+            self._created.clear()
+
+    def stats(self) -> Dict[str, float]:
+        (n,) = self._conn().execute("SELECT COUNT(*) FROM semantic").fetchone()
+        with self._lock:
+            out = dict(self._counts)
+        lookups = out["hits"] + out["misses"]
+        out.update(entries=n, hit_rate=(out["hits"] / lookups) if lookups else 0.0)
+        return out
+
+_CACHE: SemanticCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            s = get_settings()
+            _CACHE = SemanticCache(os.path.join(s.DATA_DIR, "cache.sqlite3"),
+                                   threshold=s.SEMANTIC_CACHE_THRESHOLD, max_age=s.SEMANTIC_CACHE_MAX_AGE,
+                                   max_entries=s.SEMANTIC_CACHE_MAX_ENTRIES)
+        return _CACHE
@@ -0,0 +1,302 @@
+# app/storage/vectorstore.py
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from app.config import get_settings
+from app import trace
+
+try:
+    import faiss  # type: ignore
+except Exception:  # faiss 缺失时退化为 NumPy 暴力检索
+    faiss = None
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # 非 POSIX 平台：仅保证进程内互斥
+    fcntl = None
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK = re.compile(r"[一-鿿]+")
+
+class HashingEmbedder:
+    """
+    确定性本地嵌入：英文词 + 中文字二元组做特征哈希，L2 归一化。
+    不依赖网络，跨进程结果一致（不用 Python 内置 hash）。
+    """
+    name = "hash"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self._slots: Dict[str, Tuple[int, float]] = {}  # 特征 -> (维度, 符号) 缓存
+
+    def _slot(self, f: str) -> Tuple[int, float]:
+        hit = self._slots.get(f)
+        if hit is None:
+            h = int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+            hit = (h % self.dim, 1.0 if (h >> 63) & 1 else -1.0)
+            if len(self._slots) < 1_000_000:
+                self._slots[f] = hit
+        return hit
+
+    def _features(self, text: str) -> List[str]:
+        t = (text or "").lower()
+        feats = _WORD.findall(t)
+        for run in _CJK.findall(t):
+            feats.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+        return feats
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for f in self._features(text):
+                counts[f] = counts.get(f, 0) + 1
+            for f, c in counts.items():
+                j, sign = self._slot(f)
+                out[row, j] += sign * (1.0 + math.log(c))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+class SFEmbedder:
+    """SiliconFlow（OpenAI 兼容）/embeddings 接口"""
+    name = "sf"
+
+    def __init__(self, model: str | None = None, dim: int | None = None):
+        s = get_settings()
+        self.model = model or s.SF_EMBED_MODEL
+        self.dim = dim or s.EMBED_DIM
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from app.llm.clients import get_http_client
+        from app.llm.ratelimit import call
+        s = get_settings()
+
+        def _post():
+            r = get_http_client(s.SF_BASE_URL).post(
+                f"{s.SF_BASE_URL.rstrip('/')}/embeddings",
+                json={"model": self.model, "input": list(texts)},
+                headers={"Authorization": f"Bearer {s.SF_API_KEY}"},
+                timeout=60,
+            )
+            r.raise_for_status()
+            return r
+
+        with trace.span("embed", kind="http", model=self.model, inputs=len(texts)) as sp:
+            r = call("embed", _post, model=self.model, deadline=time.monotonic() + s.RETRY_DEADLINE)
+            sp.bytes = len(r.content)
+        rows = sorted(r.json().get("data") or [], key=lambda x: x.get("index", 0))
+        out = np.asarray([x["embedding"] for x in rows], dtype=np.float32)
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+_ST_MODELS: Dict[str, Any] = {}
+_ST_LOCK = threading.Lock()
+
+class LocalEmbedder:
+    """本地小模型（sentence-transformers，如 bge-small-zh）：离线可用的语义嵌入，维度取自模型"""
+    name = "local"
+
+    def __init__(self, model: str | None = None):
+        s = get_settings()
+        self.model = model or s.LOCAL_EMBED_MODEL
+        with _ST_LOCK:
+            m = _ST_MODELS.get(self.model)
+            if m is None:
+                from sentence_transformers import SentenceTransformer  # 可选依赖，用到时才导入
+                m = _ST_MODELS[self.model] = SentenceTransformer(self.model, device=s.LOCAL_EMBED_DEVICE or None)
+        self._model = m
+        self.dim = int(m.get_sentence_embedding_dimension())
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        with trace.span("embed", kind="local", model=self.model, inputs=len(texts)):
+            out = self._model.encode(list(texts), batch_size=32, normalize_embeddings=True,
+                                     convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(out, dtype=np.float32).reshape(len(texts), self.dim)
+
+# 能区分“2023 / 2024”这类近义查询的嵌入器（语义缓存只在这些嵌入器下启用）
+SEMANTIC_EMBEDDERS = ("local", "sf")
+
+def get_embedder():
+    s = get_settings()
+    if s.EMBED_BACKEND == "sf":
+        return SFEmbedder()
+    if s.EMBED_BACKEND == "local":
+        try:
+            return LocalEmbedder()
+        except ImportError:
+            print("[embed] 未安装 sentence-transformers，退回 hash 嵌入（pip install sentence-transformers）")
+    return HashingEmbedder(dim=s.EMBED_DIM)
+
+class VectorStore:
+    """
+    追加式向量库（内积 / 余弦）。目录结构：
+    - vectors.f32   float32 行向量，只追加；加载时 np.memmap，不整体读入内存
+    - items.jsonl   每行一个向量的元数据，与向量行一一对应
+    - index.faiss   HNSW 索引快照（faiss 可用时），persist() 写出，加载时尽量 mmap
+    - store.json    维度与嵌入器名称，防止混用
+    新增向量只写增量；其它进程追加的数据在下次检索时自动补入。
+    """
+
+    def __init__(self, path: str, dim: int, embedder_name: str = ""):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self._vec_path = os.path.join(path, "vectors.f32")
+        self._items_path = os.path.join(path, "items.jsonl")
+        self._index_path = os.path.join(path, "index.faiss")
+        self._lock = threading.RLock()
+        self._check_conf(embedder_name)
+        self.items: List[Dict[str, Any]] = []
+        self.hashes: set = set()
+        self._mm: np.ndarray | None = None
+        self._index = None
+        self._unsaved = 0
+        self._load()
+
+    def _check_conf(self, embedder_name: str) -> None:
+        p = os.path.join(self.path, "store.json")
+        conf = {"dim": self.dim, "embedder": embedder_name}
+        if os.path.exists(p):
+            with open(p, "r", encoding="utf-8") as f:
+                old = json.load(f)
+            if old.get("dim") != self.dim or old.get("embedder") != embedder_name:
+                raise ValueError(f"vector store {self.path} was built with {old}, got {conf}")
+            return
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(conf, f)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _rows_on_disk(self) -> int:
+        try:
+            return os.path.getsize(self._vec_path) // (4 * self.dim)
+        except OSError:
+            return 0
+
+    def _read_items(self, limit: int) -> List[Dict[str, Any]]:
+        """从上次读到的位置继续读至多 limit 行完整元数据"""
+        out: List[Dict[str, Any]] = []
+        if limit <= 0 or not os.path.exists(self._items_path):
+            return out
+        with open(self._items_path, "rb") as f:
+            f.seek(self._items_bytes)
+            for line in f:
+                if len(out) >= limit or not line.endswith(b"\n"):
+                    break
+                out.append(json.loads(line))
+                self._items_bytes += len(line)
+        return out
+
+    def _load(self) -> None:
+        self._items_bytes = 0
+        # 以两份文件中较短者为准（崩溃时可能只写了一半）
+        self.items = self._read_items(self._rows_on_disk())
+        n = len(self.items)
+        self.hashes = {it.get("hash") for it in self.items}
+        if faiss is not None:
+            if os.path.exists(self._index_path):
+                try:
+                    self._index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP)
+                except Exception:
+                    self._index = faiss.read_index(self._index_path)
+            else:
+                self._index = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+            if self._index.ntotal > n:
+                self._index = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+            if self._index.ntotal < n:
+                self._index.add(np.ascontiguousarray(self._vectors(n)[self._index.ntotal:n]))
+
+    def _vectors(self, n: int | None = None) -> np.ndarray:
+        n = len(self.items) if n is None else n
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._mm is None or self._mm.shape[0] < n:
+            self._mm = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(self._rows_on_disk(), self.dim))
+        return self._mm[:n]
+
+    def _refresh(self) -> None:
+        """补入其它进程追加的行"""
+        new = self._read_items(self._rows_on_disk() - len(self.items))
+        if not new:
+            return
+        start = len(self.items)
+        self.items.extend(new)
+        self.hashes.update(it.get("hash") for it in new)
+        if self._index is not None:
+            self._index.add(np.ascontiguousarray(self._vectors()[start:len(self.items)]))
+
+    def add(self, vectors: np.ndarray, items: List[Dict[str, Any]]) -> int:
+        """追加向量与元数据（只写增量），返回新增条数"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(items):
+            raise ValueError("vectors and items length mismatch")
+        if not len(items):
+            return 0
+        with self._lock, open(os.path.join(self.path, ".lock"), "w") as lk:
+            if fcntl is not None:
+                fcntl.flock(lk, fcntl.LOCK_EX)
+            self._refresh()
+            # 截掉上次崩溃留下的半截数据，再先写元数据后写向量：读取方以较短者为准，不会错位
+            if os.path.exists(self._items_path):
+                os.truncate(self._items_path, self._items_bytes)
+            if os.path.exists(self._vec_path):
+                os.truncate(self._vec_path, len(self.items) * 4 * self.dim)
+            self._mm = None
+            with open(self._items_path, "a", encoding="utf-8") as f:
+                for it in items:
+                    line = json.dumps(it, ensure_ascii=False) + "\n"
+                    f.write(line)
+                    self._items_bytes += len(line.encode("utf-8"))
+            with open(self._vec_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self.items.extend(items)
+            self.hashes.update(it.get("hash") for it in items)
+            if self._index is not None:
+                self._index.add(vectors)
+                self._unsaved += len(items)
+        return len(items)
+
+    def search(self, qvec: np.ndarray, k: int = 8) -> List[Tuple[float, Dict[str, Any]]]:
+        qvec = np.ascontiguousarray(qvec, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            self._refresh()
+            n = len(self.items)
+            if n == 0:
+                return []
+            k = min(k, n)
+            if self._index is not None:
+                scores, ids = self._index.search(qvec, k)
+                pairs = [(float(s), int(i)) for s, i in zip(scores[0], ids[0]) if i >= 0]
+            else:
+                pairs = self._brute_force(qvec[0], k)
+            return [(s, self.items[i]) for s, i in pairs]
+
+    def _brute_force(self, q: np.ndarray, k: int, block: int = 65536) -> List[Tuple[float, int]]:
+        """分块矩阵乘，避免把整个 memmap 读进内存"""
+        vecs = self._vectors()
+        best: List[Tuple[float, int]] = []
+        for start in range(0, len(vecs), block):
+            scores = np.asarray(vecs[start:start + block]) @ q
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            best.extend((float(scores[i]), start + int(i)) for i in top)
+        best.sort(key=lambda x: -x[0])
+        return best[:k]
+
+    def persist(self, force: bool = False, every: int = 1024) -> None:
+        """
+        写出 FAISS 索引快照（原子替换）。向量与元数据在 add 时已落盘，
+        快照之后的尾部向量会在加载时补入，所以默认攒够 every 条才重写快照。
+        """
+        if self._index is None or not self._unsaved or (not force and self._unsaved < every):
+            return
+        with self._lock:
+            tmp = self._index_path + ".tmp"
+            faiss.write_index(self._index, tmp)
+            os.replace(tmp, self._index_path)
+            self._unsaved = 0
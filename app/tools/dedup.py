@@ -0,0 +1,135 @@
+# app/tools/dedup.py
+import hashlib
+import re
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from app.schema import Doc
+
+# 只去掉纯跟踪参数；from / ref / src / source / timestamp 等常带语义（git ?ref=、分页 ?from=），保留
+_TRACKING = re.compile(r"^(utm_\w+|spm|fbclid|gclid|dclid|gbraid|wbraid|yclid|msclkid|mc_cid|mc_eid|_hsenc|_hsmi"
+                       r"|igshid|mkt_tok|vero_id|share_source|share_medium|sharer_?id)$", re.I)
+_TOKEN = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+def canonical_url(url: str) -> str:
+    """去协议、www/m 前缀、默认端口、锚点、跟踪参数和末尾斜杠；查询参数排序"""
+    u = (url or "").strip()
+    if not u:
+        return ""
+    parts = urlsplit(u if "://" in u else "http://" + u)
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m.", "mobile."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/+", "/", parts.path or "/")
+    path = re.sub(r"/(index|default)\.(html?|php|aspx?)$", "/", path, flags=re.I).rstrip("/") or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _TRACKING.match(k)))
+    return urlunsplit(("", host, path, query, "")).lstrip("/")
+
+def simhash64(text: str, n: int = 4) -> int | None:
+    """n-gram 词/字 shingle 的 64 位 SimHash；文本太短返回 None"""
+    import numpy as np
+    toks = _TOKEN.findall((text or "").lower())
+    if len(toks) < n + 8:
+        return None
+    # 词哈希用内置 hash（进程内比较即可，C 实现快），n-gram 哈希用 NumPy 向量化多项式组合
+    th = np.fromiter(map(hash, toks), dtype=np.int64, count=len(toks)).view(np.uint64)
+    m = len(th) - n + 1
+    hs = th[:m].copy()
+    with np.errstate(over="ignore"):
+        for j in range(1, n):
+            hs = hs * np.uint64(0x100000001B3) ^ th[j:j + m]
+    hs = np.unique(hs)
+    bits = np.unpackbits(hs.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = bits.sum(axis=0, dtype=np.int64) * 2 - len(hs)
+    return int(np.packbits(weights > 0, bitorder="little").view(np.uint64)[0])
+
+def _doc_score(d: Doc) -> float:
+    if d.score is not None:
+        return float(d.score)
+    s = (d.meta or {}).get("score")
+    return float(s) if isinstance(s, (int, float)) else 0.0
+
+def dedup_docs(docs: List[Doc], max_hamming: int = 3) -> List[Doc]:
+    """
+    合并完全重复与近似重复的文档：
+    - 规范化 URL 相同或正文哈希相同 → 重复
+    - SimHash 汉明距离 <= max_hamming → 近似重复；64 位指纹切成 max_hamming+1 段分桶，
+      距离不超过阈值的两篇必有一段完全相同，只需比较同桶候选（无需两两比较）
+    每组保留得分最高者（同分取正文更长、位置更靠前），其余 URL 记入 meta["merged_urls"]。
+    """
+    n = len(docs)
+    if n < 2:
+        return list(docs)
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    first_by_key: Dict[str, int] = {}
+    hashes: List[int | None] = []
+    for i, d in enumerate(docs):
+        text = d.content or ""
+        keys = [f"c:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"] if text.strip() else []
+        cu = canonical_url(d.url or "")
+        if cu:
+            keys.append(f"u:{cu}")
+        for k in keys:
+            if k in first_by_key:
+                union(first_by_key[k], i)
+            else:
+                first_by_key[k] = i
+        hashes.append(simhash64(text))
+
+    bands = max_hamming + 1
+    bounds = [64 * b // bands for b in range(bands + 1)]
+    buckets: Dict[tuple, List[int]] = {}
+    for i, h in enumerate(hashes):
+        if h is None:
+            continue
+        for b in range(bands):
+            lo, hi = bounds[b], bounds[b + 1]
+            buckets.setdefault((b, (h >> lo) & ((1 << (hi - lo)) - 1)), []).append(i)
+    for members in buckets.values():
+        for a in range(len(members)):
+            for c in range(a + 1, len(members)):
+                i, j = members[a], members[c]
+                if find(i) != find(j) and bin(hashes[i] ^ hashes[j]).count("1") <= max_hamming:
+                    union(i, j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    out: List[Doc] = []
+    for root in sorted(groups):
+        members = groups[root]
+        if len(members) == 1:
+            out.append(docs[root])
+            continue
+        best = max(members, key=lambda i: (_doc_score(docs[i]), len(docs[i].content or ""), -i))
+        rep = docs[best]
+        urls, subs, dups = [], [], len(members) - 1
+        for i in members:
+            m = docs[i].meta or {}
+            subs.extend(m.get("sub_goals") or ([m["sub_goal"]] if m.get("sub_goal") else []))
+            dups += m.get("dup_count", 0)
+            for u in ([docs[i].url] if i != best else []) + list(m.get("merged_urls") or []):
+                if u and u != rep.url and u not in urls:
+                    urls.append(u)
+        rep.meta = dict(rep.meta or {})
+        rep.meta["merged_urls"] = urls
+        rep.meta["dup_count"] = dups
+        if subs:
+            rep.meta["sub_goals"] = list(dict.fromkeys(subs))
+        out.append(rep)
+    return out
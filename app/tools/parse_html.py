@@ -0,0 +1,150 @@
+# app/tools/parse_html.py
+import re
+from typing import Dict, List
+
+_HTML_HINT = re.compile(r"<(html|body|div|p|span|article|section|table|a|br|li)\b[^>]*>", re.I)
+_DROP_TAGS = ("script", "style", "noscript", "nav", "footer", "aside", "form", "iframe",
+              "svg", "button", "select", "template", "canvas", "video", "audio")
+_BLOCK_TAGS = ("p", "div", "section", "article", "main", "li", "ul", "ol", "tr", "table", "br",
+               "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "dd", "dt", "figcaption")
+_BOILER_ATTR = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|comment|comments|share|social|advert|ads?|"
+    r"banner|cookie|breadcrumb|related|recommend|copyright|login|subscribe|popup|modal|toolbar)([\s_-]|$)",
+    re.I,
+)
+
+# 编码块：data URI、长 base64、长十六进制
+_DATA_URI = re.compile(r"data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+")
+_B64 = re.compile(r"(?<![A-Za-z0-9+/])[A-Za-z0-9+/]{120,}={0,2}(?![A-Za-z0-9+/])")
+_HEX = re.compile(r"\b(?:0x)?[0-9a-fA-F]{64,}\b")
+_MD_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]*)\]\((?:[^()]|\([^)]*\))*\)")
+_URL = re.compile(r"https?://\S+")
+_BOILER_LINE = re.compile(
+    r"(版权所有|copyright|©|all rights reserved|icp备|公网安备|登录|注册|sign in|sign up|log in|cookie|"
+    r"隐私政策|privacy policy|terms of (use|service)|分享到|扫一扫|扫码|关注我们|上一篇|下一篇|返回顶部|"
+    r"skip to (main )?content|subscribe|newsletter|相关推荐|热门文章|广告)",
+    re.I,
+)
+_KEEP_TAGS = ("html", "body", "main", "article")
+_WORDISH = re.compile(r"[\w一-鿿]")
+_SENT_PUNCT = re.compile(r"[。！？；.!?;:：，,]")
+
+def looks_like_html(text: str) -> bool:
+    return len(_HTML_HINT.findall((text or "")[:20000])) >= 5
+
+def _main_node(root):
+    """正文节点：优先 article/main，否则取去掉链接文字后文本最多的块"""
+    for xp in ("//article", "//main", "//*[@role='main']"):
+        found = root.xpath(xp)
+        if found:
+            return max(found, key=lambda n: len(n.text_content()))
+    best, best_score = root, 0.0
+    for node in root.iter("div", "section", "td"):
+        text_len = len(node.text_content())
+        if text_len < 200:
+            continue
+        link_len = sum(len(a.text_content()) for a in node.iter("a"))
+        score = text_len * (1.0 - link_len / text_len) ** 2
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+def html_to_text(html: str) -> str:
+    """lxml 解析：去掉脚本/导航/页脚等非正文元素，定位正文块，按块级元素换行输出"""
+    try:
+        import lxml.html
+        root = lxml.html.fromstring(html)
+    except Exception:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        for t in soup(list(_DROP_TAGS)):
+            t.decompose()
+        return soup.get_text("\n")
+    for el in list(root.iter(*_DROP_TAGS)):
+        el.drop_tree()
+    for el in list(root.iter()):
+        if not isinstance(el.tag, str) or el.tag in _KEEP_TAGS or el.getparent() is None:
+            continue
+        attrs = f"{el.get('class', '')} {el.get('id', '')}"
+        # 样板块通常很短；文字很多的块即便类名可疑也保留
+        if attrs.strip() and _BOILER_ATTR.search(attrs) and len(el.text_content()) < 2000:
+            el.drop_tree()
+    node = _main_node(root)
+    for el in node.iter(*_BLOCK_TAGS):
+        el.tail = "\n" + (el.tail or "")
+    return node.text_content()
+
+def strip_blobs(text: str) -> str:
+    text = _DATA_URI.sub("", text)
+    text = _MD_IMAGE.sub("", text)
+    text = _B64.sub("", text)
+    return _HEX.sub("", text)
+
+def _is_link_line(line: str) -> bool:
+    """主要由 markdown 链接 / URL 组成的行（导航、目录、推荐列表）"""
+    rest = _URL.sub("", _MD_LINK.sub("", line))
+    return len(rest.strip(" |·•-*>#")) < 0.3 * len(line)
+
+def clean_lines(text: str) -> str:
+    """去样板行、重复短行、纯链接行、符号行；合并多余空行"""
+    out: List[str] = []
+    seen = set()
+    blank = 0
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        if not line:
+            blank += 1
+            if blank == 1 and out:
+                out.append("")
+            continue
+        if len(_WORDISH.findall(line)) < 0.3 * len(line):
+            continue
+        if len(line) <= 40 and _BOILER_LINE.search(line):
+            continue
+        if ("](" in line or "http" in line) and _is_link_line(line):
+            continue
+        if len(line) <= 120:
+            if line in seen:
+                continue
+            seen.add(line)
+        blank = 0
+        out.append(line)
+    return "\n".join(out).strip()
+
+def pre_clean(content: str) -> str:
+    """规则清洗：HTML 抽正文 → 去编码块 → 行级去噪"""
+    text = content or ""
+    if looks_like_html(text):
+        text = html_to_text(text)
+    return clean_lines(strip_blobs(text))
+
+def quality(text: str) -> Dict[str, float]:
+    lines = [l for l in (text or "").splitlines() if l.strip()]
+    n = len(text or "")
+    if not n or not lines:
+        return {"chars": 0, "lines": 0, "wordish": 0.0, "short_lines": 1.0, "punct": 0.0, "urls": 0.0}
+    short = sum(1 for l in lines if len(l) < 20)
+    return {
+        "chars": n,
+        "lines": len(lines),
+        "wordish": len(_WORDISH.findall(text)) / n,
+        "short_lines": short / len(lines),
+        "punct": len(_SENT_PUNCT.findall(text)) / n,
+        "urls": len(_URL.findall(text)) / len(lines),
+    }
+
+def needs_llm_clean(text: str) -> bool:
+    """
+    规则清洗后的文本是否还需要 LLM 清洗：
+    文本足够长、以文字为主、短行（菜单/碎片）少、有正常句读、几乎没有 URL 时认为已干净。
+    """
+    q = quality(text)
+    if q["chars"] < 200:
+        return True
+    return not (
+        q["wordish"] >= 0.6
+        and q["short_lines"] <= 0.4
+        and q["punct"] >= 0.01
+        and q["urls"] <= 0.1
+    )
@@ -0,0 +1,42 @@
+# app/tools/splitters.py
+from typing import List
+from app.tools.tokens import count_tokens, split_by_tokens, split_sentences
+
+def split_text(text: str, chunk_tokens: int = 256, overlap_tokens: int = 32) -> List[str]:
+    """
+    中英文混排切块：先按句末标点/换行切句，再把句子贪心拼到 chunk_tokens 以内；
+    相邻块之间重叠上一块末尾不超过 overlap_tokens 的整句。
+    """
+    sents: List[str] = []
+    sizes: List[int] = []
+    for s in split_sentences(text):
+        # 超长单句（表格行、无标点长串）按 token 上限硬切
+        for piece in (split_by_tokens(s, chunk_tokens) if count_tokens(s) > chunk_tokens else [s]):
+            sents.append(piece)
+            sizes.append(count_tokens(piece))
+    chunks: List[str] = []
+    start = 0
+    while start < len(sents):
+        end, used = start, 0
+        while end < len(sents) and (end == start or used + sizes[end] <= chunk_tokens):
+            used += sizes[end]
+            end += 1
+        chunks.append(_join(sents[start:end]))
+        if end >= len(sents):
+            break
+        # 回退若干整句作为重叠，但保证前进
+        back, ov = end, 0
+        while back - 1 > start and ov + sizes[back - 1] <= overlap_tokens:
+            back -= 1
+            ov += sizes[back]
+        start = back
+    return chunks
+
+def _join(sents: List[str]) -> str:
+    """中文句子直接相连，英文句子之间补空格"""
+    out = ""
+    for s in sents:
+        if out and out[-1].isascii() and s[:1].isascii():
+            out += " "
+        out += s
+    return out
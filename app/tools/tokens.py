@@ -0,0 +1,64 @@
+# app/tools/tokens.py
+import re
+from functools import lru_cache
+from typing import List
+from app.config import get_settings
+
+_CJK = re.compile(r"[一-鿿　-〿＀-￯]")
+# 句末：中文标点直接切；英文 .!? 后需跟空白；换行总是切
+_SENT_END = re.compile(r"(?<=[。！？；!?;…])|(?<=[.!?][\"')\]”’])\s+|(?<=[.!?])\s+|\n+")
+
+@lru_cache()
+def _encoding():
+    """tiktoken 编码；离线拿不到词表时返回 None，改用估算"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(get_settings().TOKEN_ENCODING)
+    except Exception as e:
+        print(f"[tokens] tiktoken 不可用，改用字符估算：{e.__class__.__name__}")
+        return None
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # 估算：中文约 1 字 1 token，其它约 4 字符 1 token
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def split_sentences(text: str) -> List[str]:
+    """按中英文句末标点与换行切句，保留标点，去掉空句"""
+    return [p.strip() for p in _SENT_END.split(text or "") if p and p.strip()]
+
+def split_by_tokens(text: str, n: int) -> List[str]:
+    """不看句子边界，按每段 n token 硬切"""
+    enc = _encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return [enc.decode(ids[i:i + n]) for i in range(0, len(ids), n)]
+    # 估算模式：按平均每 token 字符数切
+    step = max(1, int(len(text) * n / max(1, count_tokens(text))))
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+def truncate_to_tokens(text: str, max_tokens: int, ellipsis: str = " ...") -> str:
+    """在句子边界处截断到 max_tokens 以内；首句就超限时按 token 硬截断"""
+    text = (text or "").strip()
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # 在原文的句子边界处切，保留原有换行与排版
+    cut, used, prev = 0, 0, 0
+    for m in _SENT_END.finditer(text):
+        end = m.start()
+        if end <= prev:
+            continue
+        used += count_tokens(text[prev:end])
+        if used > max_tokens:
+            break
+        cut, prev = end, end
+    if cut:
+        return text[:cut].rstrip() + ellipsis
+    return split_by_tokens(text, max_tokens)[0].rstrip() + ellipsis
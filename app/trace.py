@@ -0,0 +1,200 @@
+# app/trace.py
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import get_settings
+
+# 每次调用（LLM / 检索 / HTTP / 阶段）记一个 span：耗时、首 token 时间、token 数、字节数、错误。
+# span 挂到当前运行（Trace，随工作区保存）并累加进全局指标（/metrics）。
+
+class Span:
+    __slots__ = ("id", "parent", "name", "kind", "start", "ms", "ttft_ms", "prompt_tokens",
+                 "completion_tokens", "bytes", "cost", "error", "attrs", "_t0")
+
+    def __init__(self, name: str, kind: str, parent: Optional[str], attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.ms: float = 0.0
+        self.ttft_ms: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.bytes = 0
+        self.cost = 0.0
+        self.error: Optional[str] = None
+        self.attrs = attrs
+
+    def first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = round((time.perf_counter() - self._t0) * 1000, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__ if not k.startswith("_")}
+        d["attrs"] = {k: v for k, v in self.attrs.items() if v is not None}
+        # 省略空值，保持 JSONL / Workspace.trace 紧凑
+        return {k: v for k, v in d.items() if v not in (None, 0, {}) or k == "ms"}
+
+class Trace:
+    """一次流水线运行收集到的 span（线程安全追加）"""
+
+    def __init__(self, ws_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.ws_id = ws_id
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+_TRACE: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_SPAN: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+@contextmanager
+def run(ws) -> Iterator[Trace]:
+    """绑定一次运行的 Trace；结束时把 span 追加到 ws.trace（保留最近 TRACE_MAX_SPANS 条）"""
+    tr = Trace(ws_id=getattr(ws, "id", None))
+    token = _TRACE.set(tr)
+    try:
+        yield tr
+    finally:
+        _TRACE.reset(token)
+        if ws is not None and get_settings().TRACE:
+            keep = get_settings().TRACE_MAX_SPANS
+            ws.trace = (list(ws.trace or []) + tr.spans)[-keep:]
+
+def current() -> Optional[Trace]:
+    return _TRACE.get()
+
+def current_span() -> Optional[Span]:
+    return _SPAN.get()
+
+@contextmanager
+def span(name: str, kind: str = "call", **attrs: Any) -> Iterator[Span]:
+    sp = Span(name, kind, (_SPAN.get().id if _SPAN.get() else None), attrs)
+    token = _SPAN.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{e.__class__.__name__}: {e}"[:300]
+        raise
+    finally:
+        _SPAN.reset(token)
+        sp.ms = round((time.perf_counter() - sp._t0) * 1000, 1)
+        _finish(sp)
+
+def llm_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """按 LLM_PRICE_INPUT / LLM_PRICE_OUTPUT（每百万 token 价格）估算费用"""
+    s = get_settings()
+    return (prompt_tokens * s.LLM_PRICE_INPUT + completion_tokens * s.LLM_PRICE_OUTPUT) / 1e6
+
+# ---------------- 导出：JSONL 与 Prometheus 文本 ----------------
+
+_FILE_LOCK = threading.Lock()
+_METRICS_LOCK = threading.Lock()
+_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# (kind, name) -> 统计
+_STATS: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+def _finish(sp: Span) -> None:
+    s = get_settings()
+    if not s.TRACE:
+        return
+    tr = _TRACE.get()
+    d = sp.to_dict()
+    if tr is not None:
+        tr.add(d)
+    _observe(sp)
+    if s.TRACE_FILE:
+        row = dict(d, trace=tr.id if tr else None, ws_id=tr.ws_id if tr else None)
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        with _FILE_LOCK:
+            os.makedirs(os.path.dirname(os.path.abspath(s.TRACE_FILE)), exist_ok=True)
+            with open(s.TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def _observe(sp: Span) -> None:
+    sec = sp.ms / 1000
+    with _METRICS_LOCK:
+        st = _STATS.setdefault((sp.kind, sp.name), {
+            "count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(_BUCKETS),
+            "ttft_sum": 0.0, "ttft_count": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "bytes": 0, "cost": 0.0,
+        })
+        st["count"] += 1
+        st["errors"] += 1 if sp.error else 0
+        st["sum"] += sec
+        for i, b in enumerate(_BUCKETS):
+            if sec <= b:
+                st["buckets"][i] += 1
+        if sp.ttft_ms is not None:
+            st["ttft_sum"] += sp.ttft_ms / 1000
+            st["ttft_count"] += 1
+        st["prompt_tokens"] += sp.prompt_tokens
+        st["completion_tokens"] += sp.completion_tokens
+        st["bytes"] += sp.bytes
+        st["cost"] += sp.cost
+
+def _esc(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def render_prometheus() -> str:
+    """Prometheus 文本格式（/metrics）"""
+    with _METRICS_LOCK:
+        items = [(k, {**v, "buckets": list(v["buckets"])}) for k, v in sorted(_STATS.items())]
+    out = [
+        "# HELP searchagent_span_seconds Span wall time.",
+        "# TYPE searchagent_span_seconds histogram",
+    ]
+    for (kind, name), st in items:
+        lbl = f'kind="{_esc(kind)}",name="{_esc(name)}"'
+        for b, c in zip(_BUCKETS, st["buckets"]):
+            out.append(f'searchagent_span_seconds_bucket{{{lbl},le="{b}"}} {c}')
+        out.append(f'searchagent_span_seconds_bucket{{{lbl},le="+Inf"}} {st["count"]}')
+        out.append(f"searchagent_span_seconds_sum{{{lbl}}} {st['sum']:.6f}")
+        out.append(f"searchagent_span_seconds_count{{{lbl}}} {st['count']}")
+    simple = [
+        ("searchagent_span_errors_total", "counter", "Spans that raised.", lambda st: st["errors"]),
+        ("searchagent_ttft_seconds_sum", "counter", "Sum of time to first token.", lambda st: round(st["ttft_sum"], 6)),
+        ("searchagent_ttft_seconds_count", "counter", "Spans with a first token.", lambda st: st["ttft_count"]),
+        ("searchagent_prompt_tokens_total", "counter", "Prompt tokens.", lambda st: st["prompt_tokens"]),
+        ("searchagent_completion_tokens_total", "counter", "Completion tokens.", lambda st: st["completion_tokens"]),
+        ("searchagent_bytes_total", "counter", "Bytes fetched.", lambda st: st["bytes"]),
+        ("searchagent_cost_total", "counter", "Estimated LLM cost.", lambda st: round(st["cost"], 6)),
+    ]
+    for metric, typ, help_, get in simple:
+        out.append(f"# HELP {metric} {help_}")
+        out.append(f"# TYPE {metric} {typ}")
+        for (kind, name), st in items:
+            out.append(f'{metric}{{kind="{_esc(kind)}",name="{_esc(name)}"}} {get(st)}')
+    return "\n".join(out) + "\n"
+
+def summarize(spans: List[Dict[str, Any]]) -> str:
+    """按 (kind, name) 汇总一次运行：次数、总耗时、平均首 token、token 数、字节数"""
+    agg: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for d in spans:
+        a = agg.setdefault((d.get("kind", ""), d.get("name", "")),
+                           {"n": 0, "ms": 0.0, "ttft": 0.0, "nt": 0, "tok": 0, "bytes": 0, "err": 0})
+        a["n"] += 1
+        a["ms"] += d.get("ms", 0.0)
+        if d.get("ttft_ms") is not None:
+            a["ttft"] += d["ttft_ms"]
+            a["nt"] += 1
+        a["tok"] += d.get("prompt_tokens", 0) + d.get("completion_tokens", 0)
+        a["bytes"] += d.get("bytes", 0)
+        a["err"] += 1 if d.get("error") else 0
+    lines = []
+    for (kind, name), a in sorted(agg.items(), key=lambda kv: -kv[1]["ms"]):
+        ttft = f" ttft {a['ttft'] / a['nt']:.0f}ms" if a["nt"] else ""
+        extra = (f" tok {a['tok']}" if a["tok"] else "") + (f" {a['bytes'] / 1024:.0f}KB" if a["bytes"] else "")
+        err = f" err {a['err']}" if a["err"] else ""
+        lines.append(f"  · {kind}:{name} ×{a['n']} {a['ms']:.0f}ms{ttft}{extra}{err}")
+    return "\n".join(lines)
@@ -1,30 +1,78 @@
 import json
 import os
-from typing import List
+from typing import Dict, List
 from datetime import datetime
 from app.schema import Workspace, Doc, SubGoal
+from app.compact import CompactWorkspace, WorkspaceHeader
 from app.config import get_settings
+from app.storage.fs_store import get_ws_store
 
 def _path(ws_id: str) -> str:
     s = get_settings()
     return os.path.join(s.DATA_DIR, f"{ws_id}.json")
 
-def load_ws(ws_id: str) -> Workspace:
-    p = _path(ws_id)
+def _read_json(p: str) -> Dict:
     with open(p, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return Workspace(**data)
+        return json.load(f)
 
-def save_ws(ws: Workspace) -> None:
-    ws.updated_at = datetime.utcnow()
-    p = _path(ws.id)
-    with open(p, "w", encoding="utf-8") as f:
+def _load_json(p: str) -> Workspace:
+    return Workspace(**_read_json(p))
+
+def load_ws(ws_id: str, mode: str = "full") -> Workspace | WorkspaceHeader | CompactWorkspace:
+    """
+    mode：
+    - full：pydantic Workspace（sqlite 后端的 Doc.content 访问时才读取）；
+    - header：WorkspaceHeader，只有表头字段与 docs / sub_goals 条数（sqlite 后端只读表头一行）；
+    - compact：CompactWorkspace，doc 元数据列式存储、正文只留 BlobStore 引用，to_workspace() 还原。
+    """
+    if mode not in ("full", "header", "compact"):
+        raise ValueError(f"unknown load mode: {mode}")
+    s = get_settings()
+    if s.WS_BACKEND == "sqlite":
+        store = get_ws_store()
+        if store.exists(ws_id):
+            if mode == "header":
+                n = store.counts(ws_id)
+                return WorkspaceHeader(store.load_dict(ws_id, with_lists=False), n["docs"], n["sub_goals"])
+            data = store.load_dict(ws_id)
+            if mode == "compact":
+                return CompactWorkspace.from_dict(data)
+            # content 存在 blob 库里，访问时才读取
+            data["docs"] = [Doc.lazy(d.pop("_content_ref"), **d) if "_content_ref" in d else Doc(**d)
+                            for d in data.get("docs", [])]
+            return Workspace(**data)
+    # json 后端，或 sqlite 中没有（旧版本留下的 JSON 文件）：整个文件都要解析
+    if mode == "full":
+        return _load_json(_path(ws_id))
+    data = _read_json(_path(ws_id))
+    if mode == "header":
+        return WorkspaceHeader(data, len(data.get("docs") or []), len(data.get("sub_goals") or []))
+    # 正文在内存里压缩保存，读取路径不写 BlobStore
+    return CompactWorkspace.from_dict(data)
+
+def export_ws_json(ws: Workspace, path: str | None = None) -> str:
+    """按原 JSON 格式整体导出（写临时文件后原子替换），返回文件路径"""
+    p = path or _path(ws.id)
+    tmp = p + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(
             ws.model_dump(mode="json"),  # ✅ 用 Pydantic 的 JSON 模式
             f,
             ensure_ascii=False,
             indent=2,
         )
+    os.replace(tmp, p)
+    return p
+
+def save_ws(ws: Workspace) -> None:
+    ws.updated_at = datetime.utcnow()
+    s = get_settings()
+    if s.WS_BACKEND == "sqlite":
+        # 只写新增/变化的 docs 与 sub_goals，单事务提交
+        get_ws_store().save(ws)
+    else:
+        export_ws_json(ws)
+
 def add_docs(ws: Workspace, docs: List[Doc]) -> Workspace:
     ws.docs.extend(docs)
     return ws
@@ -35,4 +83,4 @@ def set_goal(ws: Workspace, goal: str) -> Workspace:
 
 def add_subgoals(ws: Workspace, subs: List[SubGoal]) -> Workspace:
     ws.sub_goals.extend(subs)
-    return ws
\ No newline at end of file
+    return ws
@@ -0,0 +1,105 @@
+# 薄客户端：把问题交给常驻进程（scripts/daemon.py）并流式打印澄清问题与回答；
+# 守护进程没启动（或 --local）时在本进程内运行，即冷启动。--timing 在 stderr 打印各段耗时。
+#   python scripts/ask.py "你的问题" [--answers "补充回答"] [--local] [--timing] [--rounds 3 --time-budget 60]
+import time
+
+T0 = time.perf_counter()
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _ms(t: float) -> str:
+    return f"{(t - T0) * 1000:.0f}ms"
+
+def _timing(args, label: str, **marks: float) -> None:
+    if args.timing:
+        print(f"[timing] {label} " + " ".join(f"{k}={_ms(v)}" for k, v in marks.items() if v), file=sys.stderr)
+
+def _read_answers(args, questions) -> str:
+    print("澄清问题：")
+    for i, q in enumerate(questions, 1):
+        print(f"  {i}. {q}")
+    if args.answers is not None:
+        return args.answers
+    return input("补充回答：")
+
+def _budget(args):
+    b = {"max_rounds": args.rounds, "time_s": args.time_budget}
+    return {k: v for k, v in b.items() if v is not None} or None
+
+def _via_daemon(args, path: str) -> None:
+    from app.server.daemon import request
+    first, ws_id, questions = None, None, None
+    for ev, data in request({"op": "intake", "query": args.query}, path=path):
+        first = first or time.perf_counter()
+        if ev == "questions":
+            ws_id, questions = data["ws_id"], data["questions"]
+        elif ev in ("error", "cancelled"):
+            sys.exit(f"[ask] {ev}: {data.get('message', '')}")
+    if ws_id is None or questions is None:
+        # 连接中途断开等情况：流结束了却没收到澄清问题
+        sys.exit("[ask] 守护进程未返回澄清问题（intake 中断），可重试或不带守护进程运行")
+    _timing(args, "intake", first_event=first, done=time.perf_counter())
+    answers = _read_answers(args, questions)
+
+    t1 = time.perf_counter()
+    first_token, streamed = None, []
+    for ev, data in request({"op": "answers", "ws_id": ws_id, "answers": answers, "budget": _budget(args)},
+                            path=path):
+        if ev == "stage" and data.get("status") == "start":
+            print(f"[{data.get('name')}]", file=sys.stderr, flush=True)
+        elif ev == "round":
+            print(f"[round {data['round']}] +{data['new_docs']} docs", file=sys.stderr, flush=True)
+        elif ev == "token" and data.get("stage") == "write" and data.get("kind") == "answer":
+            if first_token is None:
+                first_token = time.perf_counter()
+                print("\n=== 最终回答 ===")
+            streamed.append(data["text"])
+            print(data["text"], end="", flush=True)
+        elif ev == "answer":
+            # 参考来源等生成后追加的部分不在 token 流里，补打印
+            text, done = data["answer"], "".join(streamed)
+            print(text[len(done):] if text.startswith(done) else "\n" + text)
+        elif ev in ("error", "cancelled"):
+            sys.exit(f"[ask] {ev}: {data.get('message', '')}")
+    _timing(args, "answers", sent=t1, first_answer_token=first_token, done=time.perf_counter())
+
+def _local(args) -> None:
+    t_import = time.perf_counter()
+    from app.pipelines.main_loop import continue_after_answers, start_intake
+    _timing(args, "import", start=t_import, done=time.perf_counter())
+    ws, qs = start_intake(args.query)
+    _timing(args, "intake", done=time.perf_counter())
+    answers = _read_answers(args, qs)
+    ws, answer = continue_after_answers(ws, answers, budget=_budget(args))
+    print("\n=== 最终回答 ===\n", answer)
+    _timing(args, "answers", done=time.perf_counter())
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Ask SearchAgent (via the warm daemon when running)")
+    ap.add_argument("query")
+    ap.add_argument("--answers", default=None, help="澄清问题的回答（不给则从标准输入读取）")
+    ap.add_argument("--socket", default=None)
+    ap.add_argument("--local", action="store_true", help="不连守护进程，在本进程内运行")
+    ap.add_argument("--rounds", type=int, default=None, help="最多研究轮数（默认 RESEARCH_MAX_ROUNDS）")
+    ap.add_argument("--time-budget", type=float, default=None, help="研究时间预算（秒）")
+    ap.add_argument("--timing", action="store_true", help="在 stderr 打印启动、首事件、首答 token 与总耗时")
+    args = ap.parse_args()
+    _timing(args, "startup", ready=time.perf_counter())
+
+    if not args.local:
+        from app.server.daemon import socket_path
+        path = args.socket or socket_path()
+        if os.path.exists(path):
+            try:
+                return _via_daemon(args, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass
+        print("[ask] 守护进程未启动，改为本进程内运行（python scripts/daemon.py 可常驻预热）", file=sys.stderr)
+    _local(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# 批量模式：JSONL 输入，答案与指标写 JSONL；中断（Ctrl-C / kill）后同样命令重跑即从断点继续
+#   python scripts/batch.py queries.jsonl -o data/batch/out.jsonl --concurrency 8
+# 输入每行 {"id": "q1", "query": "...", "answers": "..."}（或直接一个字符串）；
+# 流水线的控制台输出写到 <输出>.log，进度与汇总打印到 stderr。
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.pipelines.batch import run_batch
+
+def _term(signum, frame):
+    # kill（SIGTERM）与 Ctrl-C 同样处理：运行中的查询在检查点退出，断点保留
+    raise KeyboardInterrupt
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SearchAgent batch mode")
+    ap.add_argument("input", help="查询 JSONL")
+    ap.add_argument("-o", "--out", default=None, help="输出 JSONL（默认 data/batch/<输入名>.out.jsonl）")
+    ap.add_argument("--concurrency", type=int, default=None, help="同时运行的查询数（默认 BATCH_CONCURRENCY）")
+    ap.add_argument("--limit", type=int, default=None, help="本次最多跑多少条")
+    ap.add_argument("--rounds", type=int, default=None, help="每条查询最多研究轮数（默认 BATCH_MAX_ROUNDS）")
+    ap.add_argument("--time-budget", type=float, default=None, help="每条查询的研究时间预算（秒）")
+    ap.add_argument("--token-budget", type=int, default=None, help="每条查询的 LLM token 预算")
+    ap.add_argument("--search-budget", type=int, default=None, help="每条查询的检索次数预算")
+    ap.add_argument("--verbose", action="store_true", help="流水线输出打印到控制台而不是日志文件")
+    args = ap.parse_args()
+
+    out = args.out or os.path.join("data", "batch", os.path.splitext(os.path.basename(args.input))[0] + ".out.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    budget = {"max_rounds": args.rounds, "time_s": args.time_budget, "tokens": args.token_budget,
+              "searches": args.search_budget}
+    signal.signal(signal.SIGTERM, _term)
+    if args.verbose:
+        summary = run_batch(args.input, out, concurrency=args.concurrency, limit=args.limit, budget=budget)
+    else:
+        with open(out + ".log", "a", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+            summary = run_batch(args.input, out, concurrency=args.concurrency, limit=args.limit, budget=budget)
+    print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr)
+    print(f"[Batch] 结果：{out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
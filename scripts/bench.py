@@ -0,0 +1,72 @@
+# 离线端到端压测：本地替身服务代替 SiliconFlow / Tavily，不消耗 API 额度
+#   python scripts/bench.py --levels 1,4,8 --ttft 0.3 --tps 200 --page-kb 20
+#   python scripts/bench.py --baseline data/bench/bench-20250101-120000.json
+#   python scripts/bench.py --startup --runs 5      # 冷启动 vs 守护进程热启动
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bench.runner import DEFAULT_QUERIES, compare, format_startup, measure_startup, run_bench, save_report
+from app.bench.standins import StandinConfig
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SearchAgent offline benchmark")
+    ap.add_argument("--levels", default="1,4", help="并发级别，逗号分隔")
+    ap.add_argument("--sessions", type=int, default=None, help="每个级别的会话数（默认 max(查询数, 2×并发)）")
+    ap.add_argument("--queries", default=None, help="查询文件，每行一条")
+    ap.add_argument("--ttft", type=float, default=0.3, help="替身 LLM 首 token 延迟（秒）")
+    ap.add_argument("--tps", type=float, default=200.0, help="替身 LLM 每秒输出块数")
+    ap.add_argument("--answer-tokens", type=int, default=300)
+    ap.add_argument("--think-tokens", type=int, default=0)
+    ap.add_argument("--sub-goals", type=int, default=3)
+    ap.add_argument("--research-rounds", type=int, default=1, help="替身规划在第几轮之前一直要求更多资料")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--search-latency", type=float, default=0.5)
+    ap.add_argument("--page-kb", type=float, default=20.0)
+    ap.add_argument("--json-trailer", type=int, default=0, help="JSON 闭合后多余输出的字符数")
+    ap.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="覆盖 Settings 环境变量")
+    ap.add_argument("--name", default="bench")
+    ap.add_argument("--out", default=os.path.join("data", "bench"))
+    ap.add_argument("--baseline", default=None, help="与之前保存的结果对比")
+    ap.add_argument("--verbose", action="store_true", help="保留流水线控制台输出")
+    ap.add_argument("--startup", action="store_true", help="只测冷启动 / 守护进程热启动耗时")
+    ap.add_argument("--runs", type=int, default=5, help="--startup 每项重复次数")
+    args = ap.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [l.strip() for l in f if l.strip()]
+    cfg = StandinConfig(
+        ttft=args.ttft,
+        tokens_per_sec=args.tps,
+        answer_tokens=args.answer_tokens,
+        think_tokens=args.think_tokens,
+        sub_goals=args.sub_goals,
+        research_rounds=args.research_rounds,
+        error_rate=args.error_rate,
+        search_latency=args.search_latency,
+        page_kb=args.page_kb,
+        json_trailer=args.json_trailer,
+    )
+    overrides = dict(kv.split("=", 1) for kv in args.set)
+    if args.startup:
+        rep = measure_startup(args.runs, cfg=cfg, query=queries[0], overrides=overrides)
+        print(format_startup(rep))
+        print(f"[Bench] 结果已保存：{save_report(rep, args.out, args.name + '-startup')}")
+        return
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+
+    report = run_bench(queries, levels=levels, sessions=args.sessions, cfg=cfg, overrides=overrides,
+                       verbose=args.verbose)
+    path = save_report(report, args.out, args.name)
+    print(f"[Bench] 结果已保存：{path}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print(compare(report, json.load(f)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# 常驻进程：预热流水线与连接池后在 Unix socket 上等待 scripts/ask.py 提交任务
+#   python scripts/daemon.py [--socket data/daemon.sock]
+import argparse
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.server.daemon import serve
+
+def _term(*_) -> None:
+    raise KeyboardInterrupt()
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SearchAgent warm daemon")
+    ap.add_argument("--socket", default=None, help="Unix socket 路径（默认 DAEMON_SOCKET 或 DATA_DIR/daemon.sock）")
+    args = ap.parse_args()
+    # SIGTERM 按 Ctrl-C 处理，退出时删除 socket 文件
+    signal.signal(signal.SIGTERM, _term)
+    try:
+        serve(args.socket)
+    except KeyboardInterrupt:
+        print("[Daemon] 退出")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+#!/usr/bin/env bash
+# 启动 HTTP 服务（SSE 流式接口见 doc.md）。多进程部署时每个进程各自限流：总并发 = WORKERS × API_MAX_CONCURRENT
+set -e
+cd "$(dirname "$0")/.."
+exec uvicorn app.server.api:app \
+  --host "${HOST:-0.0.0.0}" \
+  --port "${PORT:-8000}" \
+  --workers "${WORKERS:-1}" \
+  --timeout-keep-alive "${KEEP_ALIVE:-75}"
@@ -0,0 +1,66 @@
+# 增量 JSON 解析（app/llm/json_stream.py）
+from app.llm.json_stream import JsonStreamParser
+
+def _feed(parser: JsonStreamParser, text: str, step: int = 3) -> bool:
+    for i in range(0, len(text), step):
+        parser.feed(text[i:i + step])
+    return parser.done
+
+def test_prose_before_object():
+    p = JsonStreamParser(top="object")
+    assert p.feed('好的，输出如下：{"questions": ["a", "b"]}')
+    assert p.value == {"questions": ["a", "b"]}
+
+def test_brackets_in_prose_are_skipped_for_object_schema():
+    p = JsonStreamParser(top="object")
+    assert p.feed('好的，参考 [1] 输出如下：{"questions":["a"]}')
+    assert p.value == {"questions": ["a"]}
+
+def test_default_is_object():
+    p = JsonStreamParser()
+    assert p.feed('好的，参考 [1] 输出如下：{"questions":["a"]}')
+    assert p.value == {"questions": ["a"]}
+
+def test_any_top_level_when_unspecified():
+    p = JsonStreamParser(top=None)
+    assert p.feed('[1, {"a": null}]')
+    assert p.value == [1, {"a": None}]
+
+def test_brackets_in_prose_incremental():
+    p = JsonStreamParser(top="object")
+    assert _feed(p, '见 [1][2] 与 {注释} 后：{"keep": [0, 2], "ok": true}', step=2)
+    assert p.value == {"keep": [0, 2], "ok": True}
+
+def test_array_schema_only_accepts_array():
+    p = JsonStreamParser(top="array")
+    assert p.feed('说明 {x} 然后 [1, 2]')
+    assert p.value == [1, 2]
+
+def test_code_fence():
+    p = JsonStreamParser(top="object")
+    assert _feed(p, '```json\n{"goal": "a \\"b\\" \\u4e2d"}\n```\n多余的说明')
+    assert p.value == {"goal": 'a "b" 中'}
+
+def test_stops_at_close_and_ignores_trailer():
+    p = JsonStreamParser(top="object")
+    assert p.feed('{"a": 1}{"b": 2}')
+    assert p.value == {"a": 1}
+
+def test_on_value_paths():
+    seen = []
+    p = JsonStreamParser(lambda path, v: seen.append((path, v)), top="object")
+    _feed(p, '{"need_more": true, "sub_goals": ["x", "y"]}', step=1)
+    assert (("need_more",), True) in seen
+    assert (("sub_goals", 0), "x") in seen and (("sub_goals", 1), "y") in seen
+    assert seen[-1] == ((), {"need_more": True, "sub_goals": ["x", "y"]})
+
+def test_truncated_output_is_not_done():
+    p = JsonStreamParser(top="object")
+    assert not _feed(p, '思考……{"questions": ["a", "b')
+    assert p.value is None
+    assert p.root == {"questions": ["a"]}
+
+def test_no_json_at_all():
+    p = JsonStreamParser(top="object")
+    assert not p.feed("没有任何 JSON [1]")
+    assert p.value is None
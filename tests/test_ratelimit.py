@@ -0,0 +1,130 @@
+# 调用调度：重试、排队截止时间、优先级、自适应并发（app/llm/ratelimit.py）
+import threading
+import time
+import pytest
+from app import config
+from app.llm import ratelimit
+from app.llm.ratelimit import RateLimitTimeout, _Gate, attempts, backoff, call
+
+class _HTTPError(Exception):
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("R", (), {"status_code": status_code, "headers": headers or {}})()
+
+@pytest.fixture(autouse=True)
+def _settings(monkeypatch):
+    monkeypatch.setattr(config, "_DOTENV_LOADED", True)
+    for k, v in {"RATE_LIMIT": "1", "LLM_RPM": "0", "LLM_TPM": "0", "RATE_MAX_CONCURRENCY": "4",
+                 "RETRY_MAX": "3", "RETRY_BASE_DELAY": "0.01", "RETRY_MAX_DELAY": "0.02"}.items():
+        monkeypatch.setenv(k, v)
+    config.get_settings.cache_clear()
+    ratelimit._GATES.clear()
+    yield
+    ratelimit._GATES.clear()
+    config.get_settings.cache_clear()
+
+def test_retries_on_429_until_success():
+    n = [0]
+
+    def fn():
+        n[0] += 1
+        if n[0] < 3:
+            raise _HTTPError(429)
+        return "ok"
+
+    assert call("llm", fn, model="m") == "ok"
+    st = ratelimit.rate_stats()["llm:m"]
+    assert (n[0], st["throttled"], st["retries"], st["ok"]) == (3, 2, 2, 1)
+
+def test_gives_up_after_retry_max():
+    n = [0]
+
+    def fn():
+        n[0] += 1
+        raise _HTTPError(503)
+
+    with pytest.raises(_HTTPError):
+        call("llm", fn, model="m")
+    assert n[0] == 4
+    assert ratelimit.rate_stats()["llm:m"]["gave_up"] == 1
+
+def test_no_retry_after_side_effects():
+    n = 0
+    with pytest.raises(_HTTPError):
+        for a in attempts("llm", "m"):
+            with a:
+                n += 1
+                a.no_retry()
+                raise _HTTPError(429)
+    assert n == 1
+
+def test_non_retryable_error_is_raised_at_once():
+    n = [0]
+
+    def fn():
+        n[0] += 1
+        raise _HTTPError(400)
+
+    with pytest.raises(_HTTPError):
+        call("llm", fn, model="m")
+    assert n[0] == 1
+
+def test_backoff_respects_retry_after_and_cap():
+    assert 0 <= backoff(10) <= 0.02
+    assert backoff(0, retry_after=0.015) >= 0.015
+    assert backoff(0, retry_after=60) == 0.02
+
+def test_deadline_cuts_queue_wait():
+    g = _Gate(("t", ""), 0, 0, max_concurrency=1)
+    g.acquire(0, "normal", None)
+    t0 = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        g.acquire(0, "normal", time.monotonic() + 0.1)
+    assert time.monotonic() - t0 < 0.4
+    assert g.stats()["queued"] == 0
+
+def test_priority_order():
+    g = _Gate(("t", ""), 0, 0, max_concurrency=1)
+    g.acquire(0, "normal", None)
+    order = []
+
+    def worker(prio: str) -> None:
+        g.acquire(0, prio, None)
+        order.append(prio)
+        g.release(None)
+
+    threads = []
+    for prio in ("background", "normal", "interactive"):
+        t = threading.Thread(target=worker, args=(prio,))
+        t.start()
+        threads.append(t)
+        # 按提交顺序依次进入队列
+        while g.stats()["queued"] < len(threads):
+            time.sleep(0.005)
+    g.release(None)
+    for t in threads:
+        t.join(5)
+    assert order == ["interactive", "normal", "background"]
+
+def test_aimd_halves_on_throttle_and_recovers():
+    g = _Gate(("t", ""), 0, 0, max_concurrency=8)
+    for _ in range(2):
+        g.acquire(0, "normal", None)
+        g.release("throttled")
+    assert g.limit == 2
+    # 并发上限生效：第三个名额拿不到
+    g.acquire(0, "normal", None)
+    g.acquire(0, "normal", None)
+    with pytest.raises(RateLimitTimeout):
+        g.acquire(0, "normal", time.monotonic() + 0.05)
+    g.release(None)
+    g.release(None)
+    # 成功时每次加 1/limit，逐步回到上限且不超过
+    for _ in range(100):
+        g.acquire(0, "normal", None)
+        g.release("ok")
+    assert g.limit == 8
+    g.acquire(0, "normal", None)
+    g.release("server_errors")
+    assert g.limit == 4